@@ -1,44 +1,44 @@
-import os
+import argparse
 import subprocess
-from dotenv import load_dotenv
 
-MODELS = {
-    "1": ".env.mistral",
-    "2": ".env.leolm-german"
+from llm_server import (MODEL_ENV_FILES, PORT, build_server_command, ensure_server, get_active_env_file,
+                        read_server_settings, stop_server)
 
-}
 
-def run_llm_server(env_file):
-    print(f"\n📦 Loading config from: {env_file}")
-    load_dotenv(env_file)
-
-    model = os.getenv("MODEL")
-    n_ctx = os.getenv("N_CTX", "4096")
-    host = "127.0.0.1"
-    port = "11434"
-
-    if not model or not os.path.exists(model):
-        print(f"❌ MODEL not found or missing in {env_file}")
-        return
+def run_llm_server(env_file, foreground=False, port=PORT):
+    """
+    Serve the model of an .env file; on the default port it also becomes the active model.
 
-    venv_python = os.path.join(os.path.dirname(__file__), "venv", "Scripts", "python.exe")
+    Args:
+        env_file (str): The model's .env file.
+        foreground (bool): Run the server in this terminal until it is stopped,
+            instead of in the background.
+        port (int): Port to serve on; use different ports to run several models side by side.
+    """
+    print(f"\n📦 Loading config from: {env_file}")
+    if port == PORT:
+        with open("active_env.txt", "w", encoding="utf-8") as file:
+            file.write(env_file)
+
+    if foreground:
+        settings = read_server_settings(env_file)
+        print(f"🚀 Launching LLM server for: {settings['model']}")
+        subprocess.run(build_server_command(settings, port=port))
+    else:
+        ensure_server(env_file, port=port)
 
-    print(f"🚀 Launching LLM server for: {model}")
-    subprocess.run([
-        venv_python, "-m", "llama_cpp.server",
-        "--model", model,
-        "--n_ctx", n_ctx,
-        "--host", host,
-        "--port", port
-    ])
 
 if __name__ == "__main__":
-    print("💬 اختر النموذج:")
-    print("[1] Mistral")
-    print("[2] LeoLM-German")
-    choice = input("👉 اختيارك: ").strip()
-
-    if choice in MODELS:
-        run_llm_server(MODELS[choice])
+    parser = argparse.ArgumentParser(description="Start or stop the local LLM server.")
+    parser.add_argument("model", nargs="?", choices=sorted(MODEL_ENV_FILES),
+                        help="Model to serve; the one in active_env.txt if omitted.")
+    parser.add_argument("--foreground", action="store_true", help="Run the server in this terminal.")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to serve on.")
+    parser.add_argument("--stop", action="store_true", help="Stop the server running in the background.")
+    args = parser.parse_args()
+
+    if args.stop:
+        print("🛑 LLM server stopped." if stop_server(args.port) else "No LLM server is running in the background.")
     else:
-        print("❌ خيار غير صالح.")
+        run_llm_server(MODEL_ENV_FILES[args.model] if args.model else get_active_env_file(), args.foreground,
+                       args.port)
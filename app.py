@@ -1,35 +1,75 @@
-from extract_text_from_video import main as run_transcription
-from format_text import format_text_to_paragraphs
+import argparse
+import os
 
-def run_all():
+from cache import DiskCache
+from config import config
+from format_text import ensure_llm_servers, get_endpoint_pool, get_format_settings
+from journal import open_journal, remove_orphans
+from metrics import collect
+from pipeline import TranscriptionIncomplete, run_pipeline
+
+# Run report written after every run; set METRICS_JSON to an empty value to skip it
+METRICS_JSON = os.getenv("METRICS_JSON", "metrics.json")
+
+def run_all(url=None, resume=False):
     """
     Runs the complete process of text extraction and formatting.
 
     Steps:
-        1. Extract text from video using the run_transcription function.
-        2. Read the raw text from 'output.txt'.
-        3. Format the text into readable paragraphs.
-        4. Save the formatted result to 'formatted_output.txt'.
-    """
+        0. Start the LLM server, or reuse a running one with the model already loaded.
+        1. Download the audio and split it into chunks.
+        2. Transcribe the chunks while they are being produced.
+        3. Format each transcribed chunk as soon as it is available.
+        4. Append raw text to 'output.txt' as the chunks complete, and formatted text
+           to 'formatted_output.txt' token by token as the LLM generates it.
 
-    print("[1] Extracting text from video...")
-    run_transcription()  # This function generates 'output.txt'
+    Audio, transcripts and formatted chunks are cached, so a re-run of the same
+    video only redoes the work that changed. Per-stage timings and throughput are
+    written to METRICS_JSON; set PROFILE to a file name for cProfile statistics,
+    TRACEMALLOC=true for peak memory, and METRICS_PORT to serve Prometheus metrics.
 
-    print("[2] Formatting the text...")
-    try:
-        with open("output.txt", "r", encoding="utf-8") as file:
-            raw_text = file.read()
-    except FileNotFoundError:
-        print("❌ Error: 'output.txt' not found. Make sure transcription succeeded.")
-        return
+    Every finished transcript and formatted chunk is also recorded in the video's
+    journal, so a run that fails part-way, e.g. after a server restart, can be
+    continued with ``resume`` from the first unfinished chunk.
 
-    formatted_text = format_text_to_paragraphs(raw_text)
+    Args:
+        url (str | None): URL of the YouTube video; prompted for if omitted.
+        resume (bool): Continue an interrupted run of the same video instead of starting over.
+    """
+    remove_orphans(".", recursive=False)
+    url = url or input("Enter the YouTube video URL: ").strip()
+    ensure_llm_servers()
+    journal = open_journal(url, {"language": "de-DE", "chunking": "vad", "recognizer": config.recognizer,
+                                 **get_format_settings()}, resume)
+
+    print("[1] Extracting and formatting text as a stream of chunks...")
+    pool = get_endpoint_pool()
+    metrics_port = os.getenv("METRICS_PORT")
+    with collect(METRICS_JSON or None, os.getenv("PROFILE") or None, os.getenv("TRACEMALLOC") == "true",
+                 int(metrics_port) if metrics_port else None):
+        try:
+            count = run_pipeline(url, cache=DiskCache(), format_parallel=pool.slots, stream_tokens=True,
+                                 journal=journal)
+        except TranscriptionIncomplete as error:
+            print(f"❌ {error}; their error markers are in 'output.txt' and 'formatted_output.txt'. "
+                  f"Start the run again with --resume to redo only those chunks.")
+            raise SystemExit(1)
+        except Exception:
+            print("❌ The run failed; start it again with --resume to continue where it stopped.")
+            raise
 
-    with open("formatted_output.txt", "w", encoding="utf-8") as file:
-        file.write(formatted_text)
+    if not count:
+        print("❌ Error: no text was transcribed. Check the video URL and audio.")
+        return
 
-    print("[3] ✅ Formatted text saved to 'formatted_output.txt'")
+    journal.finish()
+    print(f"[2] ✅ {count} formatted chunks saved to 'formatted_output.txt'")
+    pool.report()
 
 # Entry point if this script is executed directly
 if __name__ == "__main__":
-    run_all()
+    parser = argparse.ArgumentParser(description="Transcribe and format a YouTube video.")
+    parser.add_argument("url", nargs="?", help="Video URL; prompted for if omitted.")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run of the same video.")
+    args = parser.parse_args()
+    run_all(args.url, args.resume)
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import DiskCache
+from config import config
+from format_text import FORMAT_ENGINES, create_session, ensure_llm_servers, get_endpoint_pool, get_format_settings
+from journal import JobJournal, remove_orphans
+from metrics import collect
+from pipeline import run_pipeline
+from recognizers import RECOGNIZER_BACKENDS
+
+JOBS_DIR = "jobs"
+MANIFEST_NAME = "manifest.json"
+METRICS_NAME = "metrics.json"
+
+
+def read_url_file(path):
+    """
+    Read URLs from a text file, one per line; blank lines and '#' comments are skipped.
+
+    Args:
+        path (str): Path to the URL list.
+
+    Returns:
+        list[str]: The URLs in file order.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip() and not line.strip().startswith("#")]
+
+
+def expand_sources(sources):
+    """
+    Expand video, playlist and channel URLs into individual video URLs.
+
+    Args:
+        sources (list[str]): URLs of videos, playlists or channels.
+
+    Returns:
+        list[str]: Unique video URLs, in the order they were found.
+    """
+    from yt_dlp import YoutubeDL
+
+    from extract_text_from_video import get_video_id
+
+    urls = []
+    seen = set()
+    ydl_opts = {'quiet': True, 'extract_flat': 'in_playlist', 'skip_download': True}
+
+    def add(info, fallback_url):
+        entries = info.get("entries")
+        if entries is None:
+            url = info.get("webpage_url") or info.get("url") or fallback_url
+            video_id = get_video_id(url)
+            if video_id not in seen:
+                seen.add(video_id)
+                urls.append(url)
+            return
+
+        for entry in entries:
+            if not entry:
+                continue
+            entry_url = entry.get("url") or entry.get("webpage_url")
+            if entry.get("_type") == "playlist" or entry.get("ie_key") == "YoutubeTab":
+                add(ydl.extract_info(entry_url, download=False), entry_url)
+            elif entry_url:
+                add({"webpage_url": entry_url}, entry_url)
+
+    with YoutubeDL(ydl_opts) as ydl:
+        for source in sources:
+            add(ydl.extract_info(source, download=False), source)
+    return urls
+
+
+class Manifest:
+    """
+    Per-video status and timings of a batch run, saved as JSON after every change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.jobs = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.jobs = json.load(file).get("jobs", {})
+
+    def update(self, video_id, **fields):
+        """
+        Update the entry of a video and write the manifest atomically.
+
+        Args:
+            video_id (str): Job key.
+            **fields: Values to set on the entry.
+        """
+        with self._lock:
+            self.jobs.setdefault(video_id, {}).update(fields)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"jobs": self.jobs}, file, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+
+
+def run_batch(urls, jobs_dir=JOBS_DIR, jobs=2, downloads=2, transcribe_workers=None,
+              format_parallel=None, language="de-DE", chunking="vad", skip_done=True,
+              recognizer=None, resume=False):
+    """
+    Process many videos, each in its own working directory under ``jobs_dir``.
+
+    Args:
+        urls (list[str]): Video URLs to process.
+        jobs_dir (str): Directory holding one subdirectory per video and the manifest.
+        jobs (int): Number of videos processed at the same time.
+        downloads (int): Maximum number of concurrent audio downloads across all jobs.
+        transcribe_workers (int | None): Number of chunks transcribed at the same time per video.
+        format_parallel (int | None): Maximum number of LLM requests in flight across all jobs;
+            the slots of all LLM endpoints if omitted.
+        language (str): Language code for transcription.
+        chunking (str): "vad" or "fixed" audio chunking.
+        skip_done (bool): Skip videos the manifest already records as done.
+        recognizer (str | None): Speech-recognition backend; local models are shared by all
+            jobs. config.recognizer if omitted.
+        resume (bool): Continue failed or interrupted videos from the chunks recorded in
+            their journal instead of starting them over.
+
+    Returns:
+        Manifest: The manifest with the final status of every video.
+    """
+    from extract_text_from_video import get_video_id
+
+    recognizer = recognizer or config.recognizer
+    os.makedirs(jobs_dir, exist_ok=True)
+    remove_orphans(jobs_dir, recursive=False)
+    manifest = Manifest(os.path.join(jobs_dir, MANIFEST_NAME))
+    cache = DiskCache()
+    format_parallel = format_parallel or get_endpoint_pool().slots
+    session = create_session(format_parallel)
+    download_slots = threading.Semaphore(downloads)
+    format_slots = threading.Semaphore(format_parallel)
+
+    def run_job(url):
+        video_id = get_video_id(url)
+        if skip_done and manifest.jobs.get(video_id, {}).get("status") == "done":
+            print(f"[skip] {video_id} already done")
+            return
+
+        workdir = os.path.join(jobs_dir, video_id)
+        os.makedirs(workdir, exist_ok=True)
+        journal = JobJournal(os.path.join(workdir, "journal"), url,
+                             {"language": language, "chunking": chunking, "recognizer": recognizer,
+                              **get_format_settings()}, resume)
+        manifest.update(video_id, url=url, workdir=workdir, status="running", error=None, started_at=time.time())
+        print(f"[start] {video_id}")
+
+        timings = {}
+        try:
+            count = run_pipeline(
+                url,
+                raw_output=os.path.join(workdir, "output.txt"),
+                formatted_output=os.path.join(workdir, "formatted_output.txt"),
+                language=language,
+                chunking=chunking,
+                cache=cache,
+                transcribe_workers=transcribe_workers,
+                format_parallel=format_parallel,
+                session=session,
+                download_slots=download_slots,
+                format_slots=format_slots,
+                timings=timings,
+                recognizer=recognizer,
+                journal=journal,
+            )
+        except Exception as error:
+            manifest.update(video_id, status="failed", error=str(error), finished_at=time.time(), timings=timings)
+            print(f"[failed] {video_id}: {error}")
+            return
+
+        journal.finish()
+        manifest.update(video_id, status="done", chunks=count, finished_at=time.time(), timings=timings)
+        print(f"[done] {video_id}: {count} chunks in {timings.get('total', 0):.1f}s")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            list(executor.map(run_job, urls))
+    finally:
+        session.close()
+
+    return manifest
+
+
+def main():
+    """
+    Command-line entry point for batch processing.
+    """
+    parser = argparse.ArgumentParser(description="Transcribe and format many videos in parallel.")
+    parser.add_argument("sources", nargs="*", help="Video, playlist or channel URLs.")
+    parser.add_argument("--file", help="Text file with one URL per line.")
+    parser.add_argument("--jobs-dir", default=JOBS_DIR, help="Directory for per-video output and the manifest.")
+    parser.add_argument("--jobs", type=int, default=2, help="Videos processed at the same time.")
+    parser.add_argument("--downloads", type=int, default=2, help="Concurrent audio downloads.")
+    parser.add_argument("--transcribe-workers", type=int, help="Chunks transcribed at the same time per video.")
+    parser.add_argument("--format-parallel", type=int,
+                        help="LLM requests in flight across all videos; defaults to the slots of all LLM endpoints.")
+    parser.add_argument("--language", default="de-DE")
+    parser.add_argument("--chunking", choices=("vad", "fixed"), default="vad")
+    parser.add_argument("--recognizer", choices=RECOGNIZER_BACKENDS,
+                        help="Speech-recognition backend; RECOGNIZER or 'google' if omitted.")
+    parser.add_argument("--engine", choices=FORMAT_ENGINES,
+                        help="Formatting engine; FORMAT_ENGINE or 'llm' if omitted.")
+    parser.add_argument("--redo", action="store_true", help="Process videos already marked as done again.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue failed or interrupted videos from their last finished chunk.")
+    parser.add_argument("--profile", metavar="FILE", help="Write cProfile statistics of the run to FILE.")
+    parser.add_argument("--tracemalloc", action="store_true", help="Record peak memory and top allocation sites.")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port during the run.")
+    args = parser.parse_args()
+
+    sources = list(args.sources)
+    if args.file:
+        sources += read_url_file(args.file)
+    if not sources:
+        parser.error("no URLs given")
+    if args.engine:
+        config.override(format_engine=args.engine)
+
+    print(f"Expanding {len(sources)} sources...")
+    urls = expand_sources(sources)
+    ensure_llm_servers()
+    print(f"Processing {len(urls)} videos...")
+
+    os.makedirs(args.jobs_dir, exist_ok=True)
+    with collect(os.path.join(args.jobs_dir, METRICS_NAME), args.profile, args.tracemalloc, args.metrics_port):
+        manifest = run_batch(urls, args.jobs_dir, args.jobs, args.downloads, args.transcribe_workers,
+                             args.format_parallel, args.language, args.chunking, skip_done=not args.redo,
+                             recognizer=args.recognizer, resume=args.resume)
+
+    statuses = [job.get("status") for job in manifest.jobs.values()]
+    print(f"Finished: {statuses.count('done')} done, {statuses.count('failed')} failed. "
+          f"Manifest: {manifest.path}")
+    get_endpoint_pool().report()
+
+
+if __name__ == "__main__":
+    main()
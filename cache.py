@@ -0,0 +1,207 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Location and size limit of the on-disk cache
+CACHE_DIR = os.getenv("TOL_VIDO_CACHE_DIR", ".cache")
+CACHE_MAX_BYTES = int(os.getenv("TOL_VIDO_CACHE_MAX_MB", "4096")) * 1024 * 1024
+
+# Temporary files untouched for this many seconds were left behind by a crashed write;
+# younger ones may still be written by another process sharing the cache
+STALE_TEMP_SECONDS = 3600
+
+
+def hash_key(*parts):
+    """
+    Build a cache key from strings and bytes.
+
+    Args:
+        *parts (str | bytes): Values that identify the cached item.
+
+    Returns:
+        str: Hex SHA-256 digest of all parts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent content-addressed cache with a size limit and LRU eviction.
+
+    Entries are stored as files under ``<root>/<namespace>/``. Reads refresh an
+    entry's modification time, and the least recently used entries are deleted
+    once the total size exceeds ``max_bytes``. Writes are atomic, so a crash never
+    leaves a partial entry behind; the temporary files of crashed writes are
+    removed when the cache is opened.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self.remove_stale_temp_files()
+
+    def remove_stale_temp_files(self, max_age=STALE_TEMP_SECONDS):
+        """
+        Delete temporary files that no write has touched for ``max_age`` seconds.
+
+        Returns:
+            int: Number of files deleted.
+        """
+        removed = 0
+        cutoff = time.time() - max_age
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def path(self, namespace, key, suffix=""):
+        """
+        Return the file path of an entry, whether or not it exists.
+
+        Args:
+            namespace (str): Kind of entry, e.g. "audio" or "transcripts".
+            key (str): Entry key.
+            suffix (str): File extension of the entry.
+
+        Returns:
+            str: Path of the entry.
+        """
+        return os.path.join(self.root, namespace, f"{key}{suffix}")
+
+    def get_file(self, namespace, key, suffix=""):
+        """
+        Look up a file entry and mark it as recently used.
+
+        Returns:
+            str | None: Path of the cached file, or None on a miss.
+        """
+        path = self.path(namespace, key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_text(self, namespace, key):
+        """
+        Look up a text entry and mark it as recently used.
+
+        Returns:
+            str | None: The cached text, or None on a miss.
+        """
+        path = self.get_file(namespace, key, ".txt")
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def set_text(self, namespace, key, text):
+        """
+        Store a text entry atomically.
+
+        Args:
+            namespace (str): Kind of entry.
+            key (str): Entry key.
+            text (str): Text to store.
+        """
+        temp_path = self.temp_path(namespace)
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        self.commit_file(namespace, key, temp_path, ".txt")
+
+    def temp_path(self, namespace, suffix=""):
+        """
+        Create a temporary file next to the entries of a namespace.
+
+        Write to it, then pass it to commit_file to publish it atomically.
+
+        Returns:
+            str: Path of the new, empty temporary file.
+        """
+        directory = os.path.join(self.root, namespace)
+        os.makedirs(directory, exist_ok=True)
+        handle, path = tempfile.mkstemp(suffix=suffix + ".tmp", dir=directory)
+        os.close(handle)
+        return path
+
+    def commit_file(self, namespace, key, source_path, suffix=""):
+        """
+        Move a finished file into the cache and evict old entries if needed.
+
+        Args:
+            namespace (str): Kind of entry.
+            key (str): Entry key.
+            source_path (str): File to move; it should be on the same filesystem,
+                e.g. one created by temp_path.
+            suffix (str): File extension of the entry.
+
+        Returns:
+            str: Path of the cached file.
+        """
+        path = self.path(namespace, key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            try:
+                os.replace(source_path, path)
+            except OSError:
+                shutil.move(source_path, path)
+            if self._size is not None:
+                self._size += os.path.getsize(path) - replaced
+        self.evict()
+        return path
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in ``max_bytes``.
+        """
+        with self._lock:
+            if self._size is not None and self._size <= self.max_bytes:
+                return
+
+            entries = []
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._size = total
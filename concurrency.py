@@ -0,0 +1,187 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def ordered_map(func, items, workers=4, window=None):
+    """
+    Apply a function to items on a bounded thread pool and yield results in input order.
+
+    Items are pulled lazily, so at most ``window`` calls are queued or running at any
+    time and a slow item only holds back the results behind it, not the work.
+    Finished results at the head of the queue are yielded as soon as they are ready.
+
+    Args:
+        func (callable): Function called with a single item.
+        items (iterable): Items to process; may be a generator.
+        workers (int): Number of worker threads.
+        window (int | None): Maximum number of in-flight calls (defaults to 2 * workers).
+
+    Yields:
+        The result of ``func(item)`` for every item, in the order of ``items``.
+    """
+    workers = max(1, int(workers))
+    window = max(workers, int(window or workers * 2))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+                while pending and (len(pending) >= window or pending[0].done()):
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def batched(items, size):
+    """
+    Group items into lists of up to ``size`` elements, consuming them lazily.
+
+    Args:
+        items (iterable): Items to group; may be a generator.
+        size (int): Maximum batch size.
+
+    Yields:
+        list: The next batch.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= max(1, size):
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _start_producer(items, size):
+    """
+    Consume an iterable in a background thread into a queue of up to ``size`` entries.
+
+    Returns:
+        tuple: The queue, holding ``("item", value)``, ``("error", exception)`` and a final
+        ``("done", None)``, and the event that stops the thread. Once it is set, ``items``
+        is closed as soon as its current item is produced.
+    """
+    buffer = queue.Queue(maxsize=max(1, size))
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(("item", item)):
+                    return
+            put(("done", None))
+        except BaseException as error:
+            put(("error", error))
+        finally:
+            close = getattr(items, "close", None)
+            if stop.is_set() and close is not None:
+                close()
+
+    threading.Thread(target=produce, daemon=True).start()
+    return buffer, stop
+
+
+def prefetch(items, size=8):
+    """
+    Consume an iterable in a background thread, buffering up to ``size`` items.
+
+    This decouples a producer stage from its consumer so both run at the same time.
+    Exceptions raised by the producer are re-raised in the consumer. When the consumer
+    stops early, ``items`` is closed in the background thread once its current item is
+    produced, so slots and processes it holds are released right away.
+
+    Args:
+        items (iterable): Items to produce; usually a generator.
+        size (int): Maximum number of buffered items.
+
+    Yields:
+        The items of ``items``, in order.
+    """
+    buffer, stop = _start_producer(items, size)
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
+def ready_batches(items, size):
+    """
+    Group the items that are already produced into lists of up to ``size`` elements.
+
+    Items are produced in a background thread, like with prefetch. A batch waits only
+    for its first item and takes whatever else is ready, so batching never delays an
+    item that could be processed now.
+
+    Args:
+        items (iterable): Items to group; usually a generator.
+        size (int): Maximum batch size.
+
+    Yields:
+        list: The next batch, in order.
+    """
+    size = max(1, size)
+    buffer, stop = _start_producer(items, size)
+    try:
+        while True:
+            batch = []
+            kind, value = buffer.get()
+            while kind == "item":
+                batch.append(value)
+                if len(batch) >= size:
+                    break
+                try:
+                    kind, value = buffer.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                yield batch
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+    finally:
+        stop.set()
+
+
+def hold_slot(items, semaphore):
+    """
+    Hold a semaphore slot for as long as an iterable is being consumed.
+
+    The slot is acquired before the first item is produced and released when the
+    iterable is exhausted or closed, e.g. to cap concurrent downloads across jobs.
+
+    Args:
+        items (iterable): Items to pass through.
+        semaphore (threading.Semaphore | None): Slot to hold; items pass through unchanged if None.
+
+    Yields:
+        The items of ``items``, in order.
+    """
+    if semaphore is None:
+        yield from items
+        return
+
+    with semaphore:
+        yield from items
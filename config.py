@@ -0,0 +1,117 @@
+import os
+import threading
+
+# File naming the .env file of the active model
+ACTIVE_ENV_FILE = "active_env.txt"
+
+# Settings resolved by Config: environment variables tried in order, default, type
+SETTINGS = {
+    "model_name": (("MODEL_NAME", "MODEL"), None, str),
+    "model_path": (("MODEL",), None, str),
+    "n_parallel": (("N_PARALLEL",), "4", int),
+    "n_ctx": (("N_CTX", "CONTEXT_SIZE"), "4096", int),
+    "token_counter": (("TOKEN_COUNTER",), "auto", str),
+    "slot_pinning": (("SLOT_PINNING",), "true", lambda value: value.lower() == "true"),
+    "llm_endpoints": (("LLM_ENDPOINTS",), "", str),
+    "llm_backend": (("LLM_BACKEND",), "server", str),
+    "overlap_tokens": (("OVERLAP_TOKENS",), "0", int),
+    "format_engine": (("FORMAT_ENGINE",), "llm", str),
+    "format_retries": (("FORMAT_RETRIES",), "1", int),
+    "punct_model": (("PUNCT_MODEL",), "kredor/punctuate-all", str),
+    "punct_batch_size": (("PUNCT_BATCH_SIZE",), "16", int),
+    "punct_threads": (("PUNCT_THREADS",), "0", int),
+    "paragraph_words": (("PARAGRAPH_WORDS",), "150", int),
+    "recognizer": (("RECOGNIZER",), "google", str),
+    "whisper_model": (("WHISPER_MODEL",), "small", str),
+    "whisper_compute_type": (("WHISPER_COMPUTE_TYPE",), "int8", str),
+    "whisper_batch_size": (("WHISPER_BATCH_SIZE",), "8", int),
+    "vosk_model_path": (("VOSK_MODEL_PATH",), os.path.join("models", "vosk-model-de-0.21"), str),
+}
+
+
+class Config:
+    """
+    Settings of the formatting stage, resolved on first use.
+
+    Nothing is read at import time. The first access reads the .env file named
+    in 'active_env.txt' and resolves every setting from the environment, falling
+    back to the file; the environment itself is left unchanged, so a different
+    file chosen with ``override`` replaces the values of the first one. Values
+    passed to the constructor or to ``override`` take precedence over both.
+    """
+
+    def __init__(self, env_file=None, **overrides):
+        self._lock = threading.Lock()
+        self._env_file = env_file
+        self._overrides = {}
+        self._values = None
+        self.override(**overrides)
+
+    def override(self, **values):
+        """
+        Set settings programmatically, e.g. ``config.override(model_name="mistral", n_parallel=2)``.
+
+        Args:
+            **values: Setting names from SETTINGS, or ``env_file`` to read a different .env file.
+
+        Raises:
+            AttributeError: If a name is not a known setting.
+        """
+        with self._lock:
+            if "env_file" in values:
+                self._env_file = values.pop("env_file")
+                self._values = None
+            for name in values:
+                if name not in SETTINGS:
+                    raise AttributeError(f"Unknown setting '{name}'.")
+            self._overrides.update(values)
+
+    def reset(self):
+        """
+        Forget resolved values and overrides, so the next access reads the environment again.
+        """
+        with self._lock:
+            self._overrides = {}
+            self._values = None
+
+    @property
+    def env_file(self):
+        """The .env file that is loaded, or None if there is none."""
+        self._resolve()
+        return self._env_file
+
+    def _resolve(self):
+        with self._lock:
+            if self._values is not None:
+                return self._values
+
+            if self._env_file is None and os.path.exists(ACTIVE_ENV_FILE):
+                with open(ACTIVE_ENV_FILE, "r", encoding="utf-8") as file:
+                    self._env_file = file.read().strip() or None
+            file_values = {}
+            if self._env_file:
+                from dotenv import dotenv_values
+
+                file_values = dotenv_values(self._env_file)
+
+            values = {}
+            for name, (variables, default, convert) in SETTINGS.items():
+                raw = next((source[v] for v in variables for source in (os.environ, file_values) if source.get(v)),
+                           default)
+                values[name] = None if raw is None else convert(raw)
+            self._values = values
+            return values
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in SETTINGS:
+            raise AttributeError(name)
+
+        values = self._resolve()
+        value = self._overrides.get(name, values[name])
+        if name == "model_name" and not value:
+            raise RuntimeError("MODEL_NAME or MODEL not found in the .env file.")
+        return value
+
+
+# Shared configuration used by the formatting client
+config = Config()
@@ -0,0 +1,257 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from llm_local import is_local_url, local_url
+from llm_server import MODEL_ENV_FILES, ensure_server, read_server_settings
+
+# Seconds an endpoint stays out of rotation after repeated failures before it is tried again
+RETRY_AFTER = float(os.getenv("LLM_RETRY_AFTER", "30"))
+
+# Consecutive failed requests after which an endpoint is taken out of rotation
+MAX_FAILURES = 2
+
+
+class NoHealthyEndpoint(RuntimeError):
+    """Raised when every endpoint of a pool is out of rotation."""
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible chat completions server, or a model loaded in this process
+    (see llm_local), with its model and request statistics.
+    """
+
+    def __init__(self, url, model_name, slots=1):
+        if not is_local_url(url) and not url.rstrip("/").endswith("/chat/completions"):
+            url = url.rstrip("/") + "/v1/chat/completions"
+        self.url = url
+        self.model_name = model_name
+        self.slots = max(1, int(slots))
+        self.free_slots = list(range(self.slots))
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.retry_at = 0.0
+        self.output_chars = 0
+        self.output_tokens = 0
+        self.busy_seconds = 0.0
+        self.first_started = None
+        self.last_finished = None
+
+    @property
+    def healthy(self):
+        return self.consecutive_failures < MAX_FAILURES
+
+    def summary(self):
+        """
+        Return the request statistics of the endpoint.
+
+        Returns:
+            dict: Counts, average latency and output throughput over the time the
+            endpoint was in use.
+        """
+        active = (self.last_finished - self.first_started) if self.requests and self.last_finished else 0.0
+        return {
+            "url": self.url,
+            "model": self.model_name,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "avg_latency_s": round(self.busy_seconds / self.requests, 3) if self.requests else None,
+            "chars_per_s": round(self.output_chars / active, 1) if active else None,
+            "tokens_per_s": round(self.output_tokens / active, 1) if active and self.output_tokens else None,
+        }
+
+
+class EndpointLease:
+    """
+    An endpoint and server slot reserved for a single request.
+    """
+
+    def __init__(self, endpoint, slot):
+        self.endpoint = endpoint
+        self.slot = slot
+        self.started = time.perf_counter()
+        # Set once output of a streamed request has been passed on; such a request is not retried
+        self.emitted = False
+
+
+class EndpointPool:
+    """
+    Endpoints that share the formatting load.
+
+    Every request goes to the healthy endpoint with the fewest requests in flight,
+    relative to its number of slots. An endpoint that fails MAX_FAILURES times in a
+    row is taken out of rotation and tried again after ``retry_after`` seconds.
+    """
+
+    def __init__(self, endpoints, retry_after=RETRY_AFTER, lock=None):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint.")
+        self.endpoints = list(endpoints)
+        self.retry_after = retry_after
+        self._lock = lock or threading.Lock()
+
+    @property
+    def slots(self):
+        """Total number of slots of all endpoints."""
+        return sum(endpoint.slots for endpoint in self.endpoints)
+
+    @property
+    def model_names(self):
+        """Distinct model names served by the pool, in endpoint order."""
+        return list(dict.fromkeys(endpoint.model_name for endpoint in self.endpoints))
+
+    def subset(self, model_name):
+        """
+        Return a pool of the endpoints that serve one model.
+
+        The endpoints and their load are shared with this pool, so requests through
+        either pool are balanced together.
+
+        Args:
+            model_name (str): Model name of the endpoints.
+
+        Returns:
+            EndpointPool: The pool.
+
+        Raises:
+            ValueError: If no endpoint serves the model.
+        """
+        endpoints = [endpoint for endpoint in self.endpoints if endpoint.model_name == model_name]
+        if not endpoints:
+            raise ValueError(f"No LLM endpoint serves '{model_name}'; available: {self.model_names}.")
+        return EndpointPool(endpoints, self.retry_after, self._lock)
+
+    def acquire(self, exclude=(), pin_slot=True):
+        """
+        Reserve the least loaded healthy endpoint.
+
+        Args:
+            exclude (collection of Endpoint): Endpoints not to use, e.g. ones that
+                already failed for the current chunk.
+            pin_slot (bool): Also reserve a free server slot (``id_slot``).
+
+        Returns:
+            EndpointLease: The reservation; pass it to release when the request is done.
+
+        Raises:
+            NoHealthyEndpoint: If no endpoint is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude and (e.healthy or e.retry_at <= now)]
+            if not candidates:
+                raise NoHealthyEndpoint("No healthy LLM endpoint is available.")
+
+            endpoint = min(candidates, key=lambda e: e.outstanding / e.slots)
+            if not endpoint.healthy:
+                # Give it one more request after the cool-down
+                endpoint.retry_at = now + self.retry_after
+            endpoint.outstanding += 1
+            slot = endpoint.free_slots.pop(0) if pin_slot and endpoint.free_slots else None
+            if endpoint.first_started is None:
+                endpoint.first_started = time.perf_counter()
+            return EndpointLease(endpoint, slot)
+
+    def release(self, lease, failed=False, output=None, stats=None):
+        """
+        Return a reservation and record the outcome of its request.
+
+        Args:
+            lease (EndpointLease): Result of acquire.
+            failed (bool): True if the endpoint failed, which counts towards taking it out of rotation.
+            output (str | None): Generated text of a successful request, for the throughput
+                statistics; None if the request was abandoned for other reasons.
+            stats (dict | None): Request statistics with 'completion_tokens', if the server reported them.
+        """
+        endpoint = lease.endpoint
+        finished = time.perf_counter()
+        with self._lock:
+            endpoint.outstanding -= 1
+            if lease.slot is not None:
+                endpoint.free_slots.append(lease.slot)
+                endpoint.free_slots.sort()
+
+            if failed:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if not endpoint.healthy:
+                    endpoint.retry_at = time.monotonic() + self.retry_after
+                return
+            if output is None:
+                return
+
+            endpoint.consecutive_failures = 0
+            endpoint.requests += 1
+            endpoint.busy_seconds += finished - lease.started
+            endpoint.output_chars += len(output)
+            endpoint.output_tokens += (stats or {}).get("completion_tokens") or 0
+            endpoint.last_finished = finished
+
+    def report(self):
+        """
+        Print the request statistics of every endpoint.
+        """
+        for summary in (endpoint.summary() for endpoint in self.endpoints):
+            state = "up" if summary["healthy"] else "DOWN"
+            parts = [f"{summary['requests']} requests", f"{summary['failures']} failures"]
+            if summary["avg_latency_s"] is not None:
+                parts.append(f"{summary['avg_latency_s']:.2f}s avg")
+            if summary["chars_per_s"] is not None:
+                parts.append(f"{summary['chars_per_s']:.0f} chars/s")
+            if summary["tokens_per_s"] is not None:
+                parts.append(f"{summary['tokens_per_s']:.1f} tokens/s")
+            print(f"  [{state}] {summary['url']} ({summary['model']}): " + ", ".join(parts))
+
+
+def parse_endpoints(spec, default_model, default_slots=1):
+    """
+    Parse a comma-separated endpoint list such as
+    ``http://localhost:11434#mistral,http://localhost:11435#leolm-german``.
+
+    The part after '#' is a key of MODEL_ENV_FILES, whose .env file provides the
+    model name and N_PARALLEL slots, or a plain model name. The URL ``local`` loads
+    the model in this process instead, e.g. ``local#mistral``; it has a single slot.
+
+    Args:
+        spec (str): The endpoint list.
+        default_model (str): Model name of entries without '#'.
+        default_slots (int): Slots of entries that do not name a model .env file.
+
+    Returns:
+        list[Endpoint]: The endpoints.
+    """
+    endpoints = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        url, _, model = entry.partition("#")
+        local = url == "local"
+        if model in MODEL_ENV_FILES:
+            settings = read_server_settings(MODEL_ENV_FILES[model])
+            url = local_url(MODEL_ENV_FILES[model]) if local else url
+            endpoints.append(Endpoint(url, settings["model_name"], 1 if local else settings["n_parallel"]))
+        elif local:
+            endpoints.append(Endpoint(local_url(), model or default_model))
+        else:
+            endpoints.append(Endpoint(url, model or default_model, default_slots))
+    return endpoints
+
+
+def start_local_endpoints(spec):
+    """
+    Start or reuse the servers of an endpoint list that run on this machine.
+
+    Only entries on localhost that name a key of MODEL_ENV_FILES are started;
+    other endpoints are expected to be running already.
+
+    Args:
+        spec (str): Endpoint list, see parse_endpoints.
+    """
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        url, _, model = entry.partition("#")
+        parts = urlsplit(url)
+        if model in MODEL_ENV_FILES and parts.hostname in ("localhost", "127.0.0.1") and parts.port:
+            ensure_server(MODEL_ENV_FILES[model], port=parts.port)
@@ -1,114 +1,580 @@
 import os
-from yt_dlp import YoutubeDL
+import subprocess
+import time
+import wave
 import speech_recognition as sr
-from pydub import AudioSegment
 
-def download_audio(url, output_audio="audio.wav"):
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from cache import hash_key
+from concurrency import batched, ordered_map
+from metrics import METRICS, stage
+from recognizers import GoogleBackend, is_transcription_error
+from vad import iter_voiced_segments
+
+# Defaults for the concurrent transcription stage
+TRANSCRIBE_WORKERS = 4
+TRANSCRIBE_TIMEOUT = 30
+TRANSCRIBE_RETRIES = 3
+TRANSCRIBE_BACKOFF = 1.0
+
+# Recognizer-ready PCM format produced by ffmpeg
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+# Chunking modes: fixed-length cuts or silence-aware (voice activity) cuts
+CHUNKING_MODES = ("fixed", "vad")
+
+class AudioChunk(sr.AudioData):
     """
-    Downloads audio from a YouTube video and converts it to a 16kHz mono WAV file.
+    Audio data for one chunk, with its position in the source audio.
+
+    Attributes:
+        index (int): Position of the chunk in the stream.
+        start_ms (int): Offset of the first sample in milliseconds.
+        end_ms (int): Offset just after the last sample in milliseconds.
+    """
+
+    def __init__(self, frame_data, sample_rate, sample_width, index, start_sample):
+        super().__init__(frame_data, sample_rate, sample_width)
+        self.index = index
+        self.start_ms = start_sample * 1000 // sample_rate
+        self.end_ms = (start_sample + len(frame_data) // sample_width) * 1000 // sample_rate
+
+def get_ffmpeg_executable():
+    """
+    Returns the ffmpeg binary from the local 'bin' folder, falling back to the one on PATH.
+
+    Returns:
+        str: Path or name of the ffmpeg executable.
+    """
+    name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
+    local_ffmpeg = os.path.join(os.getcwd(), "bin", name)
+    return local_ffmpeg if os.path.exists(local_ffmpeg) else "ffmpeg"
+
+def resolve_audio_source(url):
+    """
+    Resolves the direct media URL of a video's best audio stream without downloading it.
 
     Args:
         url (str): URL of the YouTube video.
-        output_audio (str): Output filename for the converted audio.
 
     Returns:
-        str: Path to the processed audio file.
+        dict: yt-dlp info for the selected format, including 'url' and 'http_headers'.
     """
-    ffmpeg_path = os.path.join(os.getcwd(), "bin")
+    from yt_dlp import YoutubeDL
 
     ydl_opts = {
-        'ffmpeg_location': ffmpeg_path,
         'format': 'bestaudio/best',
-        'outtmpl': 'downloaded_audio.%(ext)s',
         'quiet': True,
         'noplaylist': True,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'wav',
-            'preferredquality': '192',
-        }],
     }
-
     with YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+        return ydl.extract_info(url, download=False)
+
+def get_video_id(url):
+    """
+    Returns a stable ID for a video URL without contacting the site.
+
+    Args:
+        url (str): URL of the video.
+
+    Returns:
+        str: "<extractor>-<id>", or a hash of the URL if no extractor recognizes it.
+    """
+    from yt_dlp.extractor import gen_extractor_classes
+
+    for extractor in gen_extractor_classes():
+        if extractor.ie_key() != "Generic" and extractor.suitable(url):
+            video_id = extractor.get_temp_id(url)
+            if video_id:
+                return f"{extractor.ie_key()}-{video_id}"
+    return f"url-{hash_key(url)[:16]}"
+
+def build_ffmpeg_command(info, output, copy_to=None):
+    """
+    Builds an ffmpeg command that downloads, decodes and resamples in a single pass.
+
+    Args:
+        info (dict): yt-dlp info returned by resolve_audio_source.
+        output (str): Output path, or "pipe:1" to stream raw PCM to stdout.
+        copy_to (str | None): Optional WAV path that receives a copy of the same audio.
+
+    Returns:
+        list of str: The ffmpeg command line.
+    """
+    command = [get_ffmpeg_executable(), "-nostdin", "-loglevel", "error", "-y"]
+    headers = "".join(f"{key}: {value}\r\n" for key, value in (info.get("http_headers") or {}).items())
+    if headers:
+        command += ["-headers", headers]
+    command += ["-i", info["url"]]
+    pcm_options = ["-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-acodec", "pcm_s16le"]
+    command += pcm_options + ["-f", "s16le" if output == "pipe:1" else "wav", output]
+    if copy_to:
+        command += pcm_options + ["-f", "wav", copy_to]
+    return command
+
+def _children_cpu_time():
+    """Returns the CPU seconds used by finished child processes, or None where unsupported."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def _record_transcode_timings(timings, started, cpu_started):
+    """Stores wall time of the ffmpeg pass and splits it into decode CPU and network wait."""
+    timings["transcode"] = time.perf_counter() - started
+    cpu_finished = _children_cpu_time()
+    if cpu_started is not None and cpu_finished is not None:
+        timings["decode_resample_cpu"] = cpu_finished - cpu_started
+        timings["network_wait"] = max(0.0, timings["transcode"] - timings["decode_resample_cpu"])
 
-    downloaded_file = "downloaded_audio.wav"
-    if not os.path.exists(downloaded_file):
-        raise Exception("Audio file not found after download.")
+def _record_download_metrics(timings, pcm_bytes):
+    """Records a finished download as one call of the "download" stage."""
+    METRICS.record("download", timings.get("resolve", 0.0) + timings.get("transcode", 0.0), bytes=pcm_bytes,
+                   audio_seconds=pcm_bytes / (SAMPLE_RATE * SAMPLE_WIDTH), resolve_seconds=timings.get("resolve"),
+                   decode_cpu_seconds=timings.get("decode_resample_cpu"),
+                   network_wait_seconds=timings.get("network_wait"))
 
-    sound = AudioSegment.from_wav(downloaded_file)
-    sound = sound.set_frame_rate(16000).set_channels(1)
-    sound.export(output_audio, format="wav")
-    os.remove(downloaded_file)
+class _ReadTimer:
+    """Wraps a frame reader and adds up the seconds spent waiting for its data in ``seconds``."""
 
+    def __init__(self, read_frames):
+        self.read_frames = read_frames
+        self.seconds = 0.0
+
+    def __call__(self, count):
+        started = time.perf_counter()
+        try:
+            return self.read_frames(count)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+def _measure_chunks(chunks, reader):
+    """
+    Records the time spent cutting each chunk as the "split" stage.
+
+    Reads through ``reader`` are left out: waiting for ffmpeg is download time
+    and is already counted in the "download" stage.
+    """
+    iterator = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        waited = reader.seconds
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        elapsed = time.perf_counter() - started - (reader.seconds - waited)
+        METRICS.record("split", max(0.0, elapsed), bytes=len(chunk.frame_data),
+                       audio_seconds=(chunk.end_ms - chunk.start_ms) / 1000)
+        yield chunk
+
+def print_timings(timings):
+    """
+    Prints a per-phase timing breakdown.
+
+    Args:
+        timings (dict): Phase name to seconds.
+    """
+    print("  Timing: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
+
+def download_audio(url, output_audio="audio.wav", timings=None):
+    """
+    Downloads audio from a YouTube video and converts it to a 16kHz mono WAV file.
+
+    The stream is fetched, decoded and resampled by a single ffmpeg pass, so no
+    intermediate full-quality file is written.
+
+    Args:
+        url (str): URL of the YouTube video.
+        output_audio (str): Output filename for the converted audio.
+        timings (dict | None): Receives the seconds spent per phase: 'resolve',
+            'transcode' and, where supported, 'decode_resample_cpu' and 'network_wait'.
+
+    Returns:
+        str: Path to the processed audio file.
+
+    Raises:
+        RuntimeError: If ffmpeg fails to produce the audio file.
+    """
+    timings = {} if timings is None else timings
+
+    started = time.perf_counter()
+    info = resolve_audio_source(url)
+    timings["resolve"] = time.perf_counter() - started
+
+    # ffmpeg writes to a temp file that replaces the output once complete, so an
+    # interrupted download never leaves a truncated file behind
+    temp_audio = output_audio + ".tmp"
+    started = time.perf_counter()
+    cpu_started = _children_cpu_time()
+    result = subprocess.run(build_ffmpeg_command(info, temp_audio), capture_output=True)
+    _record_transcode_timings(timings, started, cpu_started)
+
+    if result.returncode != 0 or not os.path.exists(temp_audio):
+        if os.path.exists(temp_audio):
+            os.remove(temp_audio)
+        error = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffmpeg failed to produce {output_audio}: {error}")
+    os.replace(temp_audio, output_audio)
+
+    with wave.open(output_audio, "rb") as wav:
+        _record_download_metrics(timings, wav.getnframes() * wav.getsampwidth())
+    print_timings(timings)
     return output_audio
 
-def split_audio(audio_path, chunk_length_ms=60000):
+def _iter_pcm_chunks(read_frames, sample_rate, sample_width, chunk_length_ms=60000, chunking="fixed",
+                     vad_options=None):
+    """Yields AudioChunk objects from a callable that reads a number of PCM frames."""
+    if chunking not in CHUNKING_MODES:
+        raise ValueError(f"Unknown chunking mode '{chunking}', expected one of {CHUNKING_MODES}.")
+
+    if chunking == "vad":
+        if sample_width != 2:
+            raise ValueError("Silence-aware chunking requires 16-bit PCM.")
+        options = {"max_chunk_ms": chunk_length_ms, **(vad_options or {})}
+        segments = iter_voiced_segments(read_frames, sample_rate, **options)
+        for index, (start_sample, frames) in enumerate(segments):
+            yield AudioChunk(frames, sample_rate, sample_width, index, start_sample)
+        return
+
+    frames_per_chunk = max(1, sample_rate * chunk_length_ms // 1000)
+    index = 0
+    while True:
+        frames = read_frames(frames_per_chunk)
+        if not frames:
+            break
+        yield AudioChunk(frames, sample_rate, sample_width, index, index * frames_per_chunk)
+        index += 1
+
+def format_offset(ms):
     """
-    Splits a WAV audio file into chunks of a specified duration.
+    Formats a millisecond offset as H:MM:SS.s.
 
     Args:
-        audio_path (str): Path to the audio file.
-        chunk_length_ms (int): Duration of each chunk in milliseconds.
+        ms (int): Offset in milliseconds.
 
     Returns:
-        list of str: List of file paths to the audio chunks.
+        str: The formatted offset.
+    """
+    hours, rest = divmod(ms, 3600000)
+    minutes, rest = divmod(rest, 60000)
+    return f"{hours}:{minutes:02d}:{rest / 1000:04.1f}"
+
+def report_chunks(chunks):
     """
-    sound = AudioSegment.from_wav(audio_path)
-    chunks = []
-    for i in range(0, len(sound), chunk_length_ms):
-        chunk = sound[i:i + chunk_length_ms]
-        chunk_path = f"chunk_{i // chunk_length_ms}.wav"
-        chunk.export(chunk_path, format="wav")
-        chunks.append(chunk_path)
-    return chunks
+    Prints the start and end offset of each chunk as it passes.
 
-def transcribe_audio(audio_path, language="de-DE"):
+    Args:
+        chunks (iterable of AudioChunk): The audio chunks.
+
+    Yields:
+        AudioChunk: The same chunks, unchanged.
+    """
+    for chunk in chunks:
+        print(f"  Chunk {chunk.index + 1}: {format_offset(chunk.start_ms)} - {format_offset(chunk.end_ms)}")
+        yield chunk
+
+def stream_audio_chunks(url, chunk_length_ms=60000, timings=None, chunking="fixed", vad_options=None, cache=None):
+    """
+    Streams a video's audio as 16kHz mono chunks while it is still downloading.
+
+    ffmpeg fetches, decodes and resamples the stream in one pass and writes raw PCM
+    to a pipe, so the first chunk is available long before the download finishes.
+    With a cache, ffmpeg also writes the audio to the cache keyed by video ID, and
+    later runs for the same video read it from there instead of downloading again.
+
+    Args:
+        url (str): URL of the YouTube video.
+        chunk_length_ms (int): Duration of each chunk in milliseconds; the maximum
+            duration in "vad" mode.
+        timings (dict | None): Receives the seconds spent per phase, as in download_audio.
+        chunking (str): "fixed" for equal-length cuts or "vad" to cut at pauses and drop silence.
+        vad_options (dict | None): Extra keyword arguments for vad.iter_voiced_segments.
+        cache (cache.DiskCache | None): Cache for the decoded audio.
+
+    Yields:
+        AudioChunk: The next chunk, ready for the recognizer.
+
+    Raises:
+        RuntimeError: If ffmpeg exits with an error.
+    """
+    timings = {} if timings is None else timings
+
+    video_id = get_video_id(url) if cache is not None else None
+    cached_audio = cache.get_file("audio", video_id, ".wav") if cache is not None else None
+    if cached_audio:
+        print(f"  Using cached audio for {video_id}")
+        yield from iter_audio_chunks(cached_audio, chunk_length_ms, chunking, vad_options)
+        return
+
+    started = time.perf_counter()
+    info = resolve_audio_source(url)
+    timings["resolve"] = time.perf_counter() - started
+
+    copy_path = cache.temp_path("audio", ".wav") if cache is not None else None
+    started = time.perf_counter()
+    cpu_started = _children_cpu_time()
+    process = subprocess.Popen(build_ffmpeg_command(info, "pipe:1", copy_path), stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    pcm_bytes = 0
+    try:
+        def read_frames(count):
+            nonlocal pcm_bytes
+            data = process.stdout.read(count * SAMPLE_WIDTH)
+            pcm_bytes += len(data)
+            return data
+
+        reader = _ReadTimer(read_frames)
+        chunks = _iter_pcm_chunks(reader, SAMPLE_RATE, SAMPLE_WIDTH, chunk_length_ms, chunking, vad_options)
+        yield from _measure_chunks(chunks, reader)
+
+        error = process.stderr.read().decode("utf-8", errors="replace").strip()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed while streaming audio: {error}")
+        _record_transcode_timings(timings, started, cpu_started)
+        _record_download_metrics(timings, pcm_bytes)
+        print_timings(timings)
+
+        if copy_path:
+            cache.commit_file("audio", video_id, copy_path, ".wav")
+            copy_path = None
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        if copy_path and os.path.exists(copy_path):
+            os.remove(copy_path)
+
+def iter_audio_chunks(audio_path, chunk_length_ms=60000, chunking="fixed", vad_options=None):
+    """
+    Streams a 16kHz mono WAV file as in-memory chunks of a specified duration.
+
+    Only one chunk of PCM is read at a time and no chunk files are written, so
+    memory use does not grow with the length of the audio.
+
+    Args:
+        audio_path (str): Path to the audio file.
+        chunk_length_ms (int): Duration of each chunk in milliseconds; the maximum
+            duration in "vad" mode.
+        chunking (str): "fixed" for equal-length cuts or "vad" to cut at pauses and drop silence.
+        vad_options (dict | None): Extra keyword arguments for vad.iter_voiced_segments.
+
+    Yields:
+        AudioChunk: The next chunk, ready for the recognizer.
+
+    Raises:
+        ValueError: If the WAV file is not mono.
+    """
+    with wave.open(audio_path, "rb") as wav:
+        if wav.getnchannels() != 1:
+            raise ValueError(f"Expected mono audio in {audio_path}, got {wav.getnchannels()} channels.")
+        reader = _ReadTimer(wav.readframes)
+        yield from _measure_chunks(_iter_pcm_chunks(reader, wav.getframerate(), wav.getsampwidth(),
+                                                    chunk_length_ms, chunking, vad_options), reader)
+
+def split_audio(audio_path, chunk_length_ms=60000, chunking="fixed", vad_options=None):
     """
-    Transcribes spoken content in an audio file using Google Speech Recognition.
+    Splits a WAV audio file into in-memory chunks of a specified duration.
 
     Args:
         audio_path (str): Path to the audio file.
+        chunk_length_ms (int): Duration of each chunk in milliseconds; the maximum
+            duration in "vad" mode.
+        chunking (str): "fixed" for equal-length cuts or "vad" to cut at pauses and drop silence.
+        vad_options (dict | None): Extra keyword arguments for vad.iter_voiced_segments.
+
+    Returns:
+        list of AudioChunk: The audio chunks with their start and end offsets.
+    """
+    return list(iter_audio_chunks(audio_path, chunk_length_ms, chunking, vad_options))
+
+def load_audio_data(audio):
+    """
+    Returns audio as sr.AudioData, reading it from disk if a path is given.
+
+    Args:
+        audio (str | sr.AudioData): Path to an audio file or audio already in memory.
+
+    Returns:
+        sr.AudioData: The audio data.
+    """
+    if isinstance(audio, sr.AudioData):
+        return audio
+    with sr.AudioFile(audio) as source:
+        return sr.Recognizer().record(source)
+
+def transcribe_audio(audio, language="de-DE", recognizer=None, timeout=None, retries=0, backoff=1.0):
+    """
+    Transcribes spoken content using Google Speech Recognition.
+
+    Args:
+        audio (str | sr.AudioData): Path to an audio file or audio already in memory.
         language (str): Language code for transcription.
+        recognizer (sr.Recognizer | None): Recognizer to use; a new one is created if omitted.
+        timeout (float | None): Per-request timeout in seconds for the recognizer call.
+        retries (int): Number of retries after a request error or timeout.
+        backoff (float): Base delay in seconds, doubled after every failed attempt.
 
     Returns:
         str: Transcribed text or error message.
     """
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(audio_path) as source:
-        audio_data = recognizer.record(source)
-        try:
-            return recognizer.recognize_google(audio_data, language=language)
-        except sr.UnknownValueError:
-            return "[Unrecognized speech]"
-        except sr.RequestError as e:
-            return f"[API error: {e}]"
+    factory = (lambda: recognizer) if recognizer is not None else None
+    backend = GoogleBackend(timeout, retries, backoff, factory)
+    audio = load_audio_data(audio)
+    with stage("transcribe", chunks=1, bytes=len(audio.frame_data),
+               audio_seconds=len(audio.frame_data) / (audio.sample_rate * audio.sample_width)):
+        return backend.transcribe(audio, language)
 
-def main():
+def iter_transcriptions(chunks, language="de-DE", workers=TRANSCRIBE_WORKERS, timeout=TRANSCRIBE_TIMEOUT,
+                        retries=TRANSCRIBE_RETRIES, backoff=TRANSCRIBE_BACKOFF, recognizer_factory=None,
+                        cache=None, backend=None, journal=None):
     """
-    Main function to process a YouTube URL into transcribed text.
+    Transcribes audio chunks concurrently on a bounded worker pool, yielding text in chunk order.
+
+    Chunks are consumed lazily, so transcription can start while later chunks are still
+    being produced. Backends with a batch size above one receive several chunks per
+    call. A chunk that fails is replaced by an error marker so the remaining chunks
+    are kept.
+
+    Args:
+        chunks (iterable of sr.AudioData | str): Audio chunks or chunk file paths; may be a generator.
+        language (str): Language code for transcription.
+        workers (int): Number of chunks (or batches) transcribed at the same time.
+        timeout (float | None): Per-request timeout in seconds for each Google recognizer call.
+        retries (int): Number of retries per chunk after a request error or timeout.
+        backoff (float): Base delay in seconds between retries.
+        recognizer_factory (callable | None): Returns a recognizer per chunk, e.g. a stub
+            subclass of ``sr.Recognizer`` for local testing. Defaults to ``sr.Recognizer``.
+        cache (cache.DiskCache | None): Cache for transcripts, keyed by backend, chunk audio
+            and language. Error markers are never cached.
+        backend (object | None): Recognizer backend from recognizers.get_recognizer_backend;
+            Google with the timeout and retry settings above if omitted.
+        journal (journal.JobJournal | None): Journal of the job; chunks it has a transcript
+            for are not sent to the recognizer, and new transcripts are recorded in it.
+
+    Yields:
+        str: Transcribed text for every chunk, in the original order.
     """
-    url = input("Enter the YouTube video URL: ").strip()
-    print("Downloading and preparing audio...")
-    audio_file = download_audio(url)
+    backend = backend or GoogleBackend(timeout, retries, backoff, recognizer_factory)
+    workers = backend.max_workers or workers
 
-    print("Splitting audio into 60-second chunks...")
-    chunks = split_audio(audio_file)
+    def transcribe(batch):
+        positions = [position for position, _ in batch]
+        audios = [load_audio_data(chunk) for _, chunk in batch]
+        keys = [None] * len(audios)
+        texts = [None] * len(audios)
+        if journal is not None:
+            for i, audio in enumerate(audios):
+                texts[i] = journal.get("transcripts", positions[i], audio.frame_data)
+        if cache is not None:
+            for i, audio in enumerate(audios):
+                keys[i] = hash_key(backend.name, language, str(audio.sample_rate), audio.frame_data)
+                if texts[i] is None:
+                    texts[i] = cache.get_text("transcripts", keys[i])
+                    if texts[i] is not None and journal is not None:
+                        journal.record("transcripts", positions[i], audio.frame_data, texts[i])
+
+        missing = [i for i, text in enumerate(texts) if text is None]
+        if cache is not None:
+            METRICS.record("transcribe.cache", 0.0, hits=len(audios) - len(missing), misses=len(missing))
+        if missing:
+            pending = [audios[i] for i in missing]
+            pcm_bytes = sum(len(audio.frame_data) for audio in pending)
+            audio_seconds = sum(len(a.frame_data) / (a.sample_rate * a.sample_width) for a in pending)
+            with stage("transcribe", chunks=len(pending), bytes=pcm_bytes, audio_seconds=audio_seconds) as counts:
+                try:
+                    results = backend.transcribe_batch(pending, language)
+                except Exception as e:
+                    results = [f"[Transcription error: {e}]"] * len(missing)
+                    counts["errors"] = len(missing)
+            for i, text in zip(missing, results):
+                texts[i] = text
+                if is_transcription_error(text):
+                    continue
+                if keys[i] is not None:
+                    cache.set_text("transcripts", keys[i], text)
+                if journal is not None:
+                    journal.record("transcripts", positions[i], audios[i].frame_data, text)
+        return texts
+
+    for texts in ordered_map(transcribe, batched(enumerate(chunks), backend.batch_size), workers):
+        yield from texts
+
+def transcribe_chunks(chunks, language="de-DE", workers=TRANSCRIBE_WORKERS, timeout=TRANSCRIBE_TIMEOUT,
+                      retries=TRANSCRIBE_RETRIES, backoff=TRANSCRIBE_BACKOFF, recognizer_factory=None):
+    """
+    Transcribes audio chunks concurrently on a bounded worker pool.
 
-    print("Transcribing chunks...")
+    Args:
+        chunks (list of sr.AudioData | str): Audio chunks or chunk file paths.
+        language (str): Language code for transcription.
+        workers (int): Number of chunks transcribed at the same time.
+        timeout (float | None): Per-request timeout in seconds for each recognizer call.
+        retries (int): Number of retries per chunk after a request error or timeout.
+        backoff (float): Base delay in seconds between retries.
+        recognizer_factory (callable | None): Returns a recognizer per chunk. Defaults to ``sr.Recognizer``.
+
+    Returns:
+        list of str: Transcribed text for every chunk, in the original order.
+    """
     all_text = []
-    for i, chunk in enumerate(chunks):
-        print(f"  Transcribing chunk {i + 1}/{len(chunks)}...")
-        text = transcribe_audio(chunk, language="de-DE")
+    transcriptions = iter_transcriptions(chunks, language, workers, timeout, retries, backoff, recognizer_factory)
+    for i, text in enumerate(transcriptions):
+        print(f"  Transcribed chunk {i + 1}/{len(chunks)}")
         all_text.append(text)
-        os.remove(chunk)
+    return all_text
+
+def main(resume=False):
+    """
+    Main function to process a YouTube URL into transcribed text.
+
+    The audio and every finished transcript are kept in the job's journal until the
+    run completes, so a run that fails part-way can be continued with ``resume``.
+
+    Args:
+        resume (bool): Continue an interrupted run of the same video instead of starting over.
+    """
+    from journal import open_journal, remove_orphans
+
+    remove_orphans(".", recursive=False)
+    url = input("Enter the YouTube video URL: ").strip()
+    journal = open_journal(url, {"language": "de-DE", "chunking": "vad", "recognizer": "google"}, resume)
+    if resume and os.path.exists(journal.audio_path):
+        print("Using the audio downloaded by the interrupted run...")
+        audio_file = journal.audio_path
+    else:
+        print("Downloading and preparing audio...")
+        audio_file = download_audio(url, journal.audio_path)
+
+    print(f"Transcribing speech segments of up to 60 seconds with {TRANSCRIBE_WORKERS} workers...")
+    chunks = report_chunks(iter_audio_chunks(audio_file, chunking="vad"))
+    try:
+        all_text = list(iter_transcriptions(chunks, language="de-DE", journal=journal))
+    except Exception:
+        print("❌ Transcription failed; run again with --resume to continue where it stopped.")
+        raise
 
     output_path = "output.txt"
     with open(output_path, "w", encoding="utf-8") as f:
         f.write("\n\n".join(all_text))
 
+    failed = sum(1 for text in all_text if is_transcription_error(text))
+    if failed:
+        print(f"❌ {failed} of {len(all_text)} chunks could not be transcribed; the text is saved to {output_path}. "
+              f"Run again with --resume to redo only those chunks.")
+        raise SystemExit(1)
+
     print(f"Done! Full transcription saved to {output_path}")
-    os.remove(audio_file)
+    journal.finish()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Transcribe the audio of a YouTube video.")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run of the same video.")
+    main(parser.parse_args().resume)
\ No newline at end of file
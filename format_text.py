@@ -1,134 +1,1114 @@
-import requests
 import re
-import tiktoken
-import os
-from dotenv import load_dotenv
+import itertools
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 
+from cache import DiskCache, hash_key
+from concurrency import ordered_map, prefetch, ready_batches
+from config import config
+from endpoints import Endpoint, EndpointPool, NoHealthyEndpoint, parse_endpoints, start_local_endpoints
+from llm_local import get_local_llm, is_local_url, local_url
+from llm_server import SERVER_URL, ensure_server
+from metrics import METRICS, stage
+from output_guard import OutputDiverged, OutputGuard, check_output
+from overlap import ALIGN_SLACK, add_context, stitch_overlaps
+from punctuation import get_punctuation_model, split_paragraphs
+from token_counter import get_token_counter
 
-def load_model_name():
+API_URL = f"{SERVER_URL}/v1/chat/completions"
+
+# Formatting engines: the LLM alone, the punctuation model alone, or the punctuation
+# model followed by the LLM as a refinement pass
+FORMAT_ENGINES = ("llm", "punct", "punct+llm")
+
+# Chat-template tokens added around each message, and expected output/input token ratio
+MESSAGE_OVERHEAD_TOKENS = 8
+OUTPUT_TOKEN_RATIO = 1.15
+
+# Tokens a request may generate beyond the expected output of its chunk
+GENERATION_MARGIN_TOKENS = 32
+
+# Sequences that only appear once the model has finished the text and starts a new
+# turn or a comment about it
+STOP_SEQUENCES = ("</s>", "[INST]", "<|im_end|>", "\n\n\n", "\nHinweis:", "\nAnmerkung:", "\nNote:")
+
+SYSTEM_PROMPT = (
+    "Du bist ein Assistent, der nur Zeichensetzung "
+    "in einem deutschen Transkript ergänzt. "
+    "Du darfst absolut **nichts** am Textinhalt ändern. "
+    "Keine Umformulierungen, keine Löschungen, keine neuen Wörter oder Absätze."
+)
+INSTRUCTION_PROMPT = "Bitte füge nur passende Zeichensetzung (.,!?…) zum folgenden Text hinzu. Verändere nichts."
+
+# Static prompt prefix shared by every request; keeping it byte-identical lets the
+# server reuse its evaluated KV cache instead of re-reading it for each chunk
+PROMPT_PREFIX = (
+    {"role": "system", "content": SYSTEM_PROMPT},
+    {"role": "user", "content": INSTRUCTION_PROMPT},
+)
+
+# Former module constants, now resolved lazily from config
+_CONFIG_ALIASES = {
+    "MODEL_NAME": "model_name",
+    "N_PARALLEL": "n_parallel",
+    "N_CTX": "n_ctx",
+    "TOKEN_COUNTER": "token_counter",
+    "SLOT_PINNING": "slot_pinning",
+    "LLM_ENDPOINTS": "llm_endpoints",
+}
+
+
+def __getattr__(name):
+    if name in _CONFIG_ALIASES:
+        return getattr(config, _CONFIG_ALIASES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class FormattingCancelled(RuntimeError):
+    """Raised when a run is cancelled before all chunks are transcribed and formatted."""
+
+
+class LLMAPIError(Exception):
+    """Raised when the LLM server answers with an error; ``status_code`` is None for errors inside a stream."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def create_session(pool_size=None):
     """
-    Load the model name from the active environment file specified in 'active_env.txt'.
+    Create an HTTP session that keeps up to ``pool_size`` connections alive.
+
+    Args:
+        pool_size (int | None): Maximum number of pooled keep-alive connections;
+            config.n_parallel if omitted.
 
     Returns:
-        str: The model name retrieved from the environment file.
+        requests.Session: Session to share between formatting requests.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
 
-    Raises:
-        RuntimeError: If MODEL_NAME is not found in the environment file.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or config.n_parallel)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_default_counter(api_url=API_URL):
+    """
+    Return the token counter selected by config.token_counter for the active model.
+
+    Args:
+        api_url (str | endpoints.EndpointPool): Endpoint the chunks are sent to. The
+            "server" counter asks its server, or the first server of a pool, to tokenize.
+
+    Returns:
+        object: Counter with ``encode_batch`` and ``decode``, see token_counter.
     """
-    with open("active_env.txt", "r", encoding="utf-8") as file:
-        env_file = file.read().strip()
+    urls = [endpoint.url for endpoint in get_endpoint_pool(api_url).endpoints]
+    servers = [url.split("/v1/")[0] for url in urls if url.startswith(("http://", "https://"))]
+    return get_token_counter(config.token_counter, config.model_path, servers[0] if servers else None)
 
-    load_dotenv(env_file)
-    model_name = os.getenv("MODEL_NAME") or os.getenv("MODEL")
 
-    if not model_name:
-        raise RuntimeError("MODEL_NAME or MODEL not found in the .env file.")
+def get_chunk_budget(counter=None, n_ctx=None, overlap_tokens=0):
+    """
+    Derive the chunk size and generation limit from the context window.
 
-    return model_name
+    The prompt overhead is measured with the model's tokenizer, and the remaining
+    context is split between the input chunk and the punctuated output, which is
+    expected to be slightly longer than the input.
 
+    Args:
+        counter (object | None): Token counter; the default counter if omitted.
+        n_ctx (int | None): Context window of the served model; config.n_ctx if omitted.
+        overlap_tokens (int): Context from the previous chunk sent along with every
+            chunk; it is taken from the chunk's share of the input.
 
-API_URL = "http://localhost:11434/v1/chat/completions"
-MODEL_NAME = load_model_name()
+    Returns:
+        tuple[int, int]: Maximum input tokens per chunk and ``max_tokens`` for generation.
+    """
+    n_ctx = n_ctx or config.n_ctx
+    counter = counter or get_default_counter()
+    prompt_tokens = sum(len(tokens) for tokens in counter.encode_batch([SYSTEM_PROMPT, INSTRUCTION_PROMPT]))
+    overhead = prompt_tokens + 3 * MESSAGE_OVERHEAD_TOKENS + 1
+    available = n_ctx - overhead
+    input_tokens = max(32, int(available / (1 + OUTPUT_TOKEN_RATIO)))
+    return max(32, input_tokens - overlap_tokens), max(32, available - input_tokens)
 
 
-def split_text_by_tokens(text, max_tokens=300):
+def get_generation_budget(chunk, counter, limit=None):
+    """
+    Return the number of tokens a chunk's response may generate.
+
+    Punctuation adds few tokens, so the budget is the expected output length plus a
+    small margin instead of a fixed limit; a model that starts rambling is cut off
+    early rather than after the whole context.
+
+    Args:
+        chunk (str): The text chunk to format.
+        counter (object): Token counter.
+        limit (int | None): Upper bound, e.g. from get_chunk_budget.
+
+    Returns:
+        int: ``max_tokens`` for the request.
+    """
+    tokens = len(counter.encode_batch([chunk])[0])
+    budget = int(tokens * OUTPUT_TOKEN_RATIO) + GENERATION_MARGIN_TOKENS
+    return min(budget, limit) if limit else budget
+
+
+def split_text_by_tokens(text, max_tokens=300, counter=None):
     """
     Split the input text into smaller chunks based on token count.
 
+    All sentences are encoded in a single batched call, and chunks are assembled
+    from lists of sentences instead of repeated string concatenation.
+
     Args:
         text (str): The input text to split.
         max_tokens (int): Maximum number of tokens per chunk.
+        counter (object | None): Token counter; the shared tiktoken counter if omitted.
 
     Returns:
         list[str]: A list of text chunks not exceeding the specified token limit.
     """
-    enc = tiktoken.get_encoding("cl100k_base")
+    enc = counter or get_token_counter("tiktoken")
     sentences = re.split(r'(?<=[.؟!])\s+', text.strip())
     chunks = []
-    current_chunk = ""
+    current_chunk = []
     current_tokens = 0
 
-    for sentence in sentences:
-        sentence_tokens = enc.encode(sentence)
+    for sentence, sentence_tokens in zip(sentences, enc.encode_batch(sentences)):
         token_count = len(sentence_tokens)
 
         if token_count > max_tokens:
+            if current_chunk:
+                chunks.append(" ".join(current_chunk).strip())
+                current_chunk = []
+                current_tokens = 0
             for i in range(0, token_count, max_tokens):
-                sub_tokens = sentence_tokens[i:i + max_tokens]
-                sub_text = enc.decode(sub_tokens)
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = ""
-                    current_tokens = 0
-                chunks.append(sub_text.strip())
+                chunks.append(enc.decode(sentence_tokens[i:i + max_tokens]).strip())
         elif current_tokens + token_count <= max_tokens:
-            current_chunk += sentence + " "
+            current_chunk.append(sentence)
             current_tokens += token_count
         else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence + " "
+            chunks.append(" ".join(current_chunk).strip())
+            current_chunk = [sentence]
             current_tokens = token_count
 
     if current_chunk:
-        chunks.append(current_chunk.strip())
+        chunks.append(" ".join(current_chunk).strip())
 
     return chunks
 
 
-def format_text_to_paragraphs(raw_text: str) -> str:
+def build_messages(chunk):
+    """
+    Build the chat messages for a chunk: the static prompt prefix followed by the chunk.
+
+    Args:
+        chunk (str): The text chunk to format.
+
+    Returns:
+        list[dict]: Chat messages.
+    """
+    return [dict(message) for message in PROMPT_PREFIX] + [{"role": "user", "content": chunk}]
+
+
+def read_request_stats(body, wall_seconds):
+    """
+    Extract prompt and generation statistics from a chat completion response.
+
+    llama.cpp's native server reports ``timings``; llama-cpp-python and other
+    OpenAI-compatible servers only report ``usage``.
+
+    Args:
+        body (dict): Decoded response body.
+        wall_seconds (float): Client-side duration of the request.
+
+    Returns:
+        dict: Token counts and timings that the server reported, plus 'wall_ms'.
+    """
+    usage = body.get("usage") or {}
+    timings = body.get("timings") or {}
+    stats = {
+        "prompt_tokens": usage.get("prompt_tokens", timings.get("prompt_n")),
+        "completion_tokens": usage.get("completion_tokens", timings.get("predicted_n")),
+        "wall_ms": round(wall_seconds * 1000, 1),
+    }
+    if timings:
+        stats["prompt_ms"] = timings.get("prompt_ms")
+        stats["prompt_evaluated"] = timings.get("prompt_n")
+        stats["prompt_cached"] = timings.get("cache_n")
+        stats["generation_ms"] = timings.get("predicted_ms")
+    return stats
+
+
+def report_request_stats(stats):
+    """
+    Print the statistics of one formatting request on a single line.
+
+    Args:
+        stats (dict): Result of read_request_stats.
+    """
+    parts = [f"{stats['wall_ms']:.0f} ms total"]
+    if stats.get("prompt_ms") is not None:
+        cached = f", {stats['prompt_cached']} cached" if stats.get("prompt_cached") is not None else ""
+        parts.append(f"prompt eval {stats['prompt_ms']:.0f} ms for {stats['prompt_evaluated']} tokens{cached}")
+    elif stats.get("prompt_tokens") is not None:
+        parts.append(f"{stats['prompt_tokens']} prompt tokens")
+    if stats.get("completion_tokens") is not None:
+        parts.append(f"{stats['completion_tokens']} generated tokens")
+    print("  LLM request: " + ", ".join(parts))
+
+
+def record_request_metrics(stats, output, retry=0, rejected=False):
+    """
+    Add one formatting request to the "llm" stage of the run metrics.
+
+    Args:
+        stats (dict): Result of read_request_stats.
+        output (str): The generated text.
+        retry (int): Number of the attempt for the chunk; requests after the first count as retries.
+        rejected (bool): The output guard rejected the response.
+    """
+    METRICS.record("llm", stats["wall_ms"] / 1000, chars=len(output), prompt_tokens=stats.get("prompt_tokens"),
+                   completion_tokens=stats.get("completion_tokens"), prompt_evaluated=stats.get("prompt_evaluated"),
+                   prompt_cached=stats.get("prompt_cached"), prompt_ms=stats.get("prompt_ms"),
+                   generation_ms=stats.get("generation_ms"), retries=1 if retry else 0,
+                   rejected=1 if rejected else 0)
+
+
+def build_payload(chunk, model_name=None, max_tokens=1024, slot=None, stream=False):
+    """
+    Build the chat completion request body for a chunk.
+
+    The request asks the server to keep the evaluated prompt in its cache
+    (``cache_prompt``), so only the chunk itself is evaluated after the first request,
+    and to stop at STOP_SEQUENCES.
+
+    Args:
+        chunk (str): The text chunk to format.
+        model_name (str | None): Model name sent with the request; config.model_name if omitted.
+        max_tokens (int): Maximum number of tokens to generate.
+        slot (int | None): Server slot to run the request in (``id_slot``).
+        stream (bool): Ask for the response as server-sent events.
+
+    Returns:
+        dict: The JSON payload.
+    """
+    payload = {
+        "model": model_name or config.model_name,
+        "messages": build_messages(chunk),
+        "temperature": 0.0,
+        "max_tokens": max_tokens,
+        "stop": list(STOP_SEQUENCES),
+        "cache_prompt": True
+    }
+    if slot is not None:
+        payload["id_slot"] = slot
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _raise_api_error(response):
+    try:
+        error_msg = response.json().get("error", {}).get("message", response.text)
+    except Exception:
+        error_msg = response.text
+    raise LLMAPIError(f"LLM API Error {response.status_code}: {error_msg}", response.status_code)
+
+
+@contextmanager
+def _local_errors():
+    """Report a request the in-process model rejects like a server would, with status 400."""
+    try:
+        yield
+    except ValueError as error:
+        raise LLMAPIError(f"LLM API Error 400: {error}", 400) from error
+
+
+def _iter_local_events(api_url, payload):
+    with _local_errors():
+        yield from get_local_llm(api_url).create_chat_completion(payload)
+
+
+def format_chunk(chunk, session=None, api_url=API_URL, model_name=None, max_tokens=1024, slot=None,
+                 stats=None):
+    """
+    Send a single text chunk to the LLM and return it with punctuation added.
+
+    Args:
+        chunk (str): The text chunk to format.
+        session (requests.Session | None): Session to reuse; a one-off request is made if omitted.
+        api_url (str): OpenAI-compatible chat completions endpoint, or the URL of an
+            in-process model, see llm_local.
+        model_name (str | None): Model name sent with the request; config.model_name if omitted.
+        max_tokens (int): Maximum number of tokens to generate.
+        slot (int | None): Server slot to run the request in (``id_slot``).
+        stats (dict | None): Receives the request statistics, see read_request_stats.
+
+    Returns:
+        str: The formatted chunk.
+
+    Raises:
+        LLMAPIError: If the server returns an error.
+        requests.RequestException: If the server cannot be reached.
+    """
+    import requests
+
+    payload = build_payload(chunk, model_name, max_tokens, slot)
+    started = time.perf_counter()
+    if is_local_url(api_url):
+        with _local_errors():
+            body = get_local_llm(api_url).create_chat_completion(payload)
+    else:
+        post = session.post if session is not None else requests.post
+        response = post(api_url, json=payload)
+        if response.status_code != 200:
+            _raise_api_error(response)
+        body = response.json()
+
+    if stats is not None:
+        stats.update(read_request_stats(body, time.perf_counter() - started))
+    return body["choices"][0]["message"]["content"].strip()
+
+
+def iter_sse_data(response):
+    """
+    Decode the ``data:`` events of a server-sent events response until ``[DONE]``.
+
+    Args:
+        response (requests.Response): Response opened with ``stream=True``.
+
+    Yields:
+        dict: The JSON payload of each event.
+    """
+    # SSE is UTF-8 by definition, but the content type rarely says so
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        yield json.loads(data)
+
+
+def stream_chunk(chunk, session=None, api_url=API_URL, model_name=None, max_tokens=1024, slot=None,
+                 stats=None):
+    """
+    Send a single text chunk to the LLM and yield the formatted text as it is generated.
+
+    Leading and trailing whitespace is dropped, so the joined pieces equal the
+    result of format_chunk. Closing the generator closes the connection, which
+    makes the server stop generating.
+
+    Args:
+        chunk (str): The text chunk to format.
+        session (requests.Session | None): Session to reuse; a one-off request is made if omitted.
+        api_url (str): OpenAI-compatible chat completions endpoint, or the URL of an
+            in-process model, see llm_local.
+        model_name (str | None): Model name sent with the request; config.model_name if omitted.
+        max_tokens (int): Maximum number of tokens to generate.
+        slot (int | None): Server slot to run the request in (``id_slot``).
+        stats (dict | None): Receives the request statistics once the stream is complete;
+            token counts and timings are only available if the server sends them.
+
+    Yields:
+        str: The next piece of the formatted chunk.
+
+    Raises:
+        LLMAPIError: If the server returns an error.
+        requests.RequestException: If the server cannot be reached.
+    """
+    import requests
+
+    payload = build_payload(chunk, model_name, max_tokens, slot, stream=True)
+    started = time.perf_counter()
+    if is_local_url(api_url):
+        events = _iter_local_events(api_url, payload)
+        close = events.close
+    else:
+        post = session.post if session is not None else requests.post
+        response = post(api_url, json=payload, stream=True)
+        close = response.close
+        if response.status_code != 200:
+            close()
+            _raise_api_error(response)
+        events = iter_sse_data(response)
+
+    try:
+        summary = {}
+        pending = ""
+        started_text = False
+        for event in events:
+            if "error" in event:
+                error = event["error"]
+                raise LLMAPIError(f"LLM API Error: {error.get('message', error) if isinstance(error, dict) else error}")
+            if event.get("usage") or event.get("timings"):
+                summary = event
+
+            choices = event.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if not delta:
+                continue
+            if not started_text:
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+                started_text = True
+
+            # Hold back trailing whitespace until more text follows it
+            text = pending + delta
+            piece = text.rstrip()
+            pending = text[len(piece):]
+            if piece:
+                yield piece
+
+        if stats is not None:
+            stats.update(read_request_stats(summary, time.perf_counter() - started))
+    finally:
+        close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(api_url=API_URL):
+    """
+    Return the shared endpoint pool that requests for ``api_url`` are sent to.
+
+    The default API_URL maps to the servers in config.llm_endpoints when it is set,
+    or to the model loaded in this process when config.llm_backend is "local"; any
+    other URL is a pool of one endpoint serving config.model_name.
+
+    Args:
+        api_url (str | endpoints.EndpointPool): Chat completions URL, or a pool,
+            which is returned unchanged.
+
+    Returns:
+        endpoints.EndpointPool: The pool.
+    """
+    if isinstance(api_url, EndpointPool):
+        return api_url
+
+    spec = config.llm_endpoints if api_url == API_URL else ""
+    local = api_url == API_URL and config.llm_backend == "local"
+    key = (api_url, spec, local, config.model_name, config.n_parallel)
+    with _pools_lock:
+        if key not in _pools:
+            if spec:
+                endpoints = parse_endpoints(spec, config.model_name, config.n_parallel)
+            elif local:
+                endpoints = [Endpoint(local_url(config.env_file), config.model_name)]
+            else:
+                endpoints = [Endpoint(api_url, config.model_name, config.n_parallel)]
+            _pools[key] = EndpointPool(endpoints)
+        return _pools[key]
+
+
+def get_format_engine(engine=None):
+    """
+    Return the formatting engine to use.
+
+    Args:
+        engine (str | None): One of FORMAT_ENGINES; config.format_engine if omitted.
+
+    Returns:
+        str: The engine.
+
+    Raises:
+        ValueError: If the engine is unknown.
+    """
+    engine = engine or config.format_engine
+    if engine not in FORMAT_ENGINES:
+        raise ValueError(f"Unknown formatting engine '{engine}', expected one of {FORMAT_ENGINES}.")
+    return engine
+
+
+def get_format_settings(api_url=API_URL, engine=None):
+    """
+    Return the settings that decide the formatted text, for journal fingerprints.
+
+    Args:
+        api_url (str | endpoints.EndpointPool): Endpoint or pool the text is formatted with.
+        engine (str | None): One of FORMAT_ENGINES; config.format_engine if omitted.
+
+    Returns:
+        dict: The engine, a hash of the prompt, and the LLM models and punctuation model it uses.
+    """
+    engine = get_format_engine(engine)
+    settings = {"engine": engine, "prompt": hash_key(SYSTEM_PROMPT, INSTRUCTION_PROMPT)}
+    if engine != "punct":
+        settings["models"] = get_endpoint_pool(api_url).model_names
+    if engine != "llm":
+        settings["punct_model"] = config.punct_model
+    return settings
+
+
+def ensure_llm_servers():
+    """
+    Start the local LLM servers used for formatting, or reuse the running ones, and
+    load the models of in-process endpoints.
+
+    Nothing is started if the punctuation model formats the text on its own.
+    """
+    if get_format_engine() == "punct":
+        return
+    for endpoint in get_endpoint_pool().endpoints:
+        if is_local_url(endpoint.url):
+            get_local_llm(endpoint.url)
+    if config.llm_endpoints:
+        start_local_endpoints(config.llm_endpoints)
+    elif config.llm_backend != "local":
+        ensure_server(config.env_file)
+
+
+def _is_endpoint_failure(error):
+    """Tell server-side failures, which take an endpoint out of rotation, from errors caused by the request."""
+    import requests
+
+    if isinstance(error, requests.RequestException):
+        return True
+    return isinstance(error, LLMAPIError) and (error.status_code or 0) >= 500
+
+
+def _dispatch(pool, request):
+    """
+    Run ``request(lease)`` on the least loaded endpoint, moving on to the next healthy
+    endpoint when one fails. ``request`` returns the output text and request statistics,
+    and sets ``lease.emitted`` once it has passed output on, after which it is not retried.
+    """
+    tried = []
+    while True:
+        try:
+            lease = pool.acquire(exclude=tried, pin_slot=config.slot_pinning)
+        except NoHealthyEndpoint:
+            if tried:
+                raise last_error
+            raise
+
+        try:
+            output, stats = request(lease)
+        except Exception as error:
+            if not _is_endpoint_failure(error):
+                pool.release(lease)
+                raise
+            pool.release(lease, failed=True)
+            if lease.emitted:
+                raise
+            print(f"⚠️ {lease.endpoint.url} failed, trying another endpoint: {error}")
+            tried.append(lease.endpoint)
+            last_error = error
+            continue
+
+        pool.release(lease, output=output, stats=stats)
+        return output
+
+
+def _cache_lookup(cache, pool, chunk):
+    """Return a cached result of any model in the pool, or None."""
+    for model_name in pool.model_names:
+        cached = cache.get_text("formatted", hash_key(chunk, model_name, SYSTEM_PROMPT, INSTRUCTION_PROMPT))
+        if cached is not None:
+            METRICS.record("llm.cache", 0.0, hits=1)
+            return cached
+    METRICS.record("llm.cache", 0.0, misses=1)
+    return None
+
+
+def _format_guarded(chunk, attempt, emit=None):
+    """
+    Format a chunk, requesting the text again where the output strayed from it.
+
+    ``attempt(text, retry)`` formats a text and raises OutputDiverged when its output
+    stops following the input. The input after the last confirmed word is then sent
+    again, up to config.format_retries times, and kept unformatted after that, so no
+    words are lost or added.
+
+    Args:
+        chunk (str): The text chunk to format.
+        attempt (callable): Formats a text; ``retry`` is 0 for the whole chunk.
+        emit (callable | None): Receives the unformatted rest when the retries run out,
+            for streams whose attempts pass their output on themselves.
+
+    Returns:
+        str: The formatted chunk.
+    """
+    parts = []
+    text = chunk
+    last_error = None
+    for retry in range(config.format_retries + 1):
+        try:
+            parts.append(attempt(text, retry))
+            return " ".join(part for part in parts if part)
+        except OutputDiverged as error:
+            METRICS.record("llm.guard", 0.0, diverged=1)
+            last_error = error
+            parts.append(error.confirmed)
+            text = error.remaining
+            if not text:
+                # Only output after the end of the input was dropped
+                return " ".join(part for part in parts if part)
+            if retry < config.format_retries:
+                print(f"⚠️ {error}; requesting the last {len(text.split())} words again")
+
+    METRICS.record("llm.guard", 0.0, fallbacks=1)
+    print(f"⚠️ {last_error}; keeping the last {len(text.split())} words unformatted")
+    if emit is not None:
+        emit(text)
+    parts.append(text)
+    return " ".join(part for part in parts if part)
+
+
+def _journal_lookup(journal, cache, pool, index, chunk):
+    """Return the journaled or cached result of a chunk, journaling a cache hit, or None."""
+    if journal is not None:
+        recorded = journal.get("formatted", index, chunk)
+        if recorded is not None:
+            return recorded
+    cached = _cache_lookup(cache, pool, chunk) if cache is not None else None
+    if cached is not None and journal is not None:
+        journal.record("formatted", index, chunk, cached)
+    return cached
+
+
+def iter_punctuated_texts(texts, cancel_event=None, cache=None, journal=None, model=None):
+    """
+    Punctuate a stream of texts with the punctuation model as they arrive.
+
+    The texts that are ready when the model becomes free are punctuated together in
+    one batched call, so a backlog is worked off in batches without holding back the
+    first text.
+
+    Args:
+        texts (iterable of str): Unpunctuated texts, e.g. transcript chunks; may be a generator.
+        cancel_event (threading.Event | None): Set it to stop punctuating further texts.
+        cache (cache.DiskCache | None): Cache for punctuated texts, keyed by text and model.
+        journal (journal.JobJournal | None): Journal of the job; texts it has a result for
+            are not punctuated again, and new results are recorded in it.
+        model (punctuation.PunctuationModel | None): The model; the shared one if omitted.
+
+    Yields:
+        str: The punctuated texts, in order.
+
+    Raises:
+        FormattingCancelled: If ``cancel_event`` is set before all texts are punctuated.
+    """
+    model = model or get_punctuation_model()
+
+    def lookup(index, text):
+        if journal is not None:
+            recorded = journal.get("punctuated", index, text)
+            if recorded is not None:
+                return recorded
+        cached = cache.get_text("punctuated", hash_key(text, model.name)) if cache is not None else None
+        if cached is not None and journal is not None:
+            journal.record("punctuated", index, text, cached)
+        return cached
+
+    for batch in ready_batches(enumerate(texts), model.batch_size):
+        if cancel_event is not None and cancel_event.is_set():
+            raise FormattingCancelled("Formatting was cancelled.")
+        results = [lookup(index, text) for index, text in batch]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            punctuated = model.punctuate_batch([batch[i][1] for i in missing])
+            for i, result in zip(missing, punctuated):
+                index, text = batch[i]
+                results[i] = result
+                if cache is not None:
+                    cache.set_text("punctuated", hash_key(text, model.name), result)
+                if journal is not None:
+                    journal.record("punctuated", index, text, result)
+        yield from results
+
+
+def iter_formatted_chunks(chunks, parallel=None, api_url=API_URL, cancel_event=None, session=None,
+                          cache=None, limiter=None, max_new_tokens=1024, journal=None, overlap_tokens=0,
+                          counter=None):
+    """
+    Format text chunks with up to ``parallel`` requests in flight, yielding results in order.
+
+    Chunks are consumed lazily, so formatting can start while later chunks are still
+    being produced. Each request goes to the least loaded endpoint of the pool.
+
+    Args:
+        chunks (iterable of str): The text chunks to format; may be a generator.
+        parallel (int | None): Maximum number of concurrent requests; config.n_parallel if omitted.
+        api_url (str | endpoints.EndpointPool): OpenAI-compatible chat completions
+            endpoint, or a pool of them.
+        cancel_event (threading.Event | None): Set it to stop sending further chunks.
+        session (requests.Session | None): Session to reuse; a pooled one is created if omitted.
+        cache (cache.DiskCache | None): Cache for formatted chunks, keyed by chunk text,
+            model name and prompt.
+        limiter (threading.Semaphore | None): Shared limit on requests in flight, e.g.
+            across several jobs talking to the same server.
+        max_new_tokens (int): Maximum number of tokens to generate per chunk.
+        journal (journal.JobJournal | None): Journal of the job; chunks it has a result
+            for are not sent again, and new results are recorded in it.
+        overlap_tokens (int): Send every chunk with this many tokens from the end of the
+            previous one as context and stitch the results in the middle of the overlap,
+            see overlap.stitch_overlaps; chunks are formatted independently if 0.
+        counter (object | None): Token counter that measures the overlap and the generation
+            budget of every chunk; the default counter if omitted.
+
+    Every request may generate a little more than its chunk, see get_generation_budget,
+    and its output is checked against the chunk's words; where it strays, the rest of
+    the chunk is requested again, see _format_guarded.
+
+    Yields:
+        str: The formatted chunks, in the original order. With an overlap, the
+        paragraphs of the stitched text, which end at sentence ends instead of chunk ends.
+
+    Raises:
+        FormattingCancelled: If ``cancel_event`` is set before all chunks are formatted.
+        Exception: If an API call fails or returns an error.
+    """
+    if overlap_tokens:
+        overlaps = []
+        chunks = add_context(chunks, overlap_tokens, counter or get_default_counter(api_url), overlaps)
+        formatted = iter_formatted_chunks(chunks, parallel, api_url, cancel_event, session, cache, limiter,
+                                          max_new_tokens, journal, counter=counter)
+        pieces = stitch_overlaps(enumerate(formatted), overlaps, overlap_tokens + ALIGN_SLACK)
+        for _, paragraph in itertools.groupby(pieces, key=lambda item: item[0]):
+            yield "".join(piece for _, piece in paragraph)
+        return
+
+    parallel = parallel or config.n_parallel
+    counter = counter or get_default_counter(api_url)
+    pool = get_endpoint_pool(api_url)
+    own_session = session is None
+    if own_session:
+        session = create_session(parallel)
+
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            raise FormattingCancelled("Formatting was cancelled.")
+
+    def format_one(item):
+        index, chunk = item
+        recorded = _journal_lookup(journal, cache, pool, index, chunk)
+        if recorded is not None:
+            return recorded
+
+        def attempt(text, retry):
+            def request(lease):
+                stats = {}
+                formatted = format_chunk(text, session, lease.endpoint.url, lease.endpoint.model_name,
+                                         get_generation_budget(text, counter, max_new_tokens), lease.slot, stats)
+                report_request_stats(stats)
+                try:
+                    check_output(text, formatted)
+                except OutputDiverged:
+                    record_request_metrics(stats, formatted, retry, rejected=True)
+                    raise
+                record_request_metrics(stats, formatted, retry)
+                if cache is not None and not retry:
+                    key = hash_key(chunk, lease.endpoint.model_name, SYSTEM_PROMPT, INSTRUCTION_PROMPT)
+                    cache.set_text("formatted", key, formatted)
+                return formatted, stats
+
+            check_cancelled()
+            with limiter if limiter is not None else nullcontext():
+                check_cancelled()
+                return _dispatch(pool, request)
+
+        formatted = _format_guarded(chunk, attempt)
+        if journal is not None:
+            journal.record("formatted", index, chunk, formatted)
+        return formatted
+
+    try:
+        for formatted in ordered_map(format_one, enumerate(chunks), parallel):
+            check_cancelled()
+            yield formatted
+    finally:
+        if own_session:
+            session.close()
+
+
+def iter_formatted_tokens(chunks, parallel=None, api_url=API_URL, cancel_event=None, session=None,
+                          cache=None, limiter=None, max_new_tokens=1024, journal=None, overlap_tokens=0,
+                          counter=None):
+    """
+    Format text chunks with streamed responses, yielding the text as it is generated.
+
+    Up to ``parallel`` chunks are generated at the same time. Pieces of the chunk at
+    the head are yielded as they arrive; pieces of later chunks are buffered until
+    every earlier chunk is complete, so the output is always in chunk order.
+
+    Args:
+        chunks (iterable of str): The text chunks to format; may be a generator.
+        parallel (int | None): Maximum number of concurrent requests; config.n_parallel if omitted.
+        api_url (str | endpoints.EndpointPool): OpenAI-compatible chat completions
+            endpoint, or a pool of them.
+        cancel_event (threading.Event | None): Set it to stop formatting.
+        session (requests.Session | None): Session to reuse; a pooled one is created if omitted.
+        cache (cache.DiskCache | None): Cache for formatted chunks; shared with iter_formatted_chunks.
+        limiter (threading.Semaphore | None): Shared limit on requests in flight.
+        max_new_tokens (int): Maximum number of tokens to generate per chunk.
+        journal (journal.JobJournal | None): Journal of the job; a chunk is recorded once
+            its response is complete.
+        overlap_tokens (int): Context sent from the previous chunk, see iter_formatted_chunks.
+            The last words of every chunk are then held back until the seam with the
+            next chunk is known.
+        counter (object | None): Token counter that measures the overlap and the generation budgets.
+
+    Output is checked against the chunk's words as it streams, see iter_formatted_chunks;
+    pieces are passed on once their words are confirmed, so when a response strays, the
+    text already passed on stays valid and only the rest of the chunk is requested again.
+
+    Yields:
+        tuple[int, str]: Index of the chunk and the next piece of its formatted text; with
+        an overlap, index of the stitched paragraph instead.
+
+    Raises:
+        FormattingCancelled: If ``cancel_event`` is set before all chunks are formatted.
+        Exception: If an API call fails or returns an error.
+    """
+    if overlap_tokens:
+        overlaps = []
+        chunks = add_context(chunks, overlap_tokens, counter or get_default_counter(api_url), overlaps)
+        tokens = iter_formatted_tokens(chunks, parallel, api_url, cancel_event, session, cache, limiter,
+                                       max_new_tokens, journal, counter=counter)
+        yield from stitch_overlaps(tokens, overlaps, overlap_tokens + ALIGN_SLACK)
+        return
+
+    parallel = max(1, parallel or config.n_parallel)
+    counter = counter or get_default_counter(api_url)
+    pool = get_endpoint_pool(api_url)
+    own_session = session is None
+    if own_session:
+        session = create_session(parallel)
+    stopped = threading.Event()
+
+    def check_cancelled():
+        if stopped.is_set() or (cancel_event is not None and cancel_event.is_set()):
+            raise FormattingCancelled("Formatting was cancelled.")
+
+    def stream_one(index, chunk, pieces):
+        passed_on = False
+
+        def emit(piece, continues=False):
+            nonlocal passed_on
+            if piece:
+                # A re-requested part continues the text passed on before it
+                pieces.put(("piece", " " + piece.lstrip() if continues and passed_on else piece))
+                passed_on = True
+
+        def attempt(text, retry):
+            def request(lease):
+                parts = []
+                stats = {}
+                continues = retry > 0
+
+                def send(piece):
+                    nonlocal continues
+                    if piece:
+                        lease.emitted = True
+                        emit(piece, continues)
+                        continues = False
+
+                guard = OutputGuard(text)
+                started = time.perf_counter()
+                stream = stream_chunk(text, session, lease.endpoint.url, lease.endpoint.model_name,
+                                      get_generation_budget(text, counter, max_new_tokens), lease.slot, stats)
+                try:
+                    for piece in stream:
+                        check_cancelled()
+                        parts.append(piece)
+                        send(guard.feed(piece))
+                    send(guard.finish())
+                except OutputDiverged as error:
+                    send(error.pending)
+                    # The stream was cut short, so the server's statistics never arrived
+                    stats.setdefault("wall_ms", (time.perf_counter() - started) * 1000)
+                    record_request_metrics(stats, "".join(parts), retry, rejected=True)
+                    raise
+                finally:
+                    stream.close()
+                report_request_stats(stats)
+                formatted = "".join(parts)
+                record_request_metrics(stats, formatted, retry)
+                if cache is not None and not retry:
+                    key = hash_key(chunk, lease.endpoint.model_name, SYSTEM_PROMPT, INSTRUCTION_PROMPT)
+                    cache.set_text("formatted", key, formatted)
+                return formatted, stats
+
+            check_cancelled()
+            with limiter if limiter is not None else nullcontext():
+                check_cancelled()
+                return _dispatch(pool, request)
+
+        try:
+            recorded = _journal_lookup(journal, cache, pool, index, chunk)
+            if recorded is not None:
+                pieces.put(("piece", recorded))
+            else:
+                formatted = _format_guarded(chunk, attempt, lambda rest: emit(rest, continues=True))
+                if journal is not None:
+                    journal.record("formatted", index, chunk, formatted)
+            pieces.put(("done", None))
+        except BaseException as error:
+            pieces.put(("error", error))
+
+    executor = ThreadPoolExecutor(max_workers=parallel)
+
+    def start(index, chunk):
+        pieces = queue.Queue()
+        executor.submit(stream_one, index, chunk, pieces)
+        return pieces
+
+    # Chunks are submitted from a background thread, so the head chunk streams
+    # while later chunks are still being produced
+    streams = prefetch((start(index, chunk) for index, chunk in enumerate(chunks)), size=parallel)
+    try:
+        for index, pieces in enumerate(streams):
+            while True:
+                kind, value = pieces.get()
+                if kind == "done":
+                    break
+                if kind == "error":
+                    raise value
+                check_cancelled()
+                yield index, value
+    finally:
+        streams.close()
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        if own_session:
+            session.close()
+
+
+def format_chunks(chunks, parallel=None, api_url=API_URL, cancel_event=None, session=None, cache=None,
+                  max_new_tokens=1024, journal=None, overlap_tokens=0, counter=None):
+    """
+    Format text chunks with up to ``parallel`` requests in flight over a pooled session.
+
+    Args:
+        chunks (list[str]): The text chunks to format.
+        parallel (int | None): Maximum number of concurrent requests; config.n_parallel if omitted.
+        api_url (str | endpoints.EndpointPool): OpenAI-compatible chat completions endpoint, or a pool.
+        cancel_event (threading.Event | None): Set it to stop sending further chunks.
+        session (requests.Session | None): Session to reuse; a pooled one is created if omitted.
+        cache (cache.DiskCache | None): Cache for formatted chunks.
+        max_new_tokens (int): Maximum number of tokens to generate per chunk.
+        journal (journal.JobJournal | None): Journal of the job, see iter_formatted_chunks.
+        overlap_tokens (int): Context sent from the previous chunk, see iter_formatted_chunks.
+        counter (object | None): Token counter that measures the overlap.
+
+    Returns:
+        list[str]: The formatted chunks, in the original order; the stitched paragraphs
+        with an overlap.
+
+    Raises:
+        FormattingCancelled: If ``cancel_event`` is set before all chunks are formatted.
+        Exception: If an API call fails or returns an error.
+    """
+    return list(iter_formatted_chunks(chunks, parallel, api_url, cancel_event, session, cache,
+                                      max_new_tokens=max_new_tokens, journal=journal,
+                                      overlap_tokens=overlap_tokens, counter=counter))
+
+
+def join_paragraphs(tokens):
+    """
+    Turn the output of iter_formatted_tokens into plain text pieces.
+
+    Args:
+        tokens (iterable of tuple[int, str]): Chunk indices and text pieces.
+
+    Yields:
+        str: The pieces, with a blank line before the first piece of every chunk or
+        stitched paragraph but the first.
+    """
+    current = 0
+    for index, piece in tokens:
+        if index != current:
+            current = index
+            yield "\n\n"
+        yield piece
+
+
+def format_text_to_paragraphs(raw_text: str, parallel: int | None = None, api_url: str = API_URL,
+                              cancel_event=None, cache=None, counter=None, on_token=None, journal=None,
+                              overlap_tokens: int | None = None, engine: str | None = None) -> str:
     """
     Format raw text by adding proper punctuation using an LLM, without changing content.
 
+    With the "punct" engine, a small punctuation model adds the marks instead and the
+    LLM is not used; with "punct+llm", the LLM refines its output, whose sentence ends
+    let the text be chunked at sentence boundaries.
+
     Args:
         raw_text (str): The unformatted raw text.
+        parallel (int | None): Maximum number of concurrent requests to the LLM server;
+            config.n_parallel if omitted.
+        api_url (str | endpoints.EndpointPool): OpenAI-compatible chat completions endpoint, or a pool.
+        cancel_event (threading.Event | None): Set it to cancel the remaining chunks.
+        cache (cache.DiskCache | None): Cache for formatted chunks, so re-runs only
+            send chunks whose text, model or prompt changed.
+        counter (object | None): Token counter used to size the chunks; defaults to the
+            tokenizer of the served model when it is available.
+        on_token (callable | None): If given, responses are streamed and the function is
+            called with every piece of the output text, paragraph breaks included, as
+            soon as it is generated.
+        journal (journal.JobJournal | None): Journal of the job; every formatted chunk is
+            recorded in it, and chunks recorded by an interrupted run are not sent again.
+        overlap_tokens (int | None): Tokens of context sent from the end of the previous
+            chunk, see iter_formatted_chunks; config.overlap_tokens if omitted.
+        engine (str | None): One of FORMAT_ENGINES; config.format_engine if omitted.
 
     Returns:
         str: The text with added punctuation, split into paragraphs.
 
     Raises:
+        FormattingCancelled: If ``cancel_event`` is set before all chunks are formatted.
         Exception: If the API call fails or returns an error.
     """
-    enc = tiktoken.get_encoding("cl100k_base")
-    chunks = split_text_by_tokens(raw_text, max_tokens=300)
-    formatted_chunks = []
-
-    for chunk in chunks:
-        response = requests.post(API_URL, json={
-            "model": MODEL_NAME,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": (
-                        "Du bist ein Assistent, der nur Zeichensetzung "
-                        "in einem deutschen Transkript ergänzt. "
-                        "Du darfst absolut **nichts** am Textinhalt ändern. "
-                        "Keine Umformulierungen, keine Löschungen, keine neuen Wörter oder Absätze."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": "Bitte füge nur passende Zeichensetzung (.,!?…) zum folgenden Text hinzu. Verändere nichts."
-                },
-                {
-                    "role": "user",
-                    "content": chunk
-                }
-            ],
-            "temperature": 0.0,
-            "max_tokens": 1024
-        })
-
-        if response.status_code == 200:
-            formatted = response.json()["choices"][0]["message"]["content"]
-            formatted_chunks.append(formatted.strip())
-        else:
-            try:
-                error_msg = response.json().get("error", {}).get("message", response.text)
-            except Exception:
-                error_msg = response.text
-            raise Exception(f"LLM API Error {response.status_code}: {error_msg}")
+    engine = get_format_engine(engine)
+    if engine != "llm":
+        raw_text = get_punctuation_model().punctuate(raw_text)
+    if engine == "punct":
+        paragraphs = split_paragraphs(raw_text)
+        if on_token is not None:
+            for i, paragraph in enumerate(paragraphs):
+                on_token(("\n\n" if i else "") + paragraph)
+        return "\n\n".join(paragraphs)
+
+    counter = counter or get_default_counter(api_url)
+    overlap_tokens = config.overlap_tokens if overlap_tokens is None else overlap_tokens
+    with stage("split_text", chars=len(raw_text)) as counts:
+        chunk_tokens, max_new_tokens = get_chunk_budget(counter, overlap_tokens=overlap_tokens)
+        chunks = split_text_by_tokens(raw_text, max_tokens=chunk_tokens, counter=counter)
+        counts["chunks"] = len(chunks)
 
-    return "\n\n".join(formatted_chunks)
+    with stage("format", chunks=len(chunks), bytes=len(raw_text.encode("utf-8"))) as counts:
+        if on_token is not None:
+            pieces = []
+            tokens = iter_formatted_tokens(chunks, parallel, api_url, cancel_event, cache=cache,
+                                           max_new_tokens=max_new_tokens, journal=journal,
+                                           overlap_tokens=overlap_tokens, counter=counter)
+            for piece in join_paragraphs(tokens):
+                pieces.append(piece)
+                on_token(piece)
+            formatted = "".join(pieces)
+        else:
+            formatted = "\n\n".join(format_chunks(chunks, parallel, api_url, cancel_event, cache=cache,
+                                                  max_new_tokens=max_new_tokens, journal=journal,
+                                                  overlap_tokens=overlap_tokens, counter=counter))
+        counts["chars"] = len(formatted)
+        return formatted
 
 
 if __name__ == "__main__":
@@ -146,9 +1126,15 @@ if __name__ == "__main__":
         print(f"File not found: {input_path}")
         sys.exit(1)
 
-    formatted_text = format_text_to_paragraphs(raw_text)
+    ensure_llm_servers()
     output_path = input_path.replace(".txt", "_formatted.txt")
     with open(output_path, "w", encoding="utf-8") as file:
-        file.write(formatted_text)
+        def write_piece(piece):
+            file.write(piece)
+            file.flush()
+
+        pool = get_endpoint_pool()
+        format_text_to_paragraphs(raw_text, pool.slots, pool, cache=DiskCache(), on_token=write_piece)
 
     print(f"Formatted text saved to: {output_path}")
+    pool.report()
@@ -0,0 +1,179 @@
+import glob
+import json
+import os
+import shutil
+import time
+
+from cache import hash_key
+
+# Directory holding the journals of single-video runs, one subdirectory per video
+JOURNAL_DIR = os.getenv("TOL_VIDO_JOURNAL_DIR", ".journal")
+
+# Leftovers of interrupted runs: temp files of atomic writes and chunk files of older versions
+ORPHAN_PATTERNS = ("*.tmp", "chunk_*.wav")
+
+# Namespaces of per-chunk records
+NAMESPACES = ("transcripts", "punctuated", "formatted")
+
+
+def write_json_atomic(path, data):
+    """
+    Write JSON through a temp file that replaces ``path`` once it is on disk.
+
+    Args:
+        path (str): Output file.
+        data (object): JSON-serialisable value.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def remove_orphans(directory, patterns=ORPHAN_PATTERNS, recursive=True):
+    """
+    Delete leftovers of interrupted runs from a directory.
+
+    Args:
+        directory (str): Directory to clean.
+        patterns (tuple of str): Glob patterns of the files to delete.
+        recursive (bool): Also clean the subdirectories.
+
+    Returns:
+        list[str]: Paths of the deleted files.
+    """
+    removed = []
+    for pattern in patterns:
+        parts = ("**", pattern) if recursive else (pattern,)
+        for path in glob.glob(os.path.join(glob.escape(directory), *parts), recursive=recursive):
+            try:
+                os.remove(path)
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+class JobJournal:
+    """
+    Record of the chunks a job has completed, so an interrupted run can resume.
+
+    Every transcript and formatted chunk is written to its own file the moment it
+    is done, so a crash never leaves a partial record. Records are keyed by chunk
+    position and carry a hash of their input; a record whose input changed is
+    ignored and redone.
+
+    Args:
+        directory (str): Directory of the journal; created if needed.
+        url (str): URL of the video.
+        settings (dict | None): Options that change the chunks, e.g. language and
+            chunking; records of a run with other settings are not reused.
+        resume (bool): Keep the records of an earlier run of the same job; they are
+            discarded otherwise.
+    """
+
+    def __init__(self, directory, url, settings=None, resume=False):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "journal.json")
+        # Downloaded audio of runs that transcribe from a file, kept until the job is done
+        self.audio_path = os.path.join(directory, "audio.wav")
+        self.fingerprint = {"url": url, **(settings or {})}
+        os.makedirs(directory, exist_ok=True)
+        remove_orphans(directory)
+
+        meta = self._read_meta()
+        if resume and meta is not None and meta.get("fingerprint") != self.fingerprint:
+            print(f"⚠️ The journal in {directory} belongs to a run with other settings; starting over.")
+            resume = False
+        if not resume:
+            self.clear()
+        elif meta is not None:
+            done = {namespace: self.completed(namespace) for namespace in NAMESPACES}
+            print(f"↩️ Resuming: {done['transcripts']} transcripts and {done['formatted']} formatted chunks "
+                  f"already done")
+        write_json_atomic(self.meta_path, {"fingerprint": self.fingerprint, "status": "running",
+                                           "started_at": time.time()})
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def path(self, namespace, index):
+        """Return the file of a record, whether or not it exists."""
+        return os.path.join(self.directory, namespace, f"{index:06d}.json")
+
+    def get(self, namespace, index, source):
+        """
+        Look up the record of a chunk.
+
+        Args:
+            namespace (str): One of NAMESPACES.
+            index (int): Position of the chunk.
+            source (str | bytes): Input of the chunk, e.g. its audio or text.
+
+        Returns:
+            str | None: The recorded output, or None if the chunk is not done or its input changed.
+        """
+        try:
+            with open(self.path(namespace, index), "r", encoding="utf-8") as file:
+                record = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        return record["text"] if record.get("source") == hash_key(source) else None
+
+    def record(self, namespace, index, source, text):
+        """
+        Record the output of a chunk atomically.
+
+        Args:
+            namespace (str): One of NAMESPACES.
+            index (int): Position of the chunk.
+            source (str | bytes): Input of the chunk.
+            text (str): Output of the chunk.
+        """
+        path = self.path(namespace, index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_json_atomic(path, {"source": hash_key(source), "text": text, "recorded_at": time.time()})
+
+    def completed(self, namespace):
+        """Return the number of records in a namespace."""
+        directory = os.path.join(self.directory, namespace)
+        return len(glob.glob(os.path.join(glob.escape(directory), "*.json")))
+
+    def clear(self):
+        """Delete all records and the downloaded audio."""
+        for namespace in NAMESPACES:
+            shutil.rmtree(os.path.join(self.directory, namespace), ignore_errors=True)
+        if os.path.exists(self.audio_path):
+            os.remove(self.audio_path)
+
+    def finish(self):
+        """
+        Mark the job as done and delete its records and audio, which are no longer needed.
+        """
+        self.clear()
+        write_json_atomic(self.meta_path, {"fingerprint": self.fingerprint, "status": "done",
+                                           "finished_at": time.time()})
+
+
+def open_journal(url, settings=None, resume=False, root=JOURNAL_DIR):
+    """
+    Open the journal of a single-video run under ``root``, keyed by video ID.
+
+    Args:
+        url (str): URL of the video.
+        settings (dict | None): Options that change the chunks.
+        resume (bool): Keep the records of an earlier run.
+        root (str): Directory of all journals.
+
+    Returns:
+        JobJournal: The journal.
+    """
+    from extract_text_from_video import get_video_id
+
+    return JobJournal(os.path.join(root, get_video_id(url)), url, settings, resume)
@@ -0,0 +1,115 @@
+import threading
+import time
+
+from llm_server import read_server_settings
+
+# Endpoint URLs of the form "local:<env file>" run the model of that .env file in this process
+LOCAL_SCHEME = "local:"
+
+
+def is_local_url(url):
+    """Tell whether an endpoint URL names an in-process model."""
+    return isinstance(url, str) and url.startswith(LOCAL_SCHEME)
+
+
+def local_url(env_file=None):
+    """
+    Return the endpoint URL of the in-process model of an .env file.
+
+    Args:
+        env_file (str | None): The .env file; the active one if omitted.
+    """
+    return LOCAL_SCHEME + (env_file or "")
+
+
+class LocalLLM:
+    """
+    GGUF model loaded with llama_cpp.Llama inside the pipeline process.
+
+    It answers the same chat completion payloads as the server and returns the same
+    response bodies and stream events, so the formatting client treats it like any
+    other endpoint, without JSON encoding or an HTTP round-trip per chunk. Requests
+    run one at a time; the evaluated prompt prefix stays in a RAM cache between them.
+
+    Args:
+        env_file (str | None): The .env file of the model; the active one if omitted.
+            MODEL, N_CTX, N_THREADS, N_BATCH, N_GPU_LAYERS and VERBOSE are used as for the server.
+    """
+
+    def __init__(self, env_file=None):
+        from llama_cpp import Llama, LlamaRAMCache
+
+        settings = read_server_settings(env_file)
+        options = {name: int(settings[name]) for name in ("n_threads", "n_batch", "n_gpu_layers")
+                   if settings[name] is not None}
+        started = time.perf_counter()
+        self.model_name = settings["model_name"]
+        self.llama = Llama(model_path=settings["model"], n_ctx=settings["n_ctx"],
+                           verbose=(settings["verbose"] or "").lower() == "true", **options)
+        self.llama.set_cache(LlamaRAMCache())
+        self.load_seconds = time.perf_counter() - started
+        self._lock = threading.Lock()
+        print(f"✅ Model '{self.model_name}' loaded in-process in {self.load_seconds:.1f}s")
+
+    def create_chat_completion(self, payload):
+        """
+        Run a chat completion request.
+
+        Args:
+            payload (dict): Request body as sent to the server, e.g. from
+                format_text.build_payload; ``model``, ``id_slot`` and ``cache_prompt`` are ignored.
+
+        Returns:
+            dict | iterator of dict: The response body, or the stream events if
+            ``payload["stream"]`` is set. The last event reports the generated tokens
+            and generation time, as llama.cpp's server does. Closing the iterator
+            stops the generation.
+
+        Raises:
+            ValueError: If the prompt does not fit in the context window.
+        """
+        options = {
+            "messages": payload["messages"],
+            "temperature": payload.get("temperature", 0.0),
+            "max_tokens": payload.get("max_tokens"),
+            "stop": payload.get("stop"),
+        }
+        if payload.get("stream"):
+            return self._stream(options)
+        with self._lock:
+            return self.llama.create_chat_completion(**options)
+
+    def _stream(self, options):
+        with self._lock:
+            generated = 0
+            first_token_at = None
+            for event in self.llama.create_chat_completion(stream=True, **options):
+                choices = event.get("choices") or [{}]
+                if (choices[0].get("delta") or {}).get("content"):
+                    generated += 1
+                    first_token_at = first_token_at or time.perf_counter()
+                yield event
+            predicted_ms = (time.perf_counter() - first_token_at) * 1000 if first_token_at else 0.0
+            yield {"choices": [], "usage": {"completion_tokens": generated},
+                   "timings": {"predicted_n": generated, "predicted_ms": predicted_ms}}
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_local_llm(url=None):
+    """
+    Return the in-process model of a local endpoint, loading it only once per process.
+
+    Args:
+        url (str | None): Endpoint URL from local_url; the active .env file's model if omitted.
+
+    Returns:
+        LocalLLM: The model, shared by all requests, chunks and videos.
+    """
+    env_file = (url or LOCAL_SCHEME)[len(LOCAL_SCHEME):] or None
+    with _models_lock:
+        if env_file not in _models:
+            _models[env_file] = LocalLLM(env_file)
+        return _models[env_file]
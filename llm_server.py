@@ -0,0 +1,419 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+HOST = "127.0.0.1"
+PORT = 11434
+SERVER_URL = f"http://localhost:{PORT}"
+
+# Optional path to a llama.cpp `llama-server` binary; it supports parallel slots,
+# unlike the llama-cpp-python server used otherwise
+LLAMA_SERVER = os.getenv("LLAMA_SERVER")
+
+# Where a server started in the background records its process and output, per port
+PID_FILE = ".llm_server-{port}.pid"
+LOG_FILE = "llm_server-{port}.log"
+
+# Models that can be served, by name
+MODEL_ENV_FILES = {
+    "mistral": ".env.mistral",
+    "leolm-german": ".env.leolm-german"
+}
+
+# Seconds to wait for the model to load
+READY_TIMEOUT = float(os.getenv("LLM_READY_TIMEOUT", "600"))
+
+# Windows API values used to check whether a process is alive
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+ERROR_ACCESS_DENIED = 5
+STILL_ACTIVE = 259
+
+
+def get_active_env_file():
+    """
+    Return the environment file named in 'active_env.txt'.
+
+    Returns:
+        str: Path of the active .env file.
+    """
+    with open("active_env.txt", "r", encoding="utf-8") as file:
+        return file.read().strip()
+
+
+def read_server_settings(env_file=None):
+    """
+    Read the server settings of a model from its .env file.
+
+    Args:
+        env_file (str | None): The .env file; the active one if omitted.
+
+    Returns:
+        dict: Model path and name, context size, threads, batch size, parallel slots,
+        GPU layers and verbosity. Unset values are None.
+
+    Raises:
+        RuntimeError: If MODEL is missing from the file.
+    """
+    from dotenv import dotenv_values
+
+    env_file = env_file or get_active_env_file()
+    values = dotenv_values(env_file)
+    model = values.get("MODEL")
+    if not model:
+        raise RuntimeError(f"MODEL not found in {env_file}.")
+
+    return {
+        "env_file": env_file,
+        "model": model,
+        "model_name": values.get("MODEL_NAME") or os.path.basename(model),
+        "n_ctx": int(values.get("N_CTX") or values.get("CONTEXT_SIZE") or 4096),
+        "n_threads": values.get("N_THREADS"),
+        "n_batch": values.get("N_BATCH"),
+        "n_parallel": int(values.get("N_PARALLEL") or 1),
+        "n_gpu_layers": values.get("N_GPU_LAYERS"),
+        "verbose": values.get("VERBOSE"),
+    }
+
+
+def build_server_command(settings, host=HOST, port=PORT, llama_server=LLAMA_SERVER):
+    """
+    Build the command line that serves a model with the given settings.
+
+    Args:
+        settings (dict): Result of read_server_settings.
+        host (str): Interface to bind.
+        port (int): Port to bind.
+        llama_server (str | None): Path of a llama.cpp `llama-server` binary; the
+            llama-cpp-python server of the current interpreter is used if omitted.
+
+    Returns:
+        list[str]: The command.
+    """
+    if llama_server:
+        # llama-server splits its context between the slots, so each slot gets N_CTX
+        command = [
+            llama_server,
+            "--model", settings["model"],
+            "--alias", settings["model_name"],
+            "--ctx-size", str(settings["n_ctx"] * settings["n_parallel"]),
+            "--parallel", str(settings["n_parallel"]),
+            "--host", host,
+            "--port", str(port),
+        ]
+        options = {"n_threads": "--threads", "n_batch": "--batch-size", "n_gpu_layers": "--n-gpu-layers"}
+    else:
+        command = [
+            sys.executable, "-m", "llama_cpp.server",
+            "--model", settings["model"],
+            "--model_alias", settings["model_name"],
+            "--n_ctx", str(settings["n_ctx"]),
+            "--host", host,
+            "--port", str(port),
+            # Keep evaluated prompts in a RAM cache so the shared formatting prefix is reused
+            "--cache", "true",
+            "--cache_type", "ram",
+        ]
+        options = {"n_threads": "--n_threads", "n_batch": "--n_batch", "n_gpu_layers": "--n_gpu_layers",
+                   "verbose": "--verbose"}
+
+    for key, flag in options.items():
+        if settings[key] is not None:
+            command += [flag, str(settings[key])]
+    return command
+
+
+def probe_server(server_url=SERVER_URL, timeout=2):
+    """
+    Check whether a server is up and has finished loading its model.
+
+    llama.cpp's server answers /health with 503 while the model loads; the
+    llama-cpp-python server only starts listening once the model is loaded and
+    is probed through /v1/models.
+
+    Args:
+        server_url (str): Base URL of the server.
+        timeout (float): Seconds to wait for each probe request.
+
+    Returns:
+        list[str] | None: Ids of the served models if the server is ready, otherwise None.
+    """
+    import requests
+
+    try:
+        response = requests.get(f"{server_url}/health", timeout=timeout)
+        if response.status_code == 503:
+            return None
+        response = requests.get(f"{server_url}/v1/models", timeout=timeout)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    return [model.get("id") for model in response.json().get("data", [])]
+
+
+def read_pid(port=PORT):
+    """
+    Return the process id recorded by ensure_server for a port, if any.
+
+    Args:
+        port (int): Port of the server.
+
+    Returns:
+        int | None: The process id, or None.
+    """
+    try:
+        with open(PID_FILE.format(port=port), "r", encoding="utf-8") as file:
+            return int(file.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _is_running_windows(pid):
+    import ctypes
+
+    # os.kill would terminate the process on Windows, so its exit code is queried instead
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Access is denied for processes of other users, which do exist
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        exit_code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def is_running(pid):
+    """
+    Check whether a process is alive.
+
+    Args:
+        pid (int | None): Process id.
+
+    Returns:
+        bool: True if the process exists.
+    """
+    if pid is None:
+        return False
+    if os.name == "nt":
+        return _is_running_windows(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_command_line(pid):
+    """
+    Return the command line of a process.
+
+    Args:
+        pid (int): Process id.
+
+    Returns:
+        list[str] | None: The arguments, or None if the process does not exist or cannot be inspected.
+    """
+    if os.path.isdir("/proc"):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as file:
+                return [arg.decode("utf-8", errors="replace") for arg in file.read().split(b"\0") if arg]
+        except OSError:
+            return None
+
+    # No procfs, e.g. on macOS or Windows
+    if os.name == "nt":
+        command = ["powershell", "-NoProfile", "-Command",
+                   f"(Get-CimInstance Win32_Process -Filter 'ProcessId={int(pid)}').CommandLine"]
+    else:
+        command = ["ps", "-o", "args=", "-p", str(pid)]
+
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.split() if result.returncode == 0 and result.stdout.strip() else None
+
+
+def is_server_process(pid, port=PORT):
+    """
+    Check whether a process is an LLM server started for a port, so a stale pid file
+    whose process id was reused by another program is not mistaken for the server.
+
+    Args:
+        pid (int | None): Process id.
+        port (int): Port the server was started on.
+
+    Returns:
+        bool: True if the process is alive and its command line serves ``port``.
+    """
+    if not is_running(pid):
+        return False
+    args = read_command_line(pid)
+    if not args or "--port" not in args[:-1]:
+        return False
+    return args[args.index("--port") + 1] == str(port)
+
+
+def remove_pid_file(port=PORT):
+    """Delete the pid file of a port, if there is one."""
+    try:
+        os.remove(PID_FILE.format(port=port))
+    except FileNotFoundError:
+        pass
+
+
+def wait_until_ready(server_url=SERVER_URL, timeout=READY_TIMEOUT, process=None, interval=0.5, log_file=None,
+                     pid=None):
+    """
+    Poll the readiness probe until the model is loaded.
+
+    Args:
+        server_url (str): Base URL of the server.
+        timeout (float): Maximum number of seconds to wait.
+        process (subprocess.Popen | None): The server process; waiting stops if it exits.
+        interval (float): Seconds between probes.
+        log_file (str | None): Server log to point to in error messages.
+        pid (int | None): Process id of a server started by another process; waiting stops
+            if it exits.
+
+    Returns:
+        list[str]: Ids of the served models.
+
+    Raises:
+        RuntimeError: If the process exits or the server is not ready in time.
+    """
+    see_log = f"; see {log_file}" if log_file else ""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        models = probe_server(server_url)
+        if models is not None:
+            return models
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"The LLM server exited with code {process.returncode}{see_log}.")
+        if pid is not None and not is_running(pid):
+            raise RuntimeError(f"The LLM server process {pid} exited{see_log}.")
+        time.sleep(interval)
+    raise RuntimeError(f"The LLM server at {server_url} was not ready after {timeout:.0f}s{see_log}.")
+
+
+def ensure_server(env_file=None, host=HOST, port=PORT, timeout=READY_TIMEOUT):
+    """
+    Make sure the model of an .env file is being served, starting the server if needed.
+
+    A running server with the same model is reused, so the model stays loaded
+    between pipeline runs. A server started here earlier with another model is
+    stopped first. Otherwise the server is started in the background, outliving
+    this process, and the call returns once the model is loaded.
+
+    Args:
+        env_file (str | None): The .env file of the model; the active one if omitted.
+        host (str): Interface to bind.
+        port (int): Port to bind.
+        timeout (float): Maximum number of seconds to wait for the model to load.
+
+    Returns:
+        float: Seconds spent loading the model; 0 if a warm server was reused.
+
+    Raises:
+        RuntimeError: If the model file is missing, the server does not become ready, or
+            the port is taken by a server with another model that was not started here.
+    """
+    settings = read_server_settings(env_file)
+    server_url = f"http://localhost:{port}"
+
+    models = probe_server(server_url)
+    if models is not None:
+        if settings["model_name"] in models or settings["model"] in models:
+            print(f"♻️ Reusing the running LLM server on port {port}")
+            return 0.0
+        if not is_server_process(read_pid(port), port):
+            raise RuntimeError(f"The server on port {port} serves {models}, not '{settings['model_name']}', "
+                               f"and was not started by this project. Stop it or use another port.")
+        print(f"🔁 The server on port {port} serves {models}; restarting it with '{settings['model_name']}'")
+        stop_server(port)
+
+    log_file = LOG_FILE.format(port=port)
+    pid = read_pid(port)
+    if pid is not None and not is_server_process(pid, port):
+        # Left behind by a server that is gone; the process id may belong to another program now
+        remove_pid_file(port)
+        pid = None
+
+    if pid is None:
+        if not os.path.exists(settings["model"]):
+            raise RuntimeError(f"Model file not found: {settings['model']}")
+
+        command = build_server_command(settings, host, port)
+        print(f"🚀 Starting the LLM server for '{settings['model_name']}' on port {port} (log: {log_file})")
+        with open(log_file, "ab") as log:
+            # In its own session or process group, so Ctrl+C in this terminal does not reach it
+            process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                       start_new_session=True,
+                                       creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0)
+        with open(PID_FILE.format(port=port), "w", encoding="utf-8") as file:
+            file.write(str(process.pid))
+    else:
+        # Started by an earlier run and still loading
+        process = None
+
+    started = time.perf_counter()
+    try:
+        wait_until_ready(server_url, timeout, process, log_file=log_file, pid=pid)
+    except RuntimeError:
+        if not is_server_process(pid if process is None else process.pid, port):
+            remove_pid_file(port)
+        raise
+    load_seconds = time.perf_counter() - started
+    print(f"✅ Model '{settings['model_name']}' loaded in {load_seconds:.1f}s")
+    return load_seconds
+
+
+def stop_server(port=PORT, timeout=30):
+    """
+    Stop the server that ensure_server started in the background on a port.
+
+    A pid file whose process is gone or is no longer the server is removed without
+    signalling anything. On Windows, where a console program in the background
+    cannot be asked to exit, the server is terminated right away.
+
+    Args:
+        port (int): Port of the server.
+        timeout (float): Seconds to wait for a graceful shutdown before killing it.
+
+    Returns:
+        bool: True if a server was stopped.
+
+    Raises:
+        RuntimeError: If the server process could not be terminated on Windows.
+    """
+    pid = read_pid(port)
+    if pid is None:
+        return False
+    if not is_server_process(pid, port):
+        remove_pid_file(port)
+        return False
+
+    if os.name == "nt":
+        result = subprocess.run(["taskkill", "/PID", str(pid), "/T", "/F"], capture_output=True, text=True)
+        if result.returncode != 0 and is_running(pid):
+            raise RuntimeError(f"Could not stop the LLM server process {pid}: {result.stderr.strip()}")
+    else:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and is_server_process(pid, port):
+                time.sleep(0.2)
+            if is_server_process(pid, port):
+                os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    remove_pid_file(port)
+    return True
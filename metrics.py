@@ -0,0 +1,365 @@
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prefix of the exported Prometheus metric names
+METRIC_PREFIX = "tol_vido"
+
+# Per-call latency percentiles included in the report, and the number of call durations
+# kept per stage to compute them from; longer runs keep a uniform random sample
+PERCENTILES = (50, 90, 99)
+DURATION_SAMPLES = 2048
+
+# Report fields that summarise a stage rather than count work, left out of the Prometheus counters
+SUMMARY_FIELDS = ("avg_seconds", "max_seconds", "busy_share") + tuple(f"p{q}_seconds" for q in PERCENTILES)
+
+
+def percentile(values, q):
+    """
+    Return the nearest-rank percentile of sorted values.
+
+    Args:
+        values (list of float): Values in ascending order; must not be empty.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The smallest value that at least ``q`` percent of the values do not exceed.
+    """
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+class Metrics:
+    """
+    Thread-safe collector of per-stage wall times and counters.
+
+    Every recorded call adds its duration and counters (bytes, tokens, audio
+    seconds, ...) to the totals of its stage, so stages running in several
+    threads report their busy time, which can be compared with the wall time
+    of the whole run. Percentiles are computed from a sample of at most
+    ``samples`` durations per stage, so memory stays bounded in long-lived processes.
+
+    Latencies that are not busy time, such as the time until a video's first
+    formatted chunk, are observed separately and reported as percentiles only.
+    """
+
+    def __init__(self, samples=DURATION_SAMPLES):
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self.samples = samples
+        self.reset()
+
+    def reset(self):
+        """Drop all recorded values and restart the run clock."""
+        with self._lock:
+            self.started_at = time.time()
+            self._started = time.perf_counter()
+            self.stages = {}
+            self.gauges = {}
+            self.latencies = {}
+            self._durations = {}
+            self._latency_samples = {}
+
+    def _sample(self, samples, name, seconds, count):
+        """Keep ``seconds`` in the bounded sample of ``name``, given it is its ``count``-th value."""
+        durations = samples.setdefault(name, [])
+        if len(durations) < self.samples:
+            durations.append(seconds)
+        else:
+            # Reservoir sampling: every value so far is kept with the same probability
+            slot = self._random.randrange(count)
+            if slot < self.samples:
+                durations[slot] = seconds
+
+    def record(self, stage, seconds, **counters):
+        """
+        Add one call of a stage.
+
+        Args:
+            stage (str): Stage name, e.g. "transcribe" or "llm".
+            seconds (float): Wall time of the call.
+            **counters (int | float | None): Amounts processed by the call; None values are skipped.
+        """
+        with self._lock:
+            totals = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["max_seconds"] = max(totals["max_seconds"], seconds)
+            self._sample(self._durations, stage, seconds, totals["calls"])
+            for name, value in counters.items():
+                if value is not None:
+                    totals[name] = totals.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        """
+        Add one value of a latency that is not busy time of a stage.
+
+        Args:
+            name (str): Latency name, e.g. "first_output".
+            seconds (float): Observed latency.
+        """
+        with self._lock:
+            totals = self.latencies.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["max_seconds"] = max(totals["max_seconds"], seconds)
+            self._sample(self._latency_samples, name, seconds, totals["count"])
+
+    def set_gauge(self, name, value):
+        """
+        Store a single value for the run, e.g. 'peak_memory_bytes'.
+        """
+        with self._lock:
+            self.gauges[name] = value
+
+    def report(self):
+        """
+        Build the run report.
+
+        Returns:
+            dict: Run start and wall time, gauges, and per stage its calls, total,
+            average, maximum and percentile seconds per call, share of the run's wall time, counter
+            totals and counter rates per second of stage time. The "llm" stage also
+            gets prompt and generation tokens per second as measured by the server.
+            Observed latencies get their count, total, average, maximum and percentile seconds.
+        """
+        with self._lock:
+            wall = time.perf_counter() - self._started
+            snapshot = {stage: (dict(totals), list(self._durations[stage])) for stage, totals in self.stages.items()}
+            started_at = self.started_at
+            gauges = dict(self.gauges)
+            observed = {name: (dict(totals), list(self._latency_samples[name]))
+                        for name, totals in self.latencies.items()}
+
+        stages = {}
+        for stage, (totals, durations) in snapshot.items():
+            entry = dict(totals)
+            entry["avg_seconds"] = totals["seconds"] / totals["calls"]
+            entry["busy_share"] = totals["seconds"] / wall if wall else None
+            durations.sort()
+            for q in PERCENTILES:
+                entry[f"p{q}_seconds"] = percentile(durations, q)
+            for name in ("bytes", "tokens", "audio_seconds", "chars", "completion_tokens"):
+                if name in totals and totals["seconds"]:
+                    entry[f"{name}_per_s"] = totals[name] / totals["seconds"]
+            if totals.get("prompt_ms"):
+                entry["prompt_tokens_per_s"] = totals.get("prompt_evaluated", 0) / (totals["prompt_ms"] / 1000)
+            if totals.get("generation_ms"):
+                generated = totals.get("completion_tokens", 0)
+                entry["generation_tokens_per_s"] = generated / (totals["generation_ms"] / 1000)
+            stages[stage] = {name: round(value, 4) if isinstance(value, float) else value
+                             for name, value in entry.items()}
+        latencies = {}
+        for name, (totals, durations) in observed.items():
+            durations.sort()
+            entry = dict(totals)
+            entry["avg_seconds"] = totals["seconds"] / totals["count"]
+            for q in PERCENTILES:
+                entry[f"p{q}_seconds"] = percentile(durations, q)
+            latencies[name] = {key: round(value, 4) if isinstance(value, float) else value
+                               for key, value in entry.items()}
+        return {
+            "started_at": started_at,
+            "wall_seconds": round(wall, 4),
+            "gauges": gauges,
+            "stages": stages,
+            "latencies": latencies,
+        }
+
+    def write_json(self, path):
+        """
+        Write the run report to a JSON file atomically.
+
+        Args:
+            path (str): Output file.
+        """
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+        os.replace(temp_path, path)
+
+    def prometheus_text(self):
+        """
+        Render the totals in the Prometheus text exposition format.
+
+        Returns:
+            str: One counter per stage and amount, one summary per observed latency, plus the gauges.
+        """
+        report = self.report()
+        lines = []
+
+        def add(name, kind, samples):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            lines.extend(f"{METRIC_PREFIX}_{name}{labels} {value}" for labels, value in samples)
+
+        add("run_seconds", "gauge", [("", report["wall_seconds"])])
+        counters = {}
+        for stage, entry in report["stages"].items():
+            for name, value in entry.items():
+                if name in SUMMARY_FIELDS or name.endswith("_per_s"):
+                    continue
+                counters.setdefault(name, []).append((f'{{stage="{stage}"}}', value))
+        for name, samples in counters.items():
+            add(f"stage_{name}_total", "counter", samples)
+        for name, entry in report["latencies"].items():
+            samples = [(f'{{quantile="{q / 100}"}}', entry[f"p{q}_seconds"]) for q in PERCENTILES]
+            samples.append(("_sum", entry["seconds"]))
+            samples.append(("_count", entry["count"]))
+            add(f"{name}_seconds", "summary", samples)
+        for name, value in report["gauges"].items():
+            if isinstance(value, (int, float)):
+                add(name, "gauge", [("", value)])
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide collector used by the instrumented stages
+METRICS = Metrics()
+
+
+@contextmanager
+def stage(name, **counters):
+    """
+    Time a block and record it as one call of a stage in METRICS.
+
+    Args:
+        name (str): Stage name.
+        **counters: Initial counter values.
+
+    Yields:
+        dict: Counters of the call; amounts known only after the work, such as
+        output bytes, can be added to it inside the block.
+    """
+    values = dict(counters)
+    started = time.perf_counter()
+    try:
+        yield values
+    finally:
+        METRICS.record(name, time.perf_counter() - started, **values)
+
+
+@contextmanager
+def profiling(profile_path=None, trace_memory=False, top=10):
+    """
+    Optionally run a block under cProfile and tracemalloc.
+
+    Args:
+        profile_path (str | None): Write cProfile statistics to this file, readable
+            with ``python -m pstats`` or snakeviz; profiling is off if None. Only the
+            calling thread is profiled; work in worker threads appears as waiting.
+        trace_memory (bool): Track Python allocations; the peak is stored as the
+            'peak_memory_bytes' gauge and the largest allocation sites as 'top_allocations'.
+        top (int): Number of allocation sites to keep.
+    """
+    profiler = cProfile.Profile() if profile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            METRICS.set_gauge("peak_memory_bytes", peak)
+            METRICS.set_gauge("top_allocations", [
+                {"site": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]
+            ])
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves METRICS as Prometheus text on /metrics and as the JSON report on /metrics.json."""
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/metrics":
+            body, content_type = METRICS.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path.rstrip("/") == "/metrics.json":
+            body, content_type = json.dumps(METRICS.report()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """
+    Serve the metrics over HTTP in a background thread for the rest of the process.
+
+    Args:
+        port (int): Port to bind.
+        host (str): Interface to bind.
+
+    Returns:
+        ThreadingHTTPServer: The server; call ``shutdown()`` to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def print_report(report=None):
+    """
+    Print the per-stage totals of a run report.
+
+    Args:
+        report (dict | None): Result of Metrics.report; METRICS' current report if omitted.
+    """
+    report = report or METRICS.report()
+    print(f"📊 Stage metrics ({report['wall_seconds']:.1f}s wall time):")
+    for name, entry in report["stages"].items():
+        parts = [f"{entry['calls']} calls", f"{entry['seconds']:.2f}s busy", f"{entry['avg_seconds']:.3f}s avg",
+                 f"{entry['p90_seconds']:.3f}s p90"]
+        for rate in ("audio_seconds_per_s", "bytes_per_s", "prompt_tokens_per_s", "generation_tokens_per_s"):
+            if rate in entry:
+                parts.append(f"{entry[rate]:.1f} {rate[:-len('_per_s')].replace('_', ' ')}/s")
+        print(f"  {name}: " + ", ".join(parts))
+    for name, entry in report.get("latencies", {}).items():
+        print(f"  {name}: {entry['count']} observed, {entry['p50_seconds']:.2f}s p50, "
+              f"{entry['p90_seconds']:.2f}s p90, {entry['max_seconds']:.2f}s max")
+    if "peak_memory_bytes" in report["gauges"]:
+        print(f"  peak traced memory: {report['gauges']['peak_memory_bytes'] / 2**20:.1f} MiB")
+
+
+@contextmanager
+def collect(json_path=None, profile_path=None, trace_memory=False, port=None):
+    """
+    Collect the metrics of one run: reset METRICS, optionally serve and profile,
+    and write and print the report when the block ends, also after a failure.
+
+    Args:
+        json_path (str | None): Write the JSON run report to this file.
+        profile_path (str | None): Write cProfile statistics to this file.
+        trace_memory (bool): Record peak memory and top allocation sites with tracemalloc.
+        port (int | None): Serve the metrics on this port while the run is going on.
+    """
+    METRICS.reset()
+    server = serve_metrics(port) if port else None
+    try:
+        with profiling(profile_path, trace_memory):
+            yield METRICS
+    finally:
+        if json_path:
+            METRICS.write_json(json_path)
+        print_report()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
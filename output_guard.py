@@ -0,0 +1,134 @@
+import re
+
+# Input words ahead of the current position that an output word may match; words skipped
+# to reach the match count as dropped
+LOOKAHEAD_WORDS = 8
+
+# Output words that match no input word, plus dropped input words, tolerated per chunk:
+# at least GUARD_MIN_MISSES, or this share of the chunk's words if that is more
+GUARD_MIN_MISSES = 8
+GUARD_MISS_SHARE = 0.05
+
+
+def normalize_word(word):
+    """Reduce a word to its lower-case letters and digits, so punctuation and case are ignored."""
+    return re.sub(r"\W", "", word).lower()
+
+
+class OutputDiverged(Exception):
+    """
+    Raised when formatted output stops following the words of its input.
+
+    Attributes:
+        confirmed (str): Output up to the last word that matched the input.
+        pending (str): The end of ``confirmed`` that OutputGuard.feed had not passed on yet.
+        remaining (str): Input words after the last confirmed one, to be formatted again.
+    """
+
+    def __init__(self, message, confirmed, pending, remaining):
+        super().__init__(message)
+        self.confirmed = confirmed
+        self.pending = pending
+        self.remaining = remaining
+
+
+class OutputGuard:
+    """
+    Check that formatted output keeps the words of its input while it is generated.
+
+    Every complete output word is matched against the next input words, ignoring
+    punctuation and case. Output is passed on only up to the last matched word, so
+    when the model starts to ramble, repeat itself or drop text, everything passed
+    on is still a faithful prefix of the input and the rest can be requested again.
+
+    Args:
+        source (str): The input chunk.
+    """
+
+    def __init__(self, source):
+        self.words = source.split()
+        self.normalized = [normalize_word(word) for word in self.words]
+        self.allowed = max(GUARD_MIN_MISSES, int(len(self.words) * GUARD_MISS_SHARE))
+        self.text = ""
+        self.checked = 0
+        self.confirmed = 0
+        self.passed = 0
+        self.position = 0
+        self.misses = 0
+
+    def _check(self, end):
+        for match in re.finditer(r"\S+", self.text[self.checked:end]):
+            word = normalize_word(match.group())
+            if not word:
+                continue
+            window = self.normalized[self.position:self.position + LOOKAHEAD_WORDS]
+            if word in window:
+                skipped = window.index(word)
+                self.misses += sum(1 for other in window[:skipped] if other)
+                self.position += skipped + 1
+                self.confirmed = self.checked + match.end()
+            else:
+                self.misses += 1
+            if self.misses > self.allowed:
+                self._diverged(f"output diverged from the input after {self.position} of {len(self.words)} words")
+        self.checked = end
+
+    def _diverged(self, message):
+        pending = self._pass_on(self.confirmed)
+        raise OutputDiverged(message, self.text[:self.confirmed].strip(), pending,
+                             " ".join(self.words[self.position:]))
+
+    def _pass_on(self, end):
+        piece = self.text[self.passed:end]
+        self.passed = end
+        return piece
+
+    def feed(self, piece):
+        """
+        Add a piece of output.
+
+        Args:
+            piece (str): The next piece of generated text.
+
+        Returns:
+            str: Output that can be passed on, possibly empty.
+
+        Raises:
+            OutputDiverged: If too many output words do not match the input.
+        """
+        self.text += piece
+        if not self.text[-1:].isspace():
+            # The last word may continue in the next piece
+            self._check(max(self.checked, re.search(r"\S*$", self.text).start()))
+        else:
+            self._check(len(self.text))
+        return self._pass_on(self.confirmed)
+
+    def finish(self):
+        """
+        Check the complete output.
+
+        Returns:
+            str: The output not passed on yet.
+
+        Raises:
+            OutputDiverged: If the output misses or changes too many input words, e.g.
+                because generation stopped early.
+        """
+        self._check(len(self.text))
+        missing = sum(1 for word in self.normalized[self.position:] if word)
+        if self.misses + missing > self.allowed:
+            self._diverged(f"output ended after {self.position} of {len(self.words)} input words")
+        return self._pass_on(len(self.text))
+
+
+def check_output(source, output):
+    """
+    Check a complete formatted output against its input.
+
+    Raises:
+        OutputDiverged: If the output does not keep the words of ``source``.
+    """
+    guard = OutputGuard(source)
+    guard.feed(output)
+    guard.finish()
@@ -0,0 +1,192 @@
+import difflib
+import re
+
+from output_guard import normalize_word
+
+# Output words examined beyond the overlap when aligning it, to absorb words the model merged or split
+ALIGN_SLACK = 8
+
+# A word that ends a sentence, possibly followed by closing quotes or brackets
+SENTENCE_END = re.compile(r"[.!?…][\"'»«“”)\]]*$")
+
+
+def add_context(chunks, overlap_tokens, counter, overlaps):
+    """
+    Prefix every chunk with the end of the chunk before it.
+
+    The context is the last ``overlap_tokens`` tokens of the previous raw chunk,
+    cut to whole words. It lets the model punctuate the start of a chunk that was
+    sliced in the middle of a sentence; stitch_overlaps removes it again.
+
+    Args:
+        chunks (iterable of str): Raw text chunks; may be a generator.
+        overlap_tokens (int): Size of the context in tokens.
+        counter (object): Token counter with ``encode_batch`` and ``decode``.
+        overlaps (list): Receives, per chunk, the list of context words it was sent with.
+
+    Yields:
+        str: The chunks with their context, in order.
+    """
+    previous = None
+    for chunk in chunks:
+        words = []
+        if previous is not None and overlap_tokens > 0:
+            tokens = counter.encode_batch([previous])[0]
+            tail = counter.decode(tokens[-overlap_tokens:]).strip()
+            words = tail.split()
+            start = len(previous) - len(tail)
+            # Drop a word that the token slice cut in half
+            if len(tokens) > overlap_tokens and words and (not previous.endswith(tail) or
+                                                           (start > 0 and not previous[start - 1].isspace())):
+                words = words[1:]
+        overlaps.append(words)
+        yield " ".join(words + [chunk]) if words else chunk
+        previous = chunk
+
+
+def _locate(raw_words, output_words, position):
+    """
+    Find the output word that corresponds to ``raw_words[position]``, comparing words
+    without punctuation and case.
+
+    Returns:
+        int | None: Index into ``output_words``, or None if the words cannot be aligned.
+    """
+    matcher = difflib.SequenceMatcher(None, [normalize_word(word) for word in raw_words],
+                                      [normalize_word(word) for word in output_words], autojunk=False)
+    for a, b, size in matcher.get_matching_blocks():
+        if size and a <= position < a + size:
+            return b + position - a
+        if size and a > position:
+            return b
+    return None
+
+
+def _words(text):
+    return [match.span() for match in re.finditer(r"\S+", text)]
+
+
+class _Stitcher:
+    """State of stitch_overlaps: the chunk being received and the paragraph being written."""
+
+    def __init__(self, overlaps, hold_words):
+        self.overlaps = overlaps
+        self.hold_words = hold_words
+        self.output = []
+        self.paragraph = 0
+        self.at_paragraph_start = True
+        self.break_pending = False
+        self.index = -1
+        self.text = ""
+        self.emitted = 0
+        self.resolved = True
+        self.previous_tail = ""
+
+    def write(self, value):
+        """Append text to the output, starting a paragraph after the first sentence end if a break is pending."""
+        while value:
+            end, found = len(value), False
+            if self.break_pending:
+                for match in re.finditer(r"\S+", value):
+                    if SENTENCE_END.search(match.group()):
+                        end, found = match.end(), True
+                        break
+            piece = value[:end].lstrip() if self.at_paragraph_start else value[:end]
+            if piece:
+                self.output.append((self.paragraph, piece))
+                self.at_paragraph_start = False
+            value = value[end:]
+            if found:
+                self.new_paragraph()
+
+    def new_paragraph(self):
+        if not self.at_paragraph_start:
+            self.paragraph += 1
+            self.at_paragraph_start = True
+        self.break_pending = False
+
+    def feed(self, index, piece):
+        if index != self.index:
+            if self.index >= 0:
+                self.resolve(final=True)
+                self.previous_tail = self.text[self.emitted:]
+            self.index, self.text, self.emitted = index, "", 0
+            self.resolved = index == 0
+
+        self.text += piece
+        if not self.resolved and not self.resolve(final=False):
+            return
+        spans = _words(self.text[self.emitted:])
+        if len(spans) > self.hold_words:
+            end = self.emitted + spans[-self.hold_words - 1][1]
+            self.write(self.text[self.emitted:end])
+            self.emitted = end
+
+    def resolve(self, final):
+        """Place the seam between the held-back end of the previous chunk and the start of this one."""
+        if self.resolved:
+            return True
+        overlap = self.overlaps[self.index]
+        head = _words(self.text)[:len(overlap) + ALIGN_SLACK]
+        if overlap and not final and len(head) < len(overlap) + ALIGN_SLACK:
+            return False
+        self.resolved = True
+
+        if not overlap:
+            # Sent without context: the seam is the chunk boundary, as without overlap
+            self.write(self.previous_tail)
+            self.new_paragraph()
+            return True
+
+        tail = _words(self.previous_tail)
+        middle = len(overlap) // 2
+        next_cut = _locate(overlap, [self.text[start:end] for start, end in head], middle)
+        previous_cut = _locate(overlap, [self.previous_tail[start:end] for start, end in tail], middle)
+        if next_cut is None or previous_cut is None:
+            # Keep the previous chunk whole and drop as many words as the context had
+            previous_cut, next_cut = len(tail), min(len(overlap), len(head))
+
+        keep = tail[previous_cut][0] if previous_cut < len(tail) else len(self.previous_tail)
+        self.write(self.previous_tail[:keep].rstrip())
+        self.previous_tail = ""
+        start = head[next_cut][0] if next_cut < len(head) else len(self.text)
+        self.text, self.emitted = " " + self.text[start:], 0
+        self.break_pending = True
+        return True
+
+    def close(self):
+        if self.index >= 0:
+            self.resolve(final=True)
+            self.write(self.text[self.emitted:])
+
+
+def stitch_overlaps(tokens, overlaps, hold_words):
+    """
+    Merge the formatted output of chunks sent with add_context into one text stream.
+
+    The context words appear twice in the output: at the end of the previous chunk,
+    punctuated without knowing what follows, and at the start of the next chunk,
+    punctuated without knowing what came before. The seam is placed in the middle
+    of the overlap, where both sides had context, and the paragraph break that used
+    to sit at the chunk boundary moves to the first sentence end after the seam.
+
+    The last ``hold_words`` words of every chunk are held back until the start of
+    the next chunk arrives; everything before them streams through as it is generated.
+
+    Args:
+        tokens (iterable of tuple[int, str]): Chunk index and piece of its formatted text,
+            in order, e.g. from iter_formatted_tokens.
+        overlaps (list of list[str]): Context words per chunk, filled by add_context.
+        hold_words (int): Words held back at the end of each chunk; at least the number
+            of context words plus ALIGN_SLACK.
+
+    Yields:
+        tuple[int, str]: Paragraph index and the next piece of its text.
+    """
+    stitcher = _Stitcher(overlaps, hold_words)
+    for index, piece in tokens:
+        stitcher.feed(index, piece)
+        yield from stitcher.output
+        stitcher.output.clear()
+    stitcher.close()
+    yield from stitcher.output
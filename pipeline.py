@@ -0,0 +1,376 @@
+import time
+
+from concurrency import hold_slot, prefetch
+from config import config
+from metrics import METRICS, stage
+from recognizers import get_recognizer_backend, is_transcription_error
+from format_text import (API_URL, FormattingCancelled, get_chunk_budget, get_default_counter, get_format_engine, iter_formatted_chunks,
+                         iter_formatted_tokens, iter_punctuated_texts, split_text_by_tokens)
+from punctuation import split_paragraphs
+
+
+class TranscriptionIncomplete(RuntimeError):
+    """
+    Raised by run_pipeline once the output is written when some chunks could not be
+    transcribed; their error markers are in the text, and a resumed run redoes only them.
+
+    Attributes:
+        failed (list[int]): Positions of the chunks that failed.
+        count (int): Number of formatted chunks written.
+    """
+
+    def __init__(self, failed, count):
+        super().__init__(f"{len(failed)} chunks could not be transcribed")
+        self.failed = failed
+        self.count = count
+
+
+def stream_transcripts(url, language="de-DE", chunk_length_ms=60000, chunking="vad", cache=None,
+                       workers=None, download_slots=None, timings=None, recognizer=None, journal=None,
+                       cancel_event=None):
+    """
+    Stream a video's audio and yield its transcript chunk by chunk.
+
+    The audio is downloaded and decoded in a background thread one chunk at a time
+    and handed to the recognizer in memory while earlier chunks are transcribed,
+    so download, transcription and formatting overlap.
+
+    Args:
+        url (str): URL of the YouTube video.
+        language (str): Language code for transcription.
+        chunk_length_ms (int): Maximum duration of each audio chunk in milliseconds.
+        chunking (str): "vad" to cut at pauses and skip silence, or "fixed" for equal-length cuts.
+        cache (cache.DiskCache | None): Cache for the decoded audio and the chunk transcripts.
+        workers (int | None): Number of chunks transcribed at the same time;
+            TRANSCRIBE_WORKERS if omitted.
+        download_slots (threading.Semaphore | None): Shared limit on concurrent downloads.
+        timings (dict | None): Receives the download timing breakdown.
+        recognizer (str | None): Speech-recognition backend, see recognizers.RECOGNIZER_BACKENDS;
+            config.recognizer if omitted.
+        journal (journal.JobJournal | None): Journal that records every transcript and
+            provides those of an interrupted run.
+        cancel_event (threading.Event | None): Set it to stop reading and transcribing
+            further audio chunks; the download is then stopped as well.
+
+    Yields:
+        str: Transcribed text of each audio chunk, in order.
+
+    Raises:
+        format_text.FormattingCancelled: If ``cancel_event`` is set before all chunks are transcribed.
+    """
+    # The transcription stage pulls in yt-dlp and SpeechRecognition, so it is only imported when used
+    from extract_text_from_video import TRANSCRIBE_WORKERS, iter_transcriptions, report_chunks, stream_audio_chunks
+
+    workers = workers or TRANSCRIBE_WORKERS
+    recognizer = recognizer or config.recognizer
+    audio = stream_audio_chunks(url, chunk_length_ms, timings, chunking=chunking, cache=cache)
+    chunks = prefetch(report_chunks(until_cancelled(hold_slot(audio, download_slots), cancel_event)))
+    backend = None if recognizer == "google" else get_recognizer_backend(recognizer)
+    yield from iter_transcriptions(chunks, language, workers, cache=cache, backend=backend, journal=journal)
+
+
+def until_cancelled(items, cancel_event):
+    """
+    Pass items through until ``cancel_event`` is set.
+
+    Yields:
+        The items of ``items``, in order.
+
+    Raises:
+        format_text.FormattingCancelled: If ``cancel_event`` is set before the items are exhausted;
+            ``items`` is closed first.
+    """
+    if cancel_event is None:
+        yield from items
+        return
+
+    for item in items:
+        if cancel_event.is_set():
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+            raise FormattingCancelled("The run was cancelled.")
+        yield item
+
+
+def stream_formatted(texts, max_tokens=None, parallel=None, api_url=API_URL, cancel_event=None, cache=None,
+                     session=None, limiter=None, journal=None, overlap_tokens=None, engine=None):
+    """
+    Format a stream of raw texts as they arrive.
+
+    Args:
+        texts (iterable of str): Raw transcript pieces; usually a generator.
+        max_tokens (int | None): Maximum number of input tokens per LLM request; derived
+            from the model's context window and tokenizer if omitted.
+        parallel (int | None): Maximum number of concurrent LLM requests; config.n_parallel if omitted.
+        api_url (str | endpoints.EndpointPool): OpenAI-compatible chat completions endpoint, or a pool.
+        cancel_event (threading.Event | None): Set it to stop formatting further chunks.
+        cache (cache.DiskCache | None): Cache for formatted chunks.
+        session (requests.Session | None): Session to reuse across streams.
+        limiter (threading.Semaphore | None): Shared limit on LLM requests in flight.
+        journal (journal.JobJournal | None): Journal that records every formatted chunk
+            and provides those of an interrupted run.
+        overlap_tokens (int | None): Tokens of context sent from the end of the previous
+            chunk, see format_text.iter_formatted_chunks; config.overlap_tokens if omitted.
+        engine (str | None): One of format_text.FORMAT_ENGINES; config.format_engine if omitted.
+            The punctuation model handles the texts as they arrive, see
+            format_text.iter_punctuated_texts, with the same cancel event, cache and journal.
+
+    Yields:
+        str: Formatted text chunks, in order; stitched paragraphs with an overlap, and
+        paragraphs of whole sentences with the "punct" engine.
+    """
+    engine = get_format_engine(engine)
+    if engine != "llm":
+        texts = iter_punctuated_texts(texts, cancel_event, cache, journal)
+    if engine == "punct":
+        yield from (paragraph for text in texts for paragraph in split_paragraphs(text))
+        return
+
+    overlap_tokens = config.overlap_tokens if overlap_tokens is None else overlap_tokens
+    counter = get_default_counter(api_url)
+    chunks, max_new_tokens = split_stream(texts, max_tokens, counter, overlap_tokens)
+    yield from iter_formatted_chunks(chunks, parallel, api_url, cancel_event, session, cache, limiter, max_new_tokens,
+                                     journal, overlap_tokens, counter)
+
+
+def stream_formatted_tokens(texts, max_tokens=None, parallel=None, api_url=API_URL, cancel_event=None,
+                            cache=None, session=None, limiter=None, journal=None, overlap_tokens=None,
+                            engine=None):
+    """
+    Format a stream of raw texts as they arrive, yielding the output token by token.
+
+    Takes the same arguments as stream_formatted.
+
+    Yields:
+        tuple[int, str]: Index of the formatted chunk, or of the stitched paragraph with an
+        overlap, and the next piece of its text, in order. The "punct" engine yields
+        every paragraph as one piece.
+    """
+    engine = get_format_engine(engine)
+    if engine == "punct":
+        yield from enumerate(stream_formatted(texts, cancel_event=cancel_event, cache=cache, journal=journal,
+                                              engine=engine))
+        return
+    if engine == "punct+llm":
+        texts = iter_punctuated_texts(texts, cancel_event, cache, journal)
+
+    overlap_tokens = config.overlap_tokens if overlap_tokens is None else overlap_tokens
+    counter = get_default_counter(api_url)
+    chunks, max_new_tokens = split_stream(texts, max_tokens, counter, overlap_tokens)
+    yield from iter_formatted_tokens(chunks, parallel, api_url, cancel_event, session, cache, limiter, max_new_tokens,
+                                     journal, overlap_tokens, counter)
+
+
+def split_stream(texts, max_tokens=None, counter=None, overlap_tokens=0):
+    """
+    Split a stream of raw texts into LLM-sized chunks in a background thread.
+
+    Short texts, such as the transcripts of pauses cut by the silence-aware chunking,
+    are collected until they fill a chunk, so every request but the last uses the
+    whole budget.
+
+    Args:
+        texts (iterable of str): Raw transcript pieces.
+        max_tokens (int | None): Maximum number of input tokens per chunk; derived from
+            the model's context window and tokenizer if omitted.
+        counter (object | None): Token counter; the default counter if omitted.
+        overlap_tokens (int): Context that will be added to every chunk, which the
+            derived chunk size leaves room for.
+
+    Returns:
+        tuple: The chunk generator and ``max_tokens`` to use for generation.
+    """
+    counter = counter or get_default_counter()
+    chunk_tokens, max_new_tokens = get_chunk_budget(counter, overlap_tokens=overlap_tokens)
+    if max_tokens is not None:
+        chunk_tokens = max_tokens
+    return prefetch(merge_texts(texts, chunk_tokens, counter)), max_new_tokens
+
+
+def merge_texts(texts, max_tokens, counter):
+    """
+    Join consecutive texts and cut them into chunks of at most ``max_tokens`` tokens.
+
+    Text is held back until it fills a chunk; the rest of every cut waits for the
+    next text, and whatever is left is flushed when the stream ends.
+
+    Args:
+        texts (iterable of str): Raw transcript pieces.
+        max_tokens (int): Maximum number of input tokens per chunk.
+        counter (object): Token counter.
+
+    Yields:
+        str: The chunks, in order.
+    """
+    pending, pending_tokens = [], 0
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        pending.append(text)
+        pending_tokens += len(counter.encode_batch([text])[0])
+        if pending_tokens < max_tokens:
+            continue
+        chunks = split_text_by_tokens(" ".join(pending), max_tokens, counter)
+        yield from chunks[:-1]
+        pending = chunks[-1:]
+        pending_tokens = len(counter.encode_batch(pending)[0]) if pending else 0
+    if pending:
+        yield from split_text_by_tokens(" ".join(pending), max_tokens, counter)
+
+
+def track_failures(texts, failed):
+    """
+    Pass transcripts through, adding the position of every error marker to ``failed``.
+
+    Yields:
+        str: The same texts, unchanged.
+    """
+    for index, text in enumerate(texts):
+        if is_transcription_error(text):
+            failed.append(index)
+        yield text
+
+
+def report_transcripts(texts, on_progress):
+    """
+    Pass transcripts through, reporting each one to ``on_progress("transcript", ...)``.
+
+    Yields:
+        str: The same texts, unchanged.
+    """
+    for index, text in enumerate(texts):
+        on_progress("transcript", {"index": index, "words": len(text.split())})
+        yield text
+
+
+def write_through(texts, file):
+    """
+    Append each text to an open file as it passes, separated by blank lines.
+
+    Args:
+        texts (iterable of str): Texts to write.
+        file (TextIO): File opened for writing.
+
+    Yields:
+        str: The same texts, unchanged.
+    """
+    for i, text in enumerate(texts):
+        file.write(("\n\n" if i else "") + text)
+        file.flush()
+        yield text
+
+
+def run_pipeline(url, raw_output="output.txt", formatted_output="formatted_output.txt", language="de-DE",
+                 chunking="vad", cache=None, transcribe_workers=None, format_parallel=None,
+                 session=None, download_slots=None, format_slots=None, timings=None, recognizer=None,
+                 stream_tokens=False, on_token=None, journal=None, api_url=API_URL, cancel_event=None,
+                 on_progress=None):
+    """
+    Transcribe and format a video as one overlapping stream of chunks.
+
+    Raw and formatted text are written incrementally, so the first formatted
+    paragraph is available after the first chunk instead of the whole video.
+
+    Args:
+        url (str): URL of the YouTube video.
+        raw_output (str): File receiving the raw transcript.
+        formatted_output (str): File receiving the formatted text.
+        language (str): Language code for transcription.
+        chunking (str): "vad" to cut at pauses and skip silence, or "fixed" for equal-length cuts.
+        cache (cache.DiskCache | None): Cache for audio, transcripts and formatted chunks,
+            so a re-run only redoes the work that changed.
+        transcribe_workers (int | None): Number of chunks transcribed at the same time;
+            TRANSCRIBE_WORKERS if omitted.
+        format_parallel (int | None): Maximum number of concurrent LLM requests for this video;
+            config.n_parallel if omitted.
+        session (requests.Session | None): HTTP session to share with other pipelines.
+        download_slots (threading.Semaphore | None): Shared limit on concurrent downloads.
+        format_slots (threading.Semaphore | None): Shared limit on LLM requests in flight.
+        timings (dict | None): Receives download phases plus 'first_output' and 'total' seconds.
+        recognizer (str | None): Speech-recognition backend, see recognizers.RECOGNIZER_BACKENDS;
+            config.recognizer if omitted.
+        stream_tokens (bool): Stream the LLM responses and write the formatted text token
+            by token instead of chunk by chunk.
+        on_token (callable | None): Called with every piece of formatted text as it is
+            written; implies ``stream_tokens``.
+        journal (journal.JobJournal | None): Journal of the job. Completed transcripts and
+            formatted chunks are recorded as they finish, and those recorded by an
+            interrupted run are reused instead of being computed again.
+        api_url (str | endpoints.EndpointPool): Chat completions endpoint, or a pool of them.
+        cancel_event (threading.Event | None): Set it to stop the run before the next audio
+            chunk is transcribed or the next chunk is formatted; the run then raises
+            format_text.FormattingCancelled.
+        on_progress (callable | None): Called with ``("transcript", {"index", "words"})`` for
+            every transcribed chunk and ``("formatted", {"index", "text"})`` for every
+            formatted chunk, as they are written.
+
+    Returns:
+        int: Number of formatted chunks written.
+
+    Raises:
+        TranscriptionIncomplete: If some chunks could not be transcribed. The journal then
+            still holds every finished chunk, so it must not be finished.
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    failed = []
+
+    with open(raw_output, "w", encoding="utf-8") as raw_file, \
+            open(formatted_output, "w", encoding="utf-8") as formatted_file:
+        transcripts = stream_transcripts(url, language, chunking=chunking, cache=cache, workers=transcribe_workers,
+                                         download_slots=download_slots, timings=timings, recognizer=recognizer,
+                                         journal=journal, cancel_event=cancel_event)
+        transcripts = track_failures(transcripts, failed)
+        if on_progress is not None:
+            transcripts = report_transcripts(transcripts, on_progress)
+        raw_texts = write_through(transcripts, raw_file)
+        count = 0
+        # Formatting pulls the transcripts through the pipeline, so this stage spans the
+        # whole run and overlaps "download" and "transcribe"
+        with stage("format") as counts:
+            if stream_tokens or on_token is not None:
+                tokens = stream_formatted_tokens(raw_texts, parallel=format_parallel, api_url=api_url,
+                                                 cancel_event=cancel_event, cache=cache, session=session,
+                                                 limiter=format_slots, journal=journal)
+                pieces = []
+                for index, piece in tokens:
+                    if index == count:
+                        if count:
+                            print(f"  Formatted chunk {count} written to '{formatted_output}'")
+                            if on_progress is not None:
+                                on_progress("formatted", {"index": count - 1, "text": "".join(pieces)})
+                            pieces = []
+                            piece = "\n\n" + piece
+                        else:
+                            timings["first_output"] = time.perf_counter() - started
+                        count += 1
+                    formatted_file.write(piece)
+                    formatted_file.flush()
+                    pieces.append(piece.lstrip("\n"))
+                    if on_token is not None:
+                        on_token(piece)
+                if count:
+                    print(f"  Formatted chunk {count} written to '{formatted_output}'")
+                    if on_progress is not None:
+                        on_progress("formatted", {"index": count - 1, "text": "".join(pieces)})
+            else:
+                formatted = stream_formatted(raw_texts, parallel=format_parallel, api_url=api_url,
+                                             cancel_event=cancel_event, cache=cache, session=session,
+                                             limiter=format_slots, journal=journal)
+                for count, text in enumerate(write_through(formatted, formatted_file), start=1):
+                    if count == 1:
+                        timings["first_output"] = time.perf_counter() - started
+                    print(f"  Formatted chunk {count} written to '{formatted_output}'")
+                    if on_progress is not None:
+                        on_progress("formatted", {"index": count - 1, "text": text})
+            counts["chunks"] = count
+
+    timings["total"] = time.perf_counter() - started
+    METRICS.record("pipeline", timings["total"], chunks=count)
+    if "first_output" in timings:
+        METRICS.observe("first_output", timings["first_output"])
+    if failed:
+        raise TranscriptionIncomplete(failed, count)
+    return count
@@ -0,0 +1,171 @@
+import re
+import threading
+
+from concurrency import batched
+from config import config
+from metrics import stage
+
+# Words per model input, and words at each inner edge of a window whose prediction is
+# taken from the neighbouring window instead, where they have context on both sides
+WINDOW_WORDS = 120
+WINDOW_CONTEXT = 16
+
+# Marks the engine inserts, and label names some models use instead of the marks
+PUNCTUATION = ".,!?"
+LABEL_MARKS = {"PERIOD": ".", "COMMA": ",", "QUESTION": "?", "EXCLAMATION": "!"}
+
+
+def _windows(count, size=WINDOW_WORDS, context=WINDOW_CONTEXT):
+    """
+    Cover ``count`` words with overlapping windows.
+
+    Yields:
+        tuple[int, int, int, int]: Start and end of the window, and the range of words
+        whose prediction is kept from it. The kept ranges are contiguous.
+    """
+    start = 0
+    while True:
+        end = min(count, start + size)
+        keep_from = start if start == 0 else start + context
+        keep_to = end if end == count else end - context
+        yield start, end, keep_from, keep_to
+        if end == count:
+            return
+        start = keep_to - context
+
+
+def _apply_marks(words, marks):
+    """Append the predicted marks to the words and capitalize the word after each sentence end."""
+    output = []
+    capitalize = True
+    for word, mark in zip(words, marks):
+        if capitalize:
+            word = word[:1].upper() + word[1:]
+        if mark and not word.endswith(tuple(PUNCTUATION)):
+            word += mark
+        output.append(word)
+        capitalize = word.endswith((".", "!", "?"))
+    return " ".join(output)
+
+
+class PunctuationModel:
+    """
+    Small token-classification model that restores punctuation on CPU.
+
+    The model labels every word with the mark that follows it, so nothing is generated
+    and the words are never changed. Long texts are cut into overlapping windows, and
+    the windows of all texts are classified in batches. Options left out are taken
+    from config. One instance can be shared between threads; their calls to the model
+    take turns, since the fast tokenizer is not thread-safe.
+    """
+
+    def __init__(self, model=None, batch_size=None, threads=None):
+        import torch
+        from transformers import AutoModelForTokenClassification, AutoTokenizer
+
+        model = model or config.punct_model
+        batch_size = batch_size or config.punct_batch_size
+        threads = config.punct_threads if threads is None else threads
+        if threads:
+            torch.set_num_threads(threads)
+        self.name = f"punct:{model}"
+        self.batch_size = batch_size
+        self.torch = torch
+        self._lock = threading.Lock()
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.model = AutoModelForTokenClassification.from_pretrained(model).eval()
+        self.max_length = min(self.tokenizer.model_max_length, 512)
+        self.marks = {}
+        for label_id, label in self.model.config.id2label.items():
+            mark = LABEL_MARKS.get(label.upper(), label)
+            if mark in PUNCTUATION:
+                self.marks[int(label_id)] = mark
+
+    def punctuate_batch(self, texts):
+        """
+        Add punctuation to several texts with batched inference.
+
+        Args:
+            texts (list of str): Unpunctuated texts.
+
+        Returns:
+            list of str: The texts with marks from PUNCTUATION and capitalized sentence starts.
+        """
+        words = [text.split() for text in texts]
+        marks = [[None] * len(text_words) for text_words in words]
+        jobs = [(index, *window) for index, text_words in enumerate(words) if text_words
+                for window in _windows(len(text_words))]
+
+        with stage("punctuate", texts=len(texts), windows=len(jobs), words=sum(map(len, words))):
+            for batch in batched(jobs, self.batch_size):
+                with self._lock:
+                    encoding = self.tokenizer([words[index][start:end] for index, start, end, _, _ in batch],
+                                              is_split_into_words=True, truncation=True, max_length=self.max_length,
+                                              padding=True, return_tensors="pt")
+                    with self.torch.inference_mode():
+                        predictions = self.model(**encoding).logits.argmax(-1).tolist()
+
+                for row, (index, start, _, keep_from, keep_to) in enumerate(batch):
+                    # The label of a word is the one predicted for its first sub-token
+                    seen = set()
+                    for position, word_id in enumerate(encoding.word_ids(row)):
+                        if word_id is None or word_id in seen:
+                            continue
+                        seen.add(word_id)
+                        if keep_from <= start + word_id < keep_to:
+                            marks[index][start + word_id] = self.marks.get(predictions[row][position])
+
+        return [_apply_marks(text_words, text_marks) for text_words, text_marks in zip(words, marks)]
+
+    def punctuate(self, text):
+        return self.punctuate_batch([text])[0]
+
+
+def split_paragraphs(text, words=None):
+    """
+    Split punctuated text into paragraphs of whole sentences.
+
+    Args:
+        text (str): Punctuated text.
+        words (int | None): A paragraph ends with the first sentence that brings it to this
+            many words; config.paragraph_words if omitted.
+
+    Returns:
+        list[str]: The paragraphs.
+    """
+    words = words or config.paragraph_words
+    paragraphs = []
+    current = []
+    count = 0
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        if not sentence:
+            continue
+        current.append(sentence)
+        count += len(sentence.split())
+        if count >= words:
+            paragraphs.append(" ".join(current))
+            current, count = [], 0
+    if current:
+        paragraphs.append(" ".join(current))
+    return paragraphs
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_punctuation_model(**options):
+    """
+    Return a punctuation model, loading it only once per process.
+
+    Args:
+        **options: Constructor arguments of PunctuationModel.
+
+    Returns:
+        PunctuationModel: The model.
+    """
+    with _models_lock:
+        key = tuple(sorted(options.items()))
+        if key not in _models:
+            _models[key] = PunctuationModel(**options)
+        return _models[key]
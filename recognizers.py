@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+
+from config import config
+
+# Speech-recognition backends accepted by get_recognizer_backend; the default and the
+# local model settings are resolved from config (RECOGNIZER, WHISPER_MODEL, ...)
+RECOGNIZER_BACKENDS = ("google", "whisper", "vosk")
+
+SAMPLE_RATE = 16000
+
+# Prefixes of the markers that replace the text of a chunk whose transcription failed
+ERROR_MARKERS = ("[API error", "[Transcription error")
+
+# Whisper decodes at most 30 seconds of audio per window
+WHISPER_WINDOW_SECONDS = 30
+
+
+def is_transcription_error(text):
+    """Tell whether a transcript is the error marker of a failed chunk."""
+    return text.startswith(ERROR_MARKERS)
+
+
+def to_float_samples(audio):
+    """
+    Convert audio data to 16kHz mono float32 samples in [-1, 1].
+
+    Args:
+        audio (sr.AudioData): Audio to convert.
+
+    Returns:
+        numpy.ndarray: The samples.
+    """
+    import numpy as np
+
+    if audio.sample_rate == SAMPLE_RATE and audio.sample_width == 2:
+        pcm = audio.frame_data
+    else:
+        pcm = audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2)
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+class GoogleBackend:
+    """
+    Google Web Speech API through SpeechRecognition; one network request per chunk.
+    """
+
+    name = "google"
+    batch_size = 1
+    max_workers = None
+
+    def __init__(self, timeout=None, retries=0, backoff=1.0, recognizer_factory=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.recognizer_factory = recognizer_factory
+
+    def transcribe(self, audio, language="de-DE"):
+        """
+        Transcribe one chunk, retrying request errors and timeouts with exponential backoff.
+
+        Args:
+            audio (sr.AudioData): Audio of the chunk.
+            language (str): Language code, e.g. "de-DE".
+
+        Returns:
+            str: Transcribed text or error message.
+        """
+        import speech_recognition as sr
+
+        recognizer = (self.recognizer_factory or sr.Recognizer)()
+        if self.timeout is not None:
+            recognizer.operation_timeout = self.timeout
+
+        for attempt in range(self.retries + 1):
+            try:
+                return recognizer.recognize_google(audio, language=language)
+            except sr.UnknownValueError:
+                return "[Unrecognized speech]"
+            except (sr.RequestError, TimeoutError) as e:
+                if attempt == self.retries:
+                    return f"[API error: {e}]"
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def transcribe_batch(self, audios, language="de-DE"):
+        return [self.transcribe(audio, language) for audio in audios]
+
+
+class WhisperBackend:
+    """
+    Local CTranslate2 Whisper model (faster-whisper) running on CPU.
+
+    The model is loaded once, and a batch of chunks is decoded in a single batched
+    inference call by cutting every chunk into windows of at most 30 seconds. Options
+    left out are taken from config.whisper_model, whisper_compute_type and whisper_batch_size.
+    """
+
+    def __init__(self, model=None, compute_type=None, cpu_threads=0, num_workers=1, batch_size=None):
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+        model = model or config.whisper_model
+        compute_type = compute_type or config.whisper_compute_type
+        batch_size = batch_size or config.whisper_batch_size
+        self.name = f"whisper:{model}"
+        self.batch_size = batch_size
+        self.max_workers = num_workers
+        self.model = WhisperModel(model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads,
+                                  num_workers=num_workers)
+        self.pipeline = BatchedInferencePipeline(self.model)
+
+    def transcribe_batch(self, audios, language="de-DE"):
+        """
+        Transcribe several chunks with one batched inference call.
+
+        Args:
+            audios (list of sr.AudioData): Audio of the chunks.
+            language (str): Language code; only the part before "-" is used.
+
+        Returns:
+            list of str: Transcribed text per chunk, in order.
+        """
+        import numpy as np
+
+        samples = [to_float_samples(audio) for audio in audios]
+        bounds = []
+        clips = []
+        offset = 0.0
+        for chunk in samples:
+            duration = len(chunk) / SAMPLE_RATE
+            bounds.append((offset, offset + duration))
+            windows = max(1, int(np.ceil(duration / WHISPER_WINDOW_SECONDS)))
+            step = duration / windows
+            clips += [{"start": offset + i * step, "end": offset + (i + 1) * step} for i in range(windows)]
+            offset += duration
+
+        texts = [[] for _ in audios]
+        if offset > 0:
+            segments, _ = self.pipeline.transcribe(np.concatenate(samples), language=language.split("-")[0],
+                                                   clip_timestamps=clips, batch_size=self.batch_size,
+                                                   without_timestamps=True)
+            for segment in segments:
+                middle = (segment.start + segment.end) / 2
+                for index, (start, end) in enumerate(bounds):
+                    if start <= middle < end:
+                        texts[index].append(segment.text.strip())
+                        break
+
+        return [" ".join(parts) if parts else "[Unrecognized speech]" for parts in texts]
+
+    def transcribe(self, audio, language="de-DE"):
+        return self.transcribe_batch([audio], language)[0]
+
+
+class VoskBackend:
+    """
+    Local Kaldi model through Vosk; the model is loaded once and shared between threads.
+    """
+
+    batch_size = 1
+    max_workers = None
+
+    def __init__(self, model_path=None):
+        from vosk import KaldiRecognizer, Model, SetLogLevel
+
+        model_path = model_path or config.vosk_model_path
+        SetLogLevel(-1)
+        self.name = f"vosk:{os.path.basename(os.path.normpath(model_path))}"
+        self.model = Model(model_path)
+        self.recognizer_class = KaldiRecognizer
+
+    def transcribe(self, audio, language="de-DE"):
+        """
+        Transcribe one chunk; the language is fixed by the loaded model.
+
+        Args:
+            audio (sr.AudioData): Audio of the chunk.
+            language (str): Ignored.
+
+        Returns:
+            str: Transcribed text.
+        """
+        recognizer = self.recognizer_class(self.model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2))
+        text = json.loads(recognizer.FinalResult()).get("text", "").strip()
+        return text or "[Unrecognized speech]"
+
+    def transcribe_batch(self, audios, language="de-DE"):
+        return [self.transcribe(audio, language) for audio in audios]
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_recognizer_backend(name=None, **options):
+    """
+    Return a recognizer backend, loading local models only once per process.
+
+    Args:
+        name (str | None): One of RECOGNIZER_BACKENDS; config.recognizer if omitted.
+        **options: Constructor arguments of the backend class.
+
+    Returns:
+        object: A backend with ``name``, ``batch_size``, ``max_workers`` and
+        ``transcribe_batch(audios, language)``.
+
+    Raises:
+        ValueError: If ``name`` is unknown.
+    """
+    name = name or config.recognizer
+    if name not in RECOGNIZER_BACKENDS:
+        raise ValueError(f"Unknown recognizer '{name}', expected one of {RECOGNIZER_BACKENDS}.")
+    if name == "google":
+        return GoogleBackend(**options)
+
+    with _backends_lock:
+        key = (name, tuple(sorted(options.items())))
+        if key not in _backends:
+            backend_class = WhisperBackend if name == "whisper" else VoskBackend
+            _backends[key] = backend_class(**options)
+        return _backends[key]
@@ -0,0 +1,553 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from batch import Manifest
+from cache import DiskCache
+from config import config
+from format_text import (API_URL, FormattingCancelled, create_session, ensure_llm_servers, get_endpoint_pool,
+                         get_format_engine, get_format_settings)
+from journal import JobJournal, remove_orphans
+from llm_server import MODEL_ENV_FILES, read_server_settings
+from metrics import METRICS
+from pipeline import run_pipeline
+from punctuation import get_punctuation_model
+from recognizers import RECOGNIZER_BACKENDS, get_recognizer_backend
+
+SERVICE_DIR = "service_jobs"
+MANIFEST_NAME = "manifest.json"
+
+# Seconds an event stream waits for news before checking the job again
+EVENT_WAIT_SECONDS = 15
+
+# Statuses after which a job produces no more events, and those a job can be resumed from
+FINAL_STATUSES = ("done", "failed", "cancelled", "interrupted")
+RESUMABLE_STATUSES = ("failed", "cancelled", "interrupted")
+
+# Finished jobs whose progress events are kept: the most recent ones, finished at most
+# this many seconds ago. Older jobs keep only their final event.
+EVENT_RETENTION_JOBS = 50
+EVENT_RETENTION_SECONDS = 3600
+
+
+class Job:
+    """
+    A video submitted to the service, with its settings, status and progress events.
+    """
+
+    def __init__(self, job_id, url, workdir, language="de-DE", model=None, recognizer="google", chunking="vad"):
+        self.id = job_id
+        self.url = url
+        self.workdir = workdir
+        self.language = language
+        self.model = model
+        self.recognizer = recognizer
+        self.chunking = chunking
+        self.status = "queued"
+        self.error = None
+        self.chunks = 0
+        self.timings = {}
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self.dropped_events = 0
+        self.cancel_event = threading.Event()
+        self.future = None
+        self._changed = threading.Condition()
+
+    @property
+    def raw_path(self):
+        return os.path.join(self.workdir, "output.txt")
+
+    @property
+    def formatted_path(self):
+        return os.path.join(self.workdir, "formatted_output.txt")
+
+    @property
+    def finished(self):
+        return self.status in FINAL_STATUSES
+
+    @property
+    def event_count(self):
+        """Number of events emitted so far, including dropped ones."""
+        return self.dropped_events + len(self.events)
+
+    def emit(self, kind, **data):
+        """
+        Record a progress event and wake up the event streams of the job.
+
+        Args:
+            kind (str): Event name, e.g. "transcript" or "formatted".
+            **data: JSON-serialisable event data.
+        """
+        with self._changed:
+            self.events.append({"id": self.event_count, "event": kind, "data": {"job": self.id, **data}})
+            self._changed.notify_all()
+
+    def set_status(self, status, **data):
+        """Change the status and emit it as an event."""
+        with self._changed:
+            self.status = status
+            if status == "running":
+                self.started_at = time.time()
+            elif status in FINAL_STATUSES:
+                self.finished_at = self.finished_at or time.time()
+            self.emit(status, **data)
+
+    def wait_events(self, after, timeout=EVENT_WAIT_SECONDS):
+        """
+        Return the events after the first ``after`` ones, waiting for new ones if there are none.
+
+        Args:
+            after (int): Number of events the caller has already seen.
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            list[dict]: The new events that are still kept; empty if the job finished or
+            nothing happened in time.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.event_count > after or self.finished, timeout)
+            return self.events[max(0, after - self.dropped_events):]
+
+    def drop_events(self):
+        """Forget the progress events of a finished job, keeping the final one with its outcome."""
+        with self._changed:
+            if self.finished and len(self.events) > 1:
+                self.dropped_events += len(self.events) - 1
+                self.events = self.events[-1:]
+
+    def reopen(self):
+        """
+        Queue a failed, cancelled or interrupted job again, e.g. to resume it.
+
+        The status is checked and changed under the job's lock, so of several calls
+        at the same time only one reopens the job.
+
+        Raises:
+            ValueError: If the job is not in one of RESUMABLE_STATUSES.
+        """
+        with self._changed:
+            if self.status not in RESUMABLE_STATUSES:
+                raise ValueError(f"Job '{self.id}' is {self.status}; only {', '.join(RESUMABLE_STATUSES)} jobs "
+                                 f"can be resumed.")
+            self.error = None
+            self.finished_at = None
+            self.cancel_event = threading.Event()
+            self.set_status("queued", resume=True)
+
+    def summary(self):
+        """Return the job's settings and state."""
+        return {
+            "id": self.id,
+            "url": self.url,
+            "language": self.language,
+            "model": self.model,
+            "recognizer": self.recognizer,
+            "chunking": self.chunking,
+            "status": self.status,
+            "error": self.error,
+            "chunks": self.chunks,
+            "timings": self.timings,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobService:
+    """
+    Long-lived pipeline that processes submitted videos from a queue.
+
+    Up to ``jobs`` videos run at the same time; downloads and LLM requests are limited
+    across all of them, like in batch mode. The LLM servers or in-process models, the
+    speech recognizer and the punctuation model are loaded once by warm_up and shared by
+    every job, as are the cache and the HTTP session.
+
+    Args:
+        jobs_dir (str): Directory holding one subdirectory per job and the manifest.
+        jobs (int): Number of videos processed at the same time.
+        downloads (int): Maximum number of concurrent audio downloads.
+        transcribe_workers (int | None): Number of chunks transcribed at the same time per video.
+        format_parallel (int | None): Maximum number of LLM requests in flight across all
+            jobs; the slots of all LLM endpoints if omitted.
+        recognizer (str | None): Speech-recognition backend of jobs that do not choose one;
+            config.recognizer if omitted.
+        event_retention_jobs (int): Number of most recently finished jobs whose progress
+            events are kept for replay; older ones keep only their final event.
+        event_retention_seconds (float): Seconds after which a finished job's progress
+            events are dropped in any case.
+    """
+
+    def __init__(self, jobs_dir=SERVICE_DIR, jobs=2, downloads=2, transcribe_workers=None, format_parallel=None,
+                 recognizer=None, event_retention_jobs=EVENT_RETENTION_JOBS,
+                 event_retention_seconds=EVENT_RETENTION_SECONDS):
+        os.makedirs(jobs_dir, exist_ok=True)
+        remove_orphans(jobs_dir, recursive=False)
+        self.jobs_dir = jobs_dir
+        self.recognizer = recognizer or config.recognizer
+        self.transcribe_workers = transcribe_workers
+        self.event_retention_jobs = event_retention_jobs
+        self.event_retention_seconds = event_retention_seconds
+        self.manifest = Manifest(os.path.join(jobs_dir, MANIFEST_NAME))
+        self.cache = DiskCache()
+        self.pool = get_endpoint_pool() if get_format_engine() != "punct" else None
+        self.format_parallel = format_parallel or (self.pool.slots if self.pool is not None else 1)
+        self.session = create_session(self.format_parallel)
+        self.download_slots = threading.Semaphore(downloads)
+        self.format_slots = threading.Semaphore(self.format_parallel)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="job")
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._load_manifest()
+
+    def _load_manifest(self):
+        """List the jobs of earlier runs; those that had not finished are marked as interrupted."""
+        for job_id, entry in self.manifest.jobs.items():
+            job = Job(job_id, entry["url"], entry["workdir"], entry.get("language", "de-DE"), entry.get("model"),
+                      entry.get("recognizer", self.recognizer), entry.get("chunking", "vad"))
+            job.submitted_at = entry.get("submitted_at", job.submitted_at)
+            job.error = entry.get("error")
+            job.chunks = entry.get("chunks", 0)
+            job.timings = entry.get("timings", {})
+            status = entry.get("status") if entry.get("status") in FINAL_STATUSES else "interrupted"
+            job.finished_at = entry.get("finished_at")
+            job.set_status(status)
+            self.jobs[job_id] = job
+        self._drop_old_events()
+
+    def _save(self, job):
+        self.manifest.update(job.id, **job.summary(), workdir=job.workdir)
+
+    def _drop_old_events(self):
+        """Drop the progress events of finished jobs beyond the retention limits."""
+        finished = sorted((job for job in self.list() if job.finished), key=lambda job: job.finished_at or 0,
+                          reverse=True)
+        cutoff = time.time() - self.event_retention_seconds
+        for position, job in enumerate(finished):
+            if position >= self.event_retention_jobs or (job.finished_at or 0) < cutoff:
+                job.drop_events()
+
+    def warm_up(self):
+        """
+        Load everything the jobs share before the first one starts: start or reuse the
+        LLM servers, load in-process LLMs, the local recognizer and the punctuation model.
+        """
+        ensure_llm_servers()
+        if self.recognizer != "google":
+            get_recognizer_backend(self.recognizer)
+        if get_format_engine() != "llm":
+            get_punctuation_model()
+
+    def resolve_pool(self, model=None):
+        """
+        Return the endpoints that format the jobs of a model.
+
+        Args:
+            model (str | None): Key of MODEL_ENV_FILES or model name; all endpoints if omitted.
+
+        Returns:
+            endpoints.EndpointPool | None: The endpoints; None if no LLM is used.
+
+        Raises:
+            ValueError: If no endpoint serves the model.
+        """
+        if self.pool is None:
+            if model:
+                raise ValueError("The service formats without an LLM; no model can be chosen.")
+            return None
+        if not model:
+            return self.pool
+        name = read_server_settings(MODEL_ENV_FILES[model])["model_name"] if model in MODEL_ENV_FILES else model
+        return self.pool.subset(name)
+
+    def submit(self, url, language="de-DE", model=None, recognizer=None, chunking="vad"):
+        """
+        Queue a video.
+
+        Args:
+            url (str): URL of the video.
+            language (str): Language code for transcription.
+            model (str | None): LLM that formats the text, see resolve_pool.
+            recognizer (str | None): Speech-recognition backend; the service's default if omitted.
+            chunking (str): "vad" or "fixed" audio chunking.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            ValueError: If an option is invalid.
+        """
+        recognizer = recognizer or self.recognizer
+        if recognizer not in RECOGNIZER_BACKENDS:
+            raise ValueError(f"Unknown recognizer '{recognizer}', expected one of {RECOGNIZER_BACKENDS}.")
+        if chunking not in ("vad", "fixed"):
+            raise ValueError(f"Unknown chunking '{chunking}', expected 'vad' or 'fixed'.")
+        pool = self.resolve_pool(model)
+
+        self._drop_old_events()
+        job_id = uuid.uuid4().hex[:12]
+        job = Job(job_id, url, os.path.join(self.jobs_dir, job_id), language, model, recognizer, chunking)
+        os.makedirs(job.workdir, exist_ok=True)
+        with self._lock:
+            self.jobs[job_id] = job
+        job.emit("queued", url=url)
+        self._save(job)
+        job.future = self.executor.submit(self._run, job, pool)
+        return job
+
+    def get(self, job_id):
+        """Return a job, or None if the ID is unknown."""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        """Return all jobs, oldest first."""
+        with self._lock:
+            return sorted(self.jobs.values(), key=lambda job: job.submitted_at)
+
+    def cancel(self, job):
+        """
+        Cancel a job. A queued job does not start; a running one stops before its next
+        audio chunk is transcribed and before its next formatting request. Chunks already
+        being transcribed or formatted are finished first.
+        """
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.set_status("cancelled")
+            self._save(job)
+
+    def resume(self, job):
+        """
+        Run a failed, cancelled or interrupted job again, reusing the transcripts and
+        formatted chunks recorded in its journal.
+
+        Args:
+            job (Job): The job.
+
+        Raises:
+            ValueError: If the job is not in one of RESUMABLE_STATUSES, or its model is no
+                longer served.
+        """
+        pool = self.resolve_pool(job.model)
+        job.reopen()
+        self._save(job)
+        job.future = self.executor.submit(self._run, job, pool, True)
+
+    def _run(self, job, pool, resume=False):
+        if job.cancel_event.is_set():
+            job.set_status("cancelled")
+            self._save(job)
+            return
+
+        job.set_status("running")
+        self._save(job)
+        print(f"[{'resume' if resume else 'start'}] {job.id} {job.url}")
+        journal = JobJournal(os.path.join(job.workdir, "journal"), job.url,
+                             {"language": job.language, "chunking": job.chunking, "recognizer": job.recognizer,
+                              **get_format_settings(pool if pool is not None else API_URL)}, resume)
+
+        def on_progress(kind, data):
+            if kind == "formatted":
+                job.chunks = data["index"] + 1
+            job.emit(kind, **data)
+
+        try:
+            run_pipeline(
+                job.url,
+                raw_output=job.raw_path,
+                formatted_output=job.formatted_path,
+                language=job.language,
+                chunking=job.chunking,
+                cache=self.cache,
+                transcribe_workers=self.transcribe_workers,
+                format_parallel=pool.slots if pool is not None else None,
+                session=self.session,
+                download_slots=self.download_slots,
+                format_slots=self.format_slots,
+                timings=job.timings,
+                recognizer=job.recognizer,
+                journal=journal,
+                api_url=pool if pool is not None else API_URL,
+                cancel_event=job.cancel_event,
+                on_progress=on_progress,
+            )
+        except FormattingCancelled:
+            job.set_status("cancelled")
+        except Exception as error:
+            job.error = str(error)
+            job.set_status("failed", error=job.error)
+            print(f"[failed] {job.id}: {error}")
+        else:
+            journal.finish()
+            job.set_status("done", chunks=job.chunks, timings=job.timings)
+            print(f"[done] {job.id}: {job.chunks} chunks in {job.timings.get('total', 0):.1f}s")
+        self._save(job)
+        self._drop_old_events()
+
+    def shutdown(self):
+        """Cancel the remaining jobs and release the shared resources."""
+        for job in self.list():
+            if not job.finished:
+                self.cancel(job)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+
+
+def create_app(service):
+    """
+    Build the HTTP API of a job service.
+
+    Routes:
+        POST /jobs: Submit a video; the body has ``url`` and optionally ``language``,
+            ``model``, ``recognizer`` and ``chunking``. Answers 202 with the job.
+        GET /jobs, GET /jobs/{id}: List the jobs, or show one.
+        DELETE /jobs/{id}: Cancel a job.
+        POST /jobs/{id}/resume: Run a failed, cancelled or interrupted job again from the
+            chunks recorded in its journal. Answers 202 with the job, or 409.
+        GET /jobs/{id}/events: Server-sent events of the job: queued, running,
+            transcript and formatted per chunk, and done, failed or cancelled. Past events
+            are replayed first; reconnecting clients resume after ``Last-Event-ID``. Jobs
+            beyond the service's retention limits replay only their final event.
+        GET /jobs/{id}/result: The formatted text, or the raw transcript with ``?raw=true``;
+            ``?partial=true`` returns what is written so far of an unfinished job.
+        GET /health, GET /metrics: Job counts, and the stage metrics in Prometheus format.
+
+    Args:
+        service (JobService): The service.
+
+    Returns:
+        fastapi.FastAPI: The application.
+    """
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import PlainTextResponse
+    from pydantic import BaseModel
+    from sse_starlette.sse import EventSourceResponse
+
+    class JobRequest(BaseModel):
+        url: str
+        language: str = "de-DE"
+        model: str | None = None
+        recognizer: str | None = None
+        chunking: str = "vad"
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await asyncio.to_thread(service.warm_up)
+        yield
+        await asyncio.to_thread(service.shutdown)
+
+    app = FastAPI(title="tol_vido", lifespan=lifespan)
+
+    def find(job_id):
+        job = service.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'.")
+        return job
+
+    @app.post("/jobs", status_code=202)
+    def submit_job(request: JobRequest):
+        try:
+            job = service.submit(request.url, request.language, request.model, request.recognizer, request.chunking)
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+        return job.summary()
+
+    @app.get("/jobs")
+    def list_jobs():
+        return [job.summary() for job in service.list()]
+
+    @app.get("/jobs/{job_id}")
+    def get_job(job_id: str):
+        return find(job_id).summary()
+
+    @app.delete("/jobs/{job_id}")
+    def cancel_job(job_id: str):
+        job = find(job_id)
+        service.cancel(job)
+        return job.summary()
+
+    @app.post("/jobs/{job_id}/resume", status_code=202)
+    def resume_job(job_id: str):
+        job = find(job_id)
+        try:
+            service.resume(job)
+        except ValueError as error:
+            raise HTTPException(status_code=409, detail=str(error))
+        return job.summary()
+
+    @app.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str, request: Request):
+        job = find(job_id)
+        last_id = request.headers.get("last-event-id")
+        seen = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+
+        async def events():
+            nonlocal seen
+            while True:
+                new = await asyncio.to_thread(job.wait_events, seen)
+                for event in new:
+                    yield {"id": str(event["id"]), "event": event["event"],
+                           "data": json.dumps(event["data"], ensure_ascii=False)}
+                seen = new[-1]["id"] + 1 if new else seen
+                if job.finished and seen >= job.event_count:
+                    return
+
+        return EventSourceResponse(events())
+
+    @app.get("/jobs/{job_id}/result", response_class=PlainTextResponse)
+    def job_result(job_id: str, raw: bool = False, partial: bool = False):
+        job = find(job_id)
+        if job.status != "done" and not partial:
+            raise HTTPException(status_code=409, detail=f"Job '{job_id}' is {job.status}.")
+        path = job.raw_path if raw else job.formatted_path
+        if not os.path.exists(path):
+            return ""
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+
+    @app.get("/health")
+    def health():
+        statuses = [job.status for job in service.list()]
+        return {"status": "ok", "jobs": {status: statuses.count(status) for status in sorted(set(statuses))}}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return METRICS.prometheus_text()
+
+    return app
+
+
+def main():
+    """
+    Command-line entry point of the service.
+    """
+    parser = argparse.ArgumentParser(description="Serve the transcribe and format pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--jobs-dir", default=SERVICE_DIR, help="Directory for per-job output and the manifest.")
+    parser.add_argument("--jobs", type=int, default=2, help="Videos processed at the same time.")
+    parser.add_argument("--downloads", type=int, default=2, help="Concurrent audio downloads.")
+    parser.add_argument("--transcribe-workers", type=int, help="Chunks transcribed at the same time per video.")
+    parser.add_argument("--format-parallel", type=int,
+                        help="LLM requests in flight across all videos; defaults to the slots of all LLM endpoints.")
+    parser.add_argument("--recognizer", choices=RECOGNIZER_BACKENDS,
+                        help="Default speech-recognition backend; RECOGNIZER or 'google' if omitted.")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    service = JobService(args.jobs_dir, args.jobs, args.downloads, args.transcribe_workers, args.format_parallel,
+                         args.recognizer)
+    uvicorn.run(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
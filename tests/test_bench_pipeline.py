@@ -0,0 +1,28 @@
+import os
+import wave
+
+import pytest
+
+TOOLS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools")
+
+
+@pytest.fixture
+def bench(monkeypatch):
+    monkeypatch.syspath_prepend(TOOLS)
+    return pytest.importorskip("bench_pipeline")
+
+
+@pytest.mark.parametrize("seconds, seed", [(10, 2), (60, 0), (60, 1), (120, 1), (1200, 0)])
+def test_speech_wav_has_the_requested_length(bench, tmp_path, seconds, seed):
+    path = bench.make_speech_wav(str(tmp_path / "speech.wav"), seconds=seconds, seed=seed)
+
+    with wave.open(path, "rb") as wav:
+        assert wav.getnframes() == seconds * bench.SAMPLE_RATE
+
+
+def test_speech_wav_is_reproducible(bench, tmp_path):
+    first = bench.make_speech_wav(str(tmp_path / "first.wav"), seconds=30, seed=3)
+    second = bench.make_speech_wav(str(tmp_path / "second.wav"), seconds=30, seed=3)
+
+    with open(first, "rb") as a, open(second, "rb") as b:
+        assert a.read() == b.read()
@@ -0,0 +1,55 @@
+import os
+import time
+
+from cache import DiskCache, hash_key
+
+
+def test_hash_key_separates_its_parts():
+    assert hash_key("ab", "c") != hash_key("a", "bc")
+    assert hash_key("text", b"\x00") == hash_key("text", b"\x00")
+
+
+def test_text_entries_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path))
+
+    cache.set_text("transcripts", "key", "hallo welt")
+
+    assert cache.get_text("transcripts", "key") == "hallo welt"
+    assert cache.get_text("transcripts", "other") is None
+
+
+def test_replacing_an_entry_keeps_the_size_total(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    cache.evict()
+
+    for _ in range(5):
+        cache.set_text("formatted", "key", "x" * 300)
+
+    assert cache._size == 300
+    assert cache.get_text("formatted", "key") == "x" * 300
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=250)
+    for index, key in enumerate(("old", "used", "new")):
+        cache.set_text("formatted", key, "x" * 100)
+        os.utime(cache.path("formatted", key, ".txt"), (1000 + index, 1000 + index))
+    cache.get_text("formatted", "used")
+
+    cache.evict()
+
+    assert cache.get_text("formatted", "old") is None
+    assert cache.get_text("formatted", "used") is not None
+    assert cache.get_text("formatted", "new") is not None
+
+
+def test_stale_temporary_files_are_removed_on_open(tmp_path):
+    first = DiskCache(str(tmp_path))
+    stale = first.temp_path("audio", ".wav")
+    fresh = first.temp_path("audio", ".wav")
+    os.utime(stale, (time.time() - 2 * 3600,) * 2)
+
+    DiskCache(str(tmp_path))
+
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
@@ -0,0 +1,39 @@
+import threading
+
+from concurrency import hold_slot, ordered_map, prefetch
+
+
+def test_prefetch_yields_items_in_order():
+    assert list(prefetch(iter(range(20)), size=3)) == list(range(20))
+
+
+def test_prefetch_closes_the_source_when_the_consumer_stops():
+    closed = threading.Event()
+
+    def source():
+        try:
+            for i in range(100):
+                yield i
+        finally:
+            closed.set()
+
+    items = source()
+    stream = prefetch(items, size=2)
+    assert next(stream) == 0
+    stream.close()
+
+    assert closed.wait(2)
+
+
+def test_prefetch_releases_held_slots_when_the_consumer_stops():
+    slots = threading.Semaphore(1)
+    items = hold_slot(iter(range(100)), slots)
+    stream = prefetch(items, size=2)
+    next(stream)
+    stream.close()
+
+    assert slots.acquire(timeout=2)
+
+
+def test_ordered_map_keeps_input_order():
+    assert list(ordered_map(lambda x: x * x, range(10), workers=4)) == [x * x for x in range(10)]
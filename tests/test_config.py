@@ -0,0 +1,35 @@
+import os
+
+from config import Config
+
+
+def write_env(path, **values):
+    path.write_text("".join(f"{name}={value}\n" for name, value in values.items()), encoding="utf-8")
+    return str(path)
+
+
+def test_settings_are_read_from_the_env_file(tmp_path, monkeypatch):
+    monkeypatch.delenv("MODEL_NAME", raising=False)
+    monkeypatch.delenv("RECOGNIZER", raising=False)
+    config = Config(write_env(tmp_path / ".env", MODEL_NAME="mistral", N_PARALLEL="2", RECOGNIZER="vosk"))
+
+    assert (config.model_name, config.n_parallel, config.recognizer) == ("mistral", 2, "vosk")
+    assert "RECOGNIZER" not in os.environ
+
+
+def test_override_env_file_replaces_the_values_of_the_first_file(tmp_path, monkeypatch):
+    monkeypatch.delenv("MODEL_NAME", raising=False)
+    monkeypatch.delenv("N_PARALLEL", raising=False)
+    config = Config(write_env(tmp_path / ".env.a", MODEL_NAME="mistral", N_PARALLEL="2"))
+    assert config.model_name == "mistral"
+
+    config.override(env_file=write_env(tmp_path / ".env.b", MODEL_NAME="leolm", N_PARALLEL="4"))
+
+    assert (config.model_name, config.n_parallel) == ("leolm", 4)
+
+
+def test_environment_and_overrides_take_precedence(tmp_path, monkeypatch):
+    monkeypatch.setenv("MODEL_NAME", "from-env")
+    config = Config(write_env(tmp_path / ".env", MODEL_NAME="mistral", N_PARALLEL="2"), n_parallel=8)
+
+    assert (config.model_name, config.n_parallel) == ("from-env", 8)
@@ -0,0 +1,153 @@
+import json
+import os
+
+import pytest
+
+from tools import download_model
+from tools.download_model import GGUFError, ModelDownload, Progress, create_session, download_models, validate_gguf
+from tools.fake_hub_server import start_fake_hub, write_test_gguf
+
+MODEL = {"name": "test-model", "repo": "test/repo", "filename": "test.gguf"}
+PART_SIZE = 64 * 1024
+
+
+@pytest.fixture
+def source(tmp_path):
+    directory = tmp_path / "hub"
+    directory.mkdir()
+    write_test_gguf(str(directory / MODEL["filename"]), tensors=4, tensor_bytes=96 * 1024)
+    return directory
+
+
+@pytest.fixture
+def hub(source):
+    servers = []
+
+    def start(**options):
+        server, endpoint = start_fake_hub(str(source), **options)
+        servers.append(server)
+        return server, endpoint
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def download(tmp_path, endpoint):
+    return download_models([MODEL], str(tmp_path / "models"), connections=4, part_size=PART_SIZE,
+                           endpoint=endpoint)[MODEL["name"]]
+
+
+def read(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def test_ranged_download(tmp_path, source, hub):
+    server, endpoint = hub()
+
+    path = download(tmp_path, endpoint)
+
+    assert read(path) == read(source / MODEL["filename"])
+    assert server.requests == -(-os.path.getsize(path) // PART_SIZE)
+    assert not os.path.exists(path + ".part") and not os.path.exists(path + ".part.json")
+
+
+def test_download_without_ranges(tmp_path, source, hub):
+    server, endpoint = hub(ranges=False)
+
+    path = download(tmp_path, endpoint)
+
+    assert read(path) == read(source / MODEL["filename"])
+    assert server.requests == 1
+
+
+def test_failed_parts_are_retried(tmp_path, source, hub):
+    server, endpoint = hub(fail_every=3)
+
+    path = download(tmp_path, endpoint)
+
+    assert read(path) == read(source / MODEL["filename"])
+
+
+def test_interrupted_download_resumes_with_the_missing_parts(tmp_path, source, hub):
+    server, endpoint = hub()
+    directory = tmp_path / "models"
+    directory.mkdir()
+    session = create_session(2)
+    first = ModelDownload(MODEL, str(directory), session, Progress(), PART_SIZE, endpoint)
+    parts = first.prepare()
+    for index in parts[:2]:
+        first.fetch_part(index)
+    with open(first.state_path, "r", encoding="utf-8") as file:
+        assert json.load(file)["done_parts"] == parts[:2]
+
+    server.requests = 0
+    path = download(tmp_path, endpoint)
+
+    assert read(path) == read(source / MODEL["filename"])
+    assert server.requests == len(parts) - 2
+
+
+def test_sha256_mismatch_is_rejected(tmp_path, hub):
+    server, endpoint = hub()
+    describe = server.describe
+    server.describe = lambda path: (describe(path)[0], "0" * 64)
+
+    result = download(tmp_path, endpoint)
+
+    assert isinstance(result, ValueError) and "SHA-256 mismatch" in str(result)
+    assert not os.listdir(tmp_path / "models")
+
+
+def test_verified_file_is_kept_when_the_hub_is_unreachable(tmp_path, hub):
+    server, endpoint = hub()
+    path = download(tmp_path, endpoint)
+    server.shutdown()
+    server.server_close()
+
+    session = create_session(1)
+    offline = ModelDownload(MODEL, str(tmp_path / "models"), session, Progress(), PART_SIZE, endpoint)
+
+    assert offline.prepare() == []
+    os.remove(path + ".sha256")
+    with pytest.raises(download_model.requests.RequestException):
+        offline.prepare()
+
+
+def test_token_is_only_sent_to_the_hub(monkeypatch):
+    monkeypatch.setattr(download_model, "HF_TOKEN", "secret")
+
+    assert download_model.auth_headers("https://mirror.example/files/x", "https://mirror.example") == \
+        {"Authorization": "Bearer secret"}
+    assert download_model.auth_headers("https://cdn.example/x", "https://mirror.example") == {}
+
+
+def test_validate_gguf_rejects_a_truncated_file(tmp_path, source):
+    path = str(source / MODEL["filename"])
+    assert validate_gguf(path)["tensors"] == 4
+
+    truncated = str(tmp_path / "truncated.gguf")
+    with open(truncated, "wb") as file:
+        file.write(read(path)[:-1024])
+    with pytest.raises(GGUFError, match="truncated"):
+        validate_gguf(truncated)
+
+
+def test_download_with_every_part_fetched_is_finished_on_the_next_run(tmp_path, source, hub):
+    server, endpoint = hub()
+    directory = tmp_path / "models"
+    directory.mkdir()
+    first = ModelDownload(MODEL, str(directory), create_session(2), Progress(), PART_SIZE, endpoint)
+    for index in first.prepare():
+        first.fetch_part(index)
+    assert not os.path.exists(first.path)
+
+    server.requests = 0
+    path = download(tmp_path, endpoint)
+
+    assert read(path) == read(source / MODEL["filename"])
+    assert server.requests == 0
+    assert os.path.exists(path + ".sha256")
+    assert not os.path.exists(path + ".part") and not os.path.exists(path + ".part.json")
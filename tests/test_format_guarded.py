@@ -0,0 +1,123 @@
+import pytest
+
+import format_text
+from config import config
+from endpoints import Endpoint, EndpointPool
+from metrics import Metrics
+from output_guard import GUARD_MIN_MISSES, OutputDiverged
+
+SOURCE = " ".join(f"wort{i}" for i in range(40))
+RAMBLING = " ".join(["hinweis"] * (GUARD_MIN_MISSES + 1))
+
+
+class WordCounter:
+    """Token counter with one token per word."""
+
+    def encode_batch(self, texts):
+        return [text.split() for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def retries():
+    config.override(format_retries=1, model_name="test", slot_pinning=False)
+    yield
+    config.reset()
+
+
+def diverge(text, retry):
+    words = text.split()
+    format_text.check_output(text, " ".join(words[:3]) + " " + RAMBLING)
+
+
+def test_format_guarded_requests_the_rest_again():
+    calls = []
+
+    def attempt(text, retry):
+        calls.append(text)
+        if not retry:
+            diverge(text, retry)
+        return text
+
+    assert format_text._format_guarded(SOURCE, attempt) == SOURCE
+    assert calls == [SOURCE, " ".join(SOURCE.split()[3:])]
+
+
+def test_format_guarded_keeps_the_rest_unformatted_after_the_retries():
+    emitted = []
+
+    result = format_text._format_guarded(SOURCE, diverge, emitted.append)
+
+    assert result == SOURCE
+    assert emitted == [" ".join(SOURCE.split()[6:])]
+
+
+def test_format_guarded_passes_other_errors_on():
+    def attempt(text, retry):
+        raise format_text.LLMAPIError("LLM API Error 400: bad request", 400)
+
+    with pytest.raises(format_text.LLMAPIError):
+        format_text._format_guarded(SOURCE, attempt)
+
+
+def fake_stream(responses):
+    def stream_chunk(text, session, url, model_name, max_tokens, slot, stats):
+        output = responses.pop(0)(text)
+        for word in output.split(" "):
+            yield word + " "
+        stats.update({"wall_ms": 1.0})
+
+    return stream_chunk
+
+
+def format_streamed(monkeypatch, responses):
+    monkeypatch.setattr(format_text, "stream_chunk", fake_stream(responses))
+    pool = EndpointPool([Endpoint("http://127.0.0.1:9/v1/chat/completions", "test")])
+    tokens = format_text.iter_formatted_tokens([SOURCE], 1, pool, counter=WordCounter())
+    return "".join(piece for _, piece in tokens)
+
+
+def test_streamed_divergence_passes_on_the_pending_text(monkeypatch):
+    responses = [lambda text: " ".join(text.split()[:3]) + " " + RAMBLING, lambda text: text]
+
+    output = format_streamed(monkeypatch, responses)
+
+    assert output.split() == SOURCE.split()
+
+
+def test_streamed_divergence_keeps_the_rest_after_the_retries(monkeypatch):
+    responses = [lambda text: " ".join(text.split()[:3]) + " " + RAMBLING] * 2
+
+    output = format_streamed(monkeypatch, responses)
+
+    assert output.split() == SOURCE.split()
+
+
+def test_rejected_responses_are_recorded_in_the_request_metrics(monkeypatch):
+    monkeypatch.setattr(format_text, "METRICS", Metrics())
+    responses = [lambda text: " ".join(text.split()[:3]) + " " + RAMBLING, lambda text: text]
+
+    format_streamed(monkeypatch, responses)
+
+    llm = format_text.METRICS.report()["stages"]["llm"]
+    assert (llm["calls"], llm["rejected"], llm["retries"]) == (2, 1, 1)
+
+
+def test_rejected_responses_are_recorded_without_streaming(monkeypatch):
+    monkeypatch.setattr(format_text, "METRICS", Metrics())
+    responses = [lambda text: " ".join(text.split()[:3]) + " " + RAMBLING] * 2
+
+    def format_chunk(text, session, url, model_name, max_tokens, slot, stats):
+        stats.update({"wall_ms": 1.0})
+        return responses.pop(0)(text)
+
+    monkeypatch.setattr(format_text, "format_chunk", format_chunk)
+    pool = EndpointPool([Endpoint("http://127.0.0.1:9/v1/chat/completions", "test")])
+
+    output = list(format_text.iter_formatted_chunks([SOURCE], 1, pool, counter=WordCounter()))
+
+    assert output[0].split() == SOURCE.split()
+    llm = format_text.METRICS.report()["stages"]["llm"]
+    assert (llm["calls"], llm["rejected"], llm["retries"]) == (2, 2, 1)
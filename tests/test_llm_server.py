@@ -0,0 +1,103 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+import llm_server
+
+
+@pytest.fixture
+def sleeper():
+    processes = []
+
+    def start(*args):
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)", *args])
+        processes.append(process)
+        # Wait until the child has replaced the forked interpreter's command line
+        deadline = time.monotonic() + 5
+        while llm_server.read_command_line(process.pid)[1:2] != ["-c"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return process
+
+    yield start
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def write_pid(port, pid):
+    with open(llm_server.PID_FILE.format(port=port), "w", encoding="utf-8") as file:
+        file.write(str(pid))
+
+
+def test_is_server_process_checks_the_port(sleeper):
+    process = sleeper("--port", "18080")
+
+    assert llm_server.is_server_process(process.pid, 18080)
+    assert not llm_server.is_server_process(process.pid, 18081)
+
+
+def test_stop_server_leaves_an_unrelated_process_alone(sleeper, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    process = sleeper()
+    write_pid(18080, process.pid)
+
+    assert not llm_server.stop_server(18080)
+    assert process.poll() is None
+    assert llm_server.read_pid(18080) is None
+
+
+def test_stop_server_stops_the_server(sleeper, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    process = sleeper("--port", "18080")
+    write_pid(18080, process.pid)
+
+    assert llm_server.stop_server(18080, timeout=5)
+    assert process.wait(5) is not None
+    assert llm_server.read_pid(18080) is None
+
+
+def test_wait_until_ready_stops_when_the_recorded_process_exits(sleeper):
+    process = sleeper()
+    process.kill()
+    process.wait()
+
+    with pytest.raises(RuntimeError, match="exited"):
+        llm_server.wait_until_ready("http://127.0.0.1:9", timeout=30, interval=0.01, pid=process.pid)
+
+
+def fake_settings(tmp_path, monkeypatch, served):
+    model = tmp_path / "mistral.gguf"
+    model.write_bytes(b"")
+    settings = {"model": str(model), "model_name": "mistral"}
+    monkeypatch.setattr(llm_server, "read_server_settings", lambda env_file=None: settings)
+    monkeypatch.setattr(llm_server, "probe_server", lambda server_url, timeout=2: served)
+    return settings
+
+
+def test_ensure_server_refuses_a_foreign_server_with_another_model(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake_settings(tmp_path, monkeypatch, ["leolm"])
+
+    with pytest.raises(RuntimeError, match="not started by this project"):
+        llm_server.ensure_server(port=18080)
+
+
+def test_ensure_server_restarts_its_own_server_with_another_model(sleeper, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake_settings(tmp_path, monkeypatch, ["leolm"])
+    old = sleeper("--port", "18080")
+    write_pid(18080, old.pid)
+    command = [sys.executable, "-c", "import time; time.sleep(60)", "--port", "18080"]
+    monkeypatch.setattr(llm_server, "build_server_command", lambda settings, host, port: command)
+    monkeypatch.setattr(llm_server, "wait_until_ready", lambda *args, **kwargs: ["mistral"])
+
+    llm_server.ensure_server(port=18080)
+
+    new_pid = llm_server.read_pid(18080)
+    try:
+        assert old.wait(5) is not None
+        assert new_pid != old.pid and llm_server.is_running(new_pid)
+    finally:
+        llm_server.stop_server(18080, timeout=5)
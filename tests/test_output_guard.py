@@ -0,0 +1,38 @@
+import pytest
+
+from output_guard import GUARD_MIN_MISSES, OutputDiverged, OutputGuard, check_output
+
+SOURCE = " ".join(f"wort{i}" for i in range(40))
+
+
+def test_check_output_accepts_punctuation_and_case():
+    check_output("das ist ein test und noch einer", "Das ist ein Test, und noch einer.")
+
+
+def test_check_output_rejects_rambling():
+    rambling = "wort0 wort1 wort2 " + " ".join(["hinweis"] * (GUARD_MIN_MISSES + 1))
+    with pytest.raises(OutputDiverged) as raised:
+        check_output(SOURCE, rambling)
+    assert raised.value.confirmed == "wort0 wort1 wort2"
+    assert raised.value.remaining == " ".join(SOURCE.split()[3:])
+
+
+def test_check_output_rejects_early_end():
+    with pytest.raises(OutputDiverged, match="output ended"):
+        check_output(SOURCE, "wort0 wort1 wort2.")
+
+
+def test_feed_passes_on_confirmed_words_only():
+    guard = OutputGuard("eins zwei drei")
+    assert guard.feed("Eins, zw") == "Eins,"
+    assert guard.feed("ei ") == " zwei"
+    assert guard.feed("drei.") == ""
+    assert guard.finish() == " drei."
+
+
+def test_diverged_pending_is_the_unsent_confirmed_text():
+    guard = OutputGuard(SOURCE)
+    passed = guard.feed("wort0 wort1 ")
+    with pytest.raises(OutputDiverged) as raised:
+        guard.feed("wort2 " + " ".join(["hinweis"] * (GUARD_MIN_MISSES + 1)) + " ")
+    assert passed + raised.value.pending == "wort0 wort1 wort2"
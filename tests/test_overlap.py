@@ -0,0 +1,101 @@
+import re
+
+import pytest
+
+from output_guard import normalize_word
+from overlap import ALIGN_SLACK, add_context, stitch_overlaps
+
+CHUNKS = [
+    "heute sprechen wir über die grundlagen der thermodynamik und warum energie nicht verloren geht",
+    "sondern nur ihre form ändert das ist ein wichtiger punkt für das verständnis aller kapitel",
+    "also schauen wir uns ein beispiel an und rechnen es gemeinsam durch bis zum ende",
+]
+
+
+class WordCounter:
+    """Counts every whitespace-separated word as one token."""
+
+    def encode_batch(self, texts):
+        return [text.split() for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class CharCounter:
+    """Counts every character as one token, so token slices cut words in half."""
+
+    def encode_batch(self, texts):
+        return [list(text) for text in texts]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def punctuate(index, text, context):
+    """Fake formatter: capitalises the chunk and ends it with a full stop."""
+    return text[0].upper() + text[1:] + "."
+
+
+def stitch(chunks, overlap_tokens, counter=WordCounter(), formatter=punctuate, word_by_word=False):
+    overlaps = []
+    sent = list(add_context(chunks, overlap_tokens, counter, overlaps))
+    tokens = []
+    for index, text in enumerate(sent):
+        output = formatter(index, text, overlaps[index])
+        pieces = re.findall(r"\s*\S+", output) if word_by_word else [output]
+        tokens += [(index, piece) for piece in pieces]
+    paragraphs = {}
+    for paragraph, piece in stitch_overlaps(tokens, overlaps, overlap_tokens + ALIGN_SLACK):
+        paragraphs[paragraph] = paragraphs.get(paragraph, "") + piece
+    return overlaps, [paragraphs[key] for key in sorted(paragraphs)]
+
+
+def words(texts):
+    return [normalize_word(word) for text in texts for word in text.split()]
+
+
+@pytest.mark.parametrize("word_by_word", [False, True])
+@pytest.mark.parametrize("overlap_tokens", [1, 4, 7])
+def test_no_word_is_dropped_or_repeated_at_the_seams(overlap_tokens, word_by_word):
+    overlaps, paragraphs = stitch(CHUNKS, overlap_tokens, word_by_word=word_by_word)
+
+    assert overlaps[0] == [] and len(overlaps[1]) == overlap_tokens
+    assert words(paragraphs) == words(CHUNKS)
+
+
+def test_paragraph_break_moves_to_the_first_sentence_end_after_the_seam():
+    chunks = ["eins zwei drei. vier fünf sechs sieben", "acht neun. zehn elf zwölf."]
+
+    overlaps, paragraphs = stitch(chunks, 3, formatter=lambda index, text, context: text)
+
+    assert overlaps[1] == ["fünf", "sechs", "sieben"]
+    assert paragraphs == ["eins zwei drei. vier fünf sechs sieben acht neun.", "zehn elf zwölf."]
+
+
+def test_a_word_cut_by_the_token_slice_is_left_out_of_the_context():
+    overlaps, paragraphs = stitch(["eins zwei drei vier", "fünf sechs"], 8, counter=CharCounter())
+
+    assert overlaps[1] == ["vier"]
+    assert words(paragraphs) == words(["eins zwei drei vier", "fünf sechs"])
+
+
+def test_empty_context_keeps_the_chunk_boundary():
+    chunks = ["eins zwei dreiundzwanzig", "vier fünf"]
+
+    overlaps, paragraphs = stitch(chunks, 3, counter=CharCounter())
+
+    assert overlaps == [[], []]
+    assert paragraphs == ["Eins zwei dreiundzwanzig.", "Vier fünf."]
+
+
+@pytest.mark.parametrize("word_by_word", [False, True])
+def test_unalignable_context_keeps_the_previous_chunk_whole(word_by_word):
+    def rewrite_context(index, text, context):
+        # The model replaced the context words with words that match nothing in the previous chunk
+        rest = text.split()[len(context):]
+        return " ".join(["x"] * len(context) + rest) + "."
+
+    overlaps, paragraphs = stitch(CHUNKS, 4, formatter=rewrite_context, word_by_word=word_by_word)
+
+    assert words(paragraphs) == words(CHUNKS)
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+import format_text
+import metrics
+import pipeline
+from journal import JobJournal
+from metrics import Metrics
+
+
+def test_run_pipeline_reports_failed_transcripts(monkeypatch, tmp_path):
+    texts = ["hallo welt", "[API error: recognition request failed]", "noch mehr text"]
+    monkeypatch.setattr(pipeline, "stream_transcripts", lambda *args, **kwargs: iter(texts))
+    monkeypatch.setattr(pipeline, "stream_formatted", lambda texts, **kwargs: (text.upper() for text in texts))
+
+    with pytest.raises(pipeline.TranscriptionIncomplete) as raised:
+        pipeline.run_pipeline("https://example.com/video", str(tmp_path / "raw.txt"), str(tmp_path / "out.txt"))
+
+    assert raised.value.failed == [1]
+    assert raised.value.count == 3
+    assert (tmp_path / "raw.txt").read_text(encoding="utf-8") == "\n\n".join(texts)
+
+
+def test_journal_keeps_records_only_for_the_same_settings(tmp_path):
+    settings = {"language": "de-DE", "models": ["mistral"], "prompt": "abc"}
+    journal = JobJournal(str(tmp_path), "https://example.com/video", settings)
+    journal.record("formatted", 0, "rohtext", "Rohtext.")
+
+    resumed = JobJournal(str(tmp_path), "https://example.com/video", settings, resume=True)
+    assert resumed.get("formatted", 0, "rohtext") == "Rohtext."
+
+    other_model = JobJournal(str(tmp_path), "https://example.com/video", {**settings, "models": ["leolm"]},
+                             resume=True)
+    assert other_model.get("formatted", 0, "rohtext") is None
+
+
+def test_run_pipeline_records_format_stage_and_first_output(monkeypatch, tmp_path):
+    monkeypatch.setattr(pipeline, "METRICS", Metrics())
+    monkeypatch.setattr(metrics, "METRICS", pipeline.METRICS)
+    monkeypatch.setattr(pipeline, "stream_transcripts", lambda *args, **kwargs: iter(["eins", "zwei"]))
+    monkeypatch.setattr(pipeline, "stream_formatted_tokens",
+                        lambda texts, **kwargs: ((index, text.upper()) for index, text in enumerate(texts)))
+
+    for _ in range(2):
+        pipeline.run_pipeline("https://example.com/video", str(tmp_path / "raw.txt"), str(tmp_path / "out.txt"),
+                              stream_tokens=True)
+
+    report = pipeline.METRICS.report()
+    assert report["stages"]["format"]["calls"] == 2
+    assert report["stages"]["format"]["chunks"] == 4
+    assert "first_output_seconds" not in report["stages"]["pipeline"]
+    assert report["latencies"]["first_output"]["count"] == 2
+
+
+def test_split_time_leaves_out_reads():
+    extract_text_from_video = pytest.importorskip("extract_text_from_video")
+
+    class Chunk:
+        frame_data, start_ms, end_ms = b"\0\0", 0, 1000
+
+    def read_frames(count):
+        time.sleep(0.05)
+        return b"\0\0"
+
+    def chunks(read):
+        for _ in range(2):
+            read(1)
+            yield Chunk()
+
+    collector = Metrics()
+    reader = extract_text_from_video._ReadTimer(read_frames)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(extract_text_from_video, "METRICS", collector)
+        assert len(list(extract_text_from_video._measure_chunks(chunks(reader), reader))) == 2
+
+    assert reader.seconds >= 0.1
+    assert collector.report()["stages"]["split"]["seconds"] < 0.05
+
+
+class WordCounter:
+    def encode_batch(self, texts):
+        return [text.split() for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def test_short_transcripts_are_merged_up_to_the_chunk_budget():
+    texts = ["eins zwei", "drei", "", "vier fünf sechs", "sieben acht neun zehn elf", "zwölf"]
+
+    chunks = list(pipeline.merge_texts(iter(texts), 4, WordCounter()))
+
+    assert chunks == ["eins zwei drei vier", "fünf sechs sieben acht", "neun zehn elf zwölf"]
+
+
+def test_merged_chunks_keep_every_word_within_the_budget():
+    texts = [" ".join(f"w{i}-{j}" for j in range(i % 7 + 1)) + "." for i in range(40)]
+
+    chunks = list(pipeline.merge_texts(iter(texts), 10, WordCounter()))
+
+    assert " ".join(chunks).split() == " ".join(texts).split()
+    assert all(len(chunk.split()) <= 10 for chunk in chunks)
+    assert all(len(chunk.split()) > 3 for chunk in chunks[:-1])
+
+
+def test_default_counter_uses_the_server_of_the_requested_endpoint(monkeypatch):
+    calls = []
+    monkeypatch.setattr(format_text, "get_token_counter", lambda *args: calls.append(args))
+
+    format_text.get_default_counter("http://localhost:11435/v1/chat/completions")
+
+    assert calls[0][2] == "http://localhost:11435"
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from cache import DiskCache
+from concurrency import ready_batches
+from format_text import FormattingCancelled, iter_punctuated_texts
+from journal import JobJournal
+from punctuation import _windows, split_paragraphs
+
+
+class UpperModel:
+    """Stand-in for PunctuationModel that records its batches."""
+
+    name = "punct:upper"
+    batch_size = 4
+
+    def __init__(self):
+        self.batches = []
+
+    def punctuate_batch(self, texts):
+        self.batches.append(list(texts))
+        return [text.upper() + "." for text in texts]
+
+
+def test_windows_keep_every_word_once():
+    kept = [index for _, _, keep_from, keep_to in _windows(500) for index in range(keep_from, keep_to)]
+    assert kept == list(range(500))
+
+
+def test_split_paragraphs_ends_at_sentence_ends():
+    text = "Eins zwei drei. Vier fünf. Sechs sieben acht. Neun."
+    assert split_paragraphs(text, words=4) == ["Eins zwei drei. Vier fünf.", "Sechs sieben acht. Neun."]
+
+
+def test_ready_batches_groups_items_that_are_ready():
+    batches = list(ready_batches(iter(range(10)), 4))
+    assert [item for batch in batches for item in batch] == list(range(10))
+    assert all(1 <= len(batch) <= 4 for batch in batches)
+
+
+def test_ready_batches_does_not_wait_for_a_full_batch():
+    release = threading.Event()
+
+    def slow():
+        yield 1
+        release.wait(5)
+        yield 2
+
+    batches = ready_batches(slow(), 4)
+    assert next(batches) == [1]
+    release.set()
+    assert next(batches) == [2]
+
+
+def test_iter_punctuated_texts_batches_and_records(tmp_path):
+    model = UpperModel()
+    cache = DiskCache(str(tmp_path / "cache"))
+    journal = JobJournal(str(tmp_path / "journal"), "https://example.com/video")
+    texts = [f"text {i}" for i in range(6)]
+
+    assert list(iter_punctuated_texts(iter(texts), cache=cache, journal=journal, model=model)) == \
+        [text.upper() + "." for text in texts]
+    assert sum(map(len, model.batches)) == 6
+    assert journal.get("punctuated", 2, "text 2") == "TEXT 2."
+
+    rerun = UpperModel()
+    assert list(iter_punctuated_texts(iter(texts), cache=cache, model=rerun))[0] == "TEXT 0."
+    assert rerun.batches == []
+
+
+def test_iter_punctuated_texts_stops_when_cancelled():
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(FormattingCancelled):
+        list(iter_punctuated_texts(iter(["a", "b"]), cancel_event, model=UpperModel()))
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from format_text import FormattingCancelled
+from metrics import Metrics
+from pipeline import until_cancelled
+from service import Job
+
+
+def make_job(tmp_path):
+    return Job("job1", "https://example.com/video", str(tmp_path))
+
+
+def test_drop_events_keeps_the_final_event_and_its_id(tmp_path):
+    job = make_job(tmp_path)
+    job.emit("queued")
+    for index in range(5):
+        job.emit("formatted", index=index, text="x" * 100)
+    job.set_status("done")
+
+    job.drop_events()
+
+    assert job.event_count == 7
+    assert [event["event"] for event in job.wait_events(0)] == ["done"]
+    assert job.wait_events(7, timeout=0) == []
+
+
+def test_reopen_queues_the_job_again(tmp_path):
+    job = make_job(tmp_path)
+    job.cancel_event.set()
+    job.set_status("cancelled")
+
+    job.reopen()
+
+    assert job.status == "queued"
+    assert not job.finished
+    assert not job.cancel_event.is_set()
+
+
+def test_until_cancelled_stops_and_closes_the_source():
+    cancel_event = threading.Event()
+    closed = threading.Event()
+
+    def source():
+        try:
+            yield from range(10)
+        finally:
+            closed.set()
+
+    items = until_cancelled(source(), cancel_event)
+    assert next(items) == 0
+    cancel_event.set()
+    with pytest.raises(FormattingCancelled):
+        next(items)
+    assert closed.is_set()
+
+
+def test_metrics_keep_a_bounded_sample_of_durations():
+    metrics = Metrics(samples=100)
+    for i in range(10000):
+        metrics.record("llm", i / 10000)
+
+    report = metrics.report()["stages"]["llm"]
+
+    assert len(metrics._durations["llm"]) == 100
+    assert report["calls"] == 10000
+    assert 0.3 < report["p50_seconds"] < 0.7
+
+
+def test_metrics_report_observed_latencies_as_percentiles():
+    metrics = Metrics()
+    for seconds in (1.0, 2.0, 3.0, 4.0):
+        metrics.observe("first_output", seconds)
+
+    report = metrics.report()
+    assert "first_output" not in report["stages"]
+    assert report["latencies"]["first_output"]["p50_seconds"] == 2.0
+    assert report["latencies"]["first_output"]["max_seconds"] == 4.0
+    text = metrics.prometheus_text()
+    assert "# TYPE tol_vido_first_output_seconds summary" in text
+    assert 'tol_vido_first_output_seconds{quantile="0.9"} 4.0' in text
+    assert "tol_vido_first_output_seconds_count 4" in text
+
+
+def test_reopen_refuses_jobs_that_are_not_finished(tmp_path):
+    job = make_job(tmp_path)
+    job.set_status("running")
+
+    with pytest.raises(ValueError, match="is running"):
+        job.reopen()
+
+
+def test_only_one_of_concurrent_reopens_succeeds(tmp_path):
+    job = make_job(tmp_path)
+    job.set_status("failed")
+    start = threading.Barrier(8)
+    results = []
+
+    def reopen():
+        start.wait()
+        try:
+            job.reopen()
+            results.append("reopened")
+        except ValueError:
+            results.append("refused")
+
+    threads = [threading.Thread(target=reopen) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == ["refused"] * 7 + ["reopened"]
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+import format_text
+from config import config
+from endpoints import Endpoint, EndpointPool
+from tools.fake_llm_server import start_fake_server
+
+CHUNKS = [f"Satz {i} mit ein paar Wörtern, die zurückkommen sollen." for i in range(5)]
+
+
+class WordCounter:
+    def encode_batch(self, texts):
+        return [text.split() for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    config.override(format_retries=1, model_name="fake", slot_pinning=False)
+    yield
+    config.reset()
+
+
+@pytest.fixture
+def server():
+    server, url = start_fake_server(latency=0.05)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def test_streamed_pieces_join_to_the_whole_response(server):
+    stats = {}
+
+    pieces = list(format_text.stream_chunk(CHUNKS[0], api_url=server, stats=stats))
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == format_text.format_chunk(CHUNKS[0], api_url=server) == CHUNKS[0]
+    assert stats["completion_tokens"] == len(CHUNKS[0].split())
+
+
+def test_streamed_chunks_come_out_in_order(server):
+    pool = EndpointPool([Endpoint(server, "fake", slots=3)])
+
+    tokens = list(format_text.iter_formatted_tokens(iter(CHUNKS), 3, pool, counter=WordCounter()))
+
+    indices = [index for index, _ in tokens]
+    assert indices == sorted(indices)
+    for index, chunk in enumerate(CHUNKS):
+        assert "".join(piece for i, piece in tokens if i == index) == chunk
+
+
+def test_later_chunks_that_finish_first_wait_for_the_head(monkeypatch):
+    started = []
+
+    def stream_chunk(text, session, url, model_name, max_tokens, slot, stats):
+        index = CHUNKS.index(text)
+        started.append(index)
+        for word in text.split(" "):
+            # The first chunk is the slowest, so the others are complete before it
+            time.sleep(0.02 if index == 0 else 0.001)
+            yield word + " "
+        stats["wall_ms"] = 1.0
+
+    monkeypatch.setattr(format_text, "stream_chunk", stream_chunk)
+    pool = EndpointPool([Endpoint("http://127.0.0.1:9/v1/chat/completions", "fake", slots=3)])
+
+    tokens = list(format_text.iter_formatted_tokens(iter(CHUNKS), 3, pool, counter=WordCounter()))
+
+    assert sorted(started[:3]) == [0, 1, 2]
+    assert [index for index, _ in tokens] == sorted(index for index, _ in tokens)
+    assert [" ".join("".join(p for i, p in tokens if i == index).split()) for index in range(5)] == CHUNKS
@@ -0,0 +1,58 @@
+import pytest
+
+import token_counter
+from format_text import split_text_by_tokens
+
+
+class CountingCounter:
+    """One token per word; counts the encode_batch calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode_batch(self, texts):
+        self.calls += 1
+        return [text.split() for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def test_sentences_are_grouped_up_to_the_budget_with_one_encode_call():
+    counter = CountingCounter()
+    text = "Eins zwei drei. Vier fünf. Sechs sieben acht neun. Zehn!"
+
+    chunks = split_text_by_tokens(text, 5, counter)
+
+    assert chunks == ["Eins zwei drei. Vier fünf.", "Sechs sieben acht neun. Zehn!"]
+    assert counter.calls == 1
+
+
+def test_a_sentence_over_the_budget_is_cut_into_token_slices():
+    chunks = split_text_by_tokens("Kurz. " + " ".join(f"w{i}" for i in range(7)) + ". Ende.", 3,
+                                  CountingCounter())
+
+    assert chunks == ["Kurz.", "w0 w1 w2", "w3 w4 w5", "w6.", "Ende."]
+
+
+def test_token_counters_are_created_once_per_backend(monkeypatch):
+    created = []
+    monkeypatch.setattr(token_counter, "_counters", {})
+    monkeypatch.setattr(token_counter, "_create_counter", lambda *args: created.append(args) or object())
+
+    first = token_counter.get_token_counter("server", None, "http://localhost:11434")
+    assert token_counter.get_token_counter("server", None, "http://localhost:11434") is first
+    token_counter.get_token_counter("server", None, "http://localhost:11435")
+
+    assert len(created) == 2
+    with pytest.raises(ValueError):
+        token_counter.get_token_counter("bpe")
+
+
+def test_tiktoken_counter_round_trips():
+    pytest.importorskip("tiktoken")
+    counter = token_counter.get_token_counter("tiktoken")
+
+    tokens = counter.encode_batch(["Hallo Welt", "wie geht es"])
+
+    assert [counter.decode(t) for t in tokens] == ["Hallo Welt", "wie geht es"]
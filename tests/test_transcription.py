@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+sr = pytest.importorskip("speech_recognition")
+extract = pytest.importorskip("extract_text_from_video")
+
+
+def make_chunk(index, seconds=0.1):
+    return sr.AudioData(bytes([index]) * int(16000 * 2 * seconds), 16000, 2)
+
+
+class StubRecognizer(sr.Recognizer):
+    """Answers with the chunk's first byte, failing the first ``failures`` requests of each chunk."""
+
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    attempts = {}
+    failures = 0
+
+    def recognize_google(self, audio_data, language=None, **kwargs):
+        index = audio_data.frame_data[0]
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+            cls.attempts[index] = cls.attempts.get(index, 0) + 1
+            attempt = cls.attempts[index]
+        try:
+            # Later chunks finish first, so the results come back out of order
+            time.sleep(0.05 / (index + 1))
+            if attempt <= cls.failures:
+                raise sr.RequestError("service unavailable")
+            return f"chunk {index}"
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+
+@pytest.fixture
+def recognizer():
+    class Recognizer(StubRecognizer):
+        attempts = {}
+
+    return Recognizer
+
+
+def test_chunks_are_transcribed_concurrently_in_order(recognizer):
+    chunks = [make_chunk(i) for i in range(8)]
+
+    texts = list(extract.iter_transcriptions(iter(chunks), workers=3, recognizer_factory=recognizer))
+
+    assert texts == [f"chunk {i}" for i in range(8)]
+    assert 1 < recognizer.peak <= 3
+
+
+def test_failed_requests_are_retried(recognizer):
+    recognizer.failures = 2
+
+    texts = extract.transcribe_chunks([make_chunk(i) for i in range(3)], workers=2, retries=2, backoff=0,
+                                      recognizer_factory=recognizer)
+
+    assert texts == ["chunk 0", "chunk 1", "chunk 2"]
+    assert recognizer.attempts == {0: 3, 1: 3, 2: 3}
+
+
+def test_a_chunk_that_keeps_failing_becomes_an_error_marker(recognizer):
+    recognizer.failures = 5
+
+    texts = extract.transcribe_chunks([make_chunk(0)], retries=1, backoff=0, recognizer_factory=recognizer)
+
+    assert texts == ["[API error: service unavailable]"]
+    assert recognizer.attempts == {0: 2}
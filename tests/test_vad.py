@@ -0,0 +1,74 @@
+import io
+
+import numpy as np
+import pytest
+
+from vad import iter_voiced_segments
+
+RATE = 16000
+
+
+def pcm(*parts):
+    """Build 16-bit PCM from (kind, milliseconds) parts, where kind is "speech" or "silence"."""
+    rng = np.random.default_rng(0)
+    samples = []
+    for kind, ms in parts:
+        count = RATE * ms // 1000
+        if kind == "speech":
+            t = np.arange(count) / RATE
+            samples.append(0.3 * np.sin(2 * np.pi * 180 * t))
+        else:
+            samples.append(rng.normal(0.0, 0.001, count))
+    return (np.concatenate(samples) * 32767).astype("<i2").tobytes()
+
+
+def segments(data, **options):
+    stream = io.BytesIO(data)
+    return list(iter_voiced_segments(lambda count: stream.read(count * 2), RATE, **options))
+
+
+def ms(samples):
+    return samples * 1000 // RATE
+
+
+def test_all_silence_gives_no_segments():
+    assert segments(pcm(("silence", 5000))) == []
+
+
+def test_padding_is_kept_around_speech():
+    data = pcm(("silence", 1500), ("speech", 1500), ("silence", 1500))
+
+    (start, segment), = segments(data, padding_ms=180, min_chunk_ms=300)
+
+    assert ms(start) == 1500 - 180
+    assert ms(len(segment) // 2) == 1500 + 2 * 180
+    assert segment == data[start * 2:start * 2 + len(segment)]
+
+
+def test_segments_are_not_closed_before_the_minimum_length():
+    parts = [("silence", 600)]
+    for _ in range(6):
+        parts += [("speech", 900), ("silence", 600)]
+    data = pcm(*parts)
+
+    found = segments(data, min_chunk_ms=3000, max_chunk_ms=20000, min_silence_ms=450, padding_ms=90)
+
+    assert len(found) > 1
+    for start, segment in found[:-1]:
+        assert ms(len(segment) // 2) >= 3000
+    # Every cut falls into a pause, so no speech is lost
+    starts = [start for start, _ in found]
+    ends = [start + len(segment) // 2 for start, segment in found]
+    assert all(end <= next_start for end, next_start in zip(ends, starts[1:]))
+    assert ms(starts[0]) == 600 - 90
+
+
+@pytest.mark.parametrize("max_chunk_ms", [2010, 3000])
+def test_continuous_speech_is_cut_at_the_maximum_length(max_chunk_ms):
+    data = pcm(("speech", 10000))
+
+    found = segments(data, min_chunk_ms=990, max_chunk_ms=max_chunk_ms)
+
+    assert len(found) >= 10000 // max_chunk_ms
+    assert all(ms(len(segment) // 2) <= max_chunk_ms for _, segment in found)
+    assert b"".join(segment for _, segment in found) == data
@@ -0,0 +1,147 @@
+import os
+import threading
+
+from concurrency import ordered_map
+
+# Backends accepted by get_token_counter; "auto" picks the most accurate one available
+TOKEN_COUNTERS = ("auto", "gguf", "server", "tiktoken")
+
+
+class TiktokenCounter:
+    """
+    Token counter based on an OpenAI tiktoken encoding; fast, but only an estimate for GGUF models.
+    """
+
+    def __init__(self, encoding_name="cl100k_base"):
+        import tiktoken
+
+        self.name = f"tiktoken:{encoding_name}"
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def encode_batch(self, texts):
+        return self.encoding.encode_batch(list(texts))
+
+    def decode(self, tokens):
+        return self.encoding.decode(tokens)
+
+
+class GGUFCounter:
+    """
+    Token counter that loads only the vocabulary of a GGUF model with llama-cpp-python.
+    """
+
+    def __init__(self, model_path):
+        from llama_cpp import Llama
+
+        self.name = f"gguf:{os.path.basename(model_path)}"
+        self.model = Llama(model_path=model_path, vocab_only=True, verbose=False)
+        self._lock = threading.Lock()
+
+    def encode_batch(self, texts):
+        with self._lock:
+            return [self.model.tokenize(text.encode("utf-8"), add_bos=False, special=False) for text in texts]
+
+    def decode(self, tokens):
+        with self._lock:
+            return self.model.detokenize(tokens).decode("utf-8", errors="ignore")
+
+
+class ServerCounter:
+    """
+    Token counter that asks the running llama.cpp server to tokenize.
+
+    Both the llama-cpp-python routes (/extras/tokenize) and the native llama.cpp
+    server routes (/tokenize) are supported.
+    """
+
+    def __init__(self, server_url, workers=8, timeout=10):
+        import requests
+
+        self.name = f"server:{server_url}"
+        self.server_url = server_url.rstrip("/")
+        self.workers = workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.native = self._probe()
+
+    def _probe(self):
+        response = self.session.post(f"{self.server_url}/extras/tokenize", json={"input": "a"}, timeout=self.timeout)
+        if response.status_code == 200:
+            return False
+        response = self.session.post(f"{self.server_url}/tokenize", json={"content": "a"}, timeout=self.timeout)
+        response.raise_for_status()
+        return True
+
+    def _encode(self, text):
+        if self.native:
+            response = self.session.post(f"{self.server_url}/tokenize", json={"content": text}, timeout=self.timeout)
+        else:
+            response = self.session.post(f"{self.server_url}/extras/tokenize", json={"input": text},
+                                         timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["tokens"]
+
+    def encode_batch(self, texts):
+        return list(ordered_map(self._encode, texts, self.workers))
+
+    def decode(self, tokens):
+        if self.native:
+            response = self.session.post(f"{self.server_url}/detokenize", json={"tokens": tokens},
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()["content"]
+        response = self.session.post(f"{self.server_url}/extras/detokenize", json={"tokens": tokens},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["text"]
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(kind="auto", model_path=None, server_url=None):
+    """
+    Return a shared token counter, creating it on first use.
+
+    Args:
+        kind (str): One of TOKEN_COUNTERS. "auto" tries the GGUF file, then the server,
+            then falls back to tiktoken.
+        model_path (str | None): GGUF model file for the "gguf" backend.
+        server_url (str | None): Base URL of the llama.cpp server for the "server" backend.
+
+    Returns:
+        object: A counter with ``name``, ``encode_batch(texts)`` and ``decode(tokens)``.
+
+    Raises:
+        ValueError: If ``kind`` is unknown.
+    """
+    if kind not in TOKEN_COUNTERS:
+        raise ValueError(f"Unknown token counter '{kind}', expected one of {TOKEN_COUNTERS}.")
+
+    with _counters_lock:
+        key = (kind, model_path, server_url)
+        if key not in _counters:
+            _counters[key] = _create_counter(kind, model_path, server_url)
+        return _counters[key]
+
+
+def _create_counter(kind, model_path, server_url):
+    if kind == "gguf":
+        return GGUFCounter(model_path)
+    if kind == "server":
+        return ServerCounter(server_url)
+    if kind == "tiktoken":
+        return TiktokenCounter()
+
+    if model_path and os.path.exists(model_path):
+        try:
+            return GGUFCounter(model_path)
+        except Exception as error:
+            print(f"⚠️ Could not load the GGUF tokenizer: {error}")
+    if server_url:
+        try:
+            return ServerCounter(server_url, timeout=2)
+        except Exception:
+            pass
+    return TiktokenCounter()
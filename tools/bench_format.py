@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_llm_server import start_fake_server
+from format_text import format_chunks
+
+
+def run_benchmark(chunk_count=32, latency=0.2, parallel_levels=(1, 2, 4, 8)):
+    """
+    Time format_chunks against the fake server for several parallelism levels.
+
+    Args:
+        chunk_count (int): Number of chunks to format per run.
+        latency (float): Simulated server latency per request in seconds.
+        parallel_levels (tuple of int): Parallelism levels to compare.
+    """
+    server, url = start_fake_server(latency=latency)
+    chunks = [f"chunk {i} " + "wort " * 200 for i in range(chunk_count)]
+    try:
+        for parallel in parallel_levels:
+            start = time.perf_counter()
+            results = format_chunks(chunks, parallel=parallel, api_url=url)
+            elapsed = time.perf_counter() - start
+            assert results == [c.strip() for c in chunks], "results out of order"
+            print(f"parallel={parallel:<3} {elapsed:7.2f}s  {chunk_count / elapsed:7.1f} chunks/s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the concurrent formatting client.")
+    parser.add_argument("--chunks", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--parallel", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    run_benchmark(args.chunks, args.latency, tuple(args.parallel))
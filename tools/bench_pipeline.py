@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+
+from concurrency import prefetch
+from config import config
+from extract_text_from_video import iter_audio_chunks, iter_transcriptions
+from fake_llm_server import start_fake_server
+from format_text import format_text_to_paragraphs, get_chunk_budget, iter_formatted_chunks, split_text_by_tokens
+from metrics import METRICS, PERCENTILES, percentile
+from pipeline import split_stream
+from token_counter import get_token_counter
+
+SAMPLE_RATE = 16000
+
+# Relative change beyond which a stage counts as slower or larger than the baseline
+TOLERANCE = 0.10
+
+# Latency changes smaller than this many seconds are timer noise, whatever their relative size
+MIN_LATENCY_CHANGE = 0.005
+
+WORDS = (
+    "heute sprechen wir über die grundlagen der thermodynamik und warum energie "
+    "nicht verloren geht sondern nur ihre form ändert das ist ein wichtiger punkt "
+    "für das verständnis aller folgenden kapitel also schauen wir uns ein beispiel an"
+).split()
+
+
+def make_speech_wav(path, seconds=600.0, seed=0, sample_rate=SAMPLE_RATE):
+    """
+    Write a synthetic speech-like 16-bit mono WAV file.
+
+    Syllables are short harmonic tones with a smooth envelope, grouped into words
+    with short gaps and into sentences separated by pauses long enough for the
+    silence-aware chunking to cut at, over a faint noise floor.
+
+    Args:
+        path (str): Output file.
+        seconds (float): Length of the audio.
+        seed (int): Random seed, for reproducible files.
+        sample_rate (int): Sample rate in Hz.
+
+    Returns:
+        str: ``path``.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    audio = rng.normal(0.0, 0.001, total).astype(np.float32)
+    position = 0
+    while position < total:
+        for _ in range(rng.integers(4, 13)):
+            for _ in range(rng.integers(1, 4)):
+                # The last sentence is cut off at the end of the file
+                if position >= total:
+                    break
+                length = int(rng.uniform(0.08, 0.25) * sample_rate)
+                t = np.arange(length) / sample_rate
+                f0 = rng.uniform(100, 220)
+                tone = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in (1, 2, 3))
+                end = min(total, position + length)
+                audio[position:end] += (0.3 * np.hanning(length) * tone)[:end - position]
+                position += length
+            position += int(rng.uniform(0.05, 0.15) * sample_rate)
+        position += int(rng.uniform(0.6, 1.2) * sample_rate)
+
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return path
+
+
+class StubBackend:
+    """
+    Offline recognizer backend that returns reproducible German words for each chunk.
+
+    The number of words follows the chunk duration, and every call waits ``latency``
+    seconds to stand in for the recognizer's own processing time.
+    """
+
+    name = "stub"
+    max_workers = None
+
+    def __init__(self, latency=0.0, words_per_second=2.5, batch_size=1, seed=0):
+        self.latency = latency
+        self.words_per_second = words_per_second
+        self.batch_size = batch_size
+        self.seed = seed
+
+    def transcribe(self, audio, language="de-DE"):
+        duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        rng = random.Random(f"{self.seed}-{len(audio.frame_data)}")
+        return " ".join(rng.choice(WORDS) for _ in range(max(1, int(duration * self.words_per_second))))
+
+    def transcribe_batch(self, audios, language="de-DE"):
+        time.sleep(self.latency)
+        return [self.transcribe(audio, language) for audio in audios]
+
+
+def measure(run, repeat, trace_memory, latency_stage=None):
+    """
+    Run one stage ``repeat`` times, then once more under tracemalloc for its peak memory.
+
+    Args:
+        run (callable): Runs the stage and returns the amount of work done, e.g. audio seconds.
+        repeat (int): Number of timed runs; the fastest one counts.
+        trace_memory (bool): Measure the peak of traced Python allocations in an extra run,
+            so tracemalloc's overhead does not skew the timings.
+        latency_stage (str | None): METRICS stage whose per-call latencies are reported,
+            e.g. "llm" for single requests; the latencies of the whole runs if omitted.
+
+    Returns:
+        dict: Seconds of the fastest run, work done, throughput, number of calls,
+        latency percentiles and, if measured, peak memory in bytes.
+    """
+    METRICS.reset()
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        work = run()
+        runs.append(time.perf_counter() - started)
+    best = min(runs)
+    stage = METRICS.report()["stages"].get(latency_stage, {})
+    runs.sort()
+
+    result = {
+        "seconds": round(best, 4),
+        "work": round(work, 4),
+        "throughput": round(work / best, 2) if best else None,
+        "calls": stage.get("calls", repeat),
+    }
+    for q in PERCENTILES:
+        result[f"p{q}_seconds"] = stage.get(f"p{q}_seconds", round(percentile(runs, q), 4))
+
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_benchmark(audio_seconds=600.0, latency=0.2, recognizer_latency=0.05, parallel=4, workers=4,
+                  chunking="vad", chunk_length_ms=60000, repeat=3, trace_memory=True, seed=0, n_ctx=4096):
+    """
+    Benchmark every stage of the pipeline offline on synthetic audio.
+
+    Audio splitting reads a generated WAV file, transcription uses StubBackend, and
+    formatting talks to the fake LLM server, whose /tokenize route also serves as the
+    token counter. Each stage runs on the output of the previous one, then the whole
+    pipeline runs as one stream.
+
+    Args:
+        audio_seconds (float): Length of the synthetic audio.
+        latency (float): Seconds the fake LLM server takes per request.
+        recognizer_latency (float): Seconds the stub recognizer takes per call.
+        parallel (int): LLM requests in flight.
+        workers (int): Chunks transcribed at the same time.
+        chunking (str): "vad" or "fixed".
+        chunk_length_ms (int): Maximum audio chunk length.
+        repeat (int): Timed runs per stage; the fastest one counts.
+        trace_memory (bool): Also measure the peak memory of each stage.
+        seed (int): Random seed of the audio and the stub transcripts.
+        n_ctx (int): Context window assumed for chunk budgeting.
+
+    Returns:
+        dict: Parameters and a result of measure per stage. Throughput is audio seconds
+        per second for the audio stages and characters per second for the text stages;
+        the end-to-end stage also reports the seconds until the first formatted chunk.
+    """
+    server, url = start_fake_server(latency=latency)
+    config.override(model_name="fake", n_ctx=n_ctx, llm_endpoints="")
+    counter = get_token_counter("server", server_url=url.split("/v1/")[0])
+    backend = StubBackend(recognizer_latency, seed=seed)
+    parameters = {"audio_seconds": audio_seconds, "latency": latency, "recognizer_latency": recognizer_latency,
+                  "parallel": parallel, "workers": workers, "chunking": chunking,
+                  "chunk_length_ms": chunk_length_ms, "n_ctx": n_ctx, "seed": seed}
+    stages = {}
+    chunks, transcripts, first_output = [], [], []
+
+    with tempfile.TemporaryDirectory() as directory:
+        wav_path = make_speech_wav(os.path.join(directory, "speech.wav"), audio_seconds, seed)
+
+        def split():
+            chunks[:] = iter_audio_chunks(wav_path, chunk_length_ms, chunking)
+            return audio_seconds
+
+        def transcribe():
+            transcripts[:] = iter_transcriptions(chunks, workers=workers, backend=backend)
+            return audio_seconds
+
+        def split_text():
+            split_text_by_tokens(text, chunk_tokens, counter)
+            return len(text)
+
+        def format_text():
+            return len(format_text_to_paragraphs(text, parallel, url, counter=counter))
+
+        def end_to_end():
+            started = time.perf_counter()
+            texts = iter_transcriptions(prefetch(iter_audio_chunks(wav_path, chunk_length_ms, chunking)),
+                                        workers=workers, backend=backend)
+            formatted, max_new_tokens = split_stream(texts, counter=counter)
+            for i, _ in enumerate(iter_formatted_chunks(formatted, parallel, url, max_new_tokens=max_new_tokens,
+                                                        counter=counter)):
+                if i == 0:
+                    first_output.append(time.perf_counter() - started)
+            return audio_seconds
+
+        stages["split"] = measure(split, repeat, trace_memory, "split")
+        stages["transcribe"] = measure(transcribe, repeat, trace_memory, "transcribe")
+        text = " ".join(transcripts)
+        chunk_tokens, _ = get_chunk_budget(counter)
+        stages["split_text"] = measure(split_text, repeat, trace_memory)
+        stages["format"] = measure(format_text, repeat, trace_memory, "llm")
+        stages["end_to_end"] = measure(end_to_end, repeat, trace_memory)
+        stages["end_to_end"]["first_output_seconds"] = round(min(first_output), 4)
+
+    server.shutdown()
+    config.reset()
+    return {"parameters": parameters, "stages": stages}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Compare benchmark results with a stored baseline.
+
+    Args:
+        results (dict): Result of run_benchmark.
+        baseline (dict): An earlier result of run_benchmark.
+        tolerance (float): Relative change that is still treated as noise.
+
+    Returns:
+        list of str: One line per stage and value that got worse beyond the tolerance.
+    """
+    regressions = []
+    for name, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous:
+            continue
+        # Throughput should not drop; latency and memory should not grow
+        checks = [("throughput", -1), ("p50_seconds", 1), ("p90_seconds", 1), ("peak_memory_bytes", 1),
+                  ("first_output_seconds", 1)]
+        for field, direction in checks:
+            old, new = previous.get(field), current.get(field)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if field.endswith("_seconds") and abs(new - old) < MIN_LATENCY_CHANGE:
+                continue
+            if change * direction > tolerance:
+                regressions.append(f"{name}: {field} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results, baseline=None):
+    """Print one line per stage, with the change against the baseline if there is one."""
+    print(f"{'stage':<12}{'seconds':>9}{'throughput':>12}{'p50':>9}{'p90':>9}{'p99':>9}{'peak MiB':>10}{'vs base':>9}")
+    for name, stage in results["stages"].items():
+        memory = stage.get("peak_memory_bytes")
+        previous = (baseline or {}).get("stages", {}).get(name, {})
+        change = ""
+        if previous.get("throughput") and stage["throughput"]:
+            change = f"{stage['throughput'] / previous['throughput'] - 1:+.0%}"
+        print(f"{name:<12}{stage['seconds']:>9.3f}{stage['throughput']:>12.1f}{stage['p50_seconds']:>9.3f}"
+              f"{stage['p90_seconds']:>9.3f}{stage['p99_seconds']:>9.3f}"
+              f"{memory / 2**20 if memory is not None else float('nan'):>10.1f}{change:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline with synthetic audio.")
+    parser.add_argument("--audio-seconds", type=float, default=600.0, help="Length of the synthetic audio.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM server seconds per request.")
+    parser.add_argument("--recognizer-latency", type=float, default=0.05, help="Stub recognizer seconds per call.")
+    parser.add_argument("--parallel", type=int, default=4, help="LLM requests in flight.")
+    parser.add_argument("--workers", type=int, default=4, help="Chunks transcribed at the same time.")
+    parser.add_argument("--chunking", choices=("vad", "fixed"), default="vad")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc runs.")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with.")
+    parser.add_argument("--save", metavar="FILE", help="Write the results to FILE, e.g. as the next baseline.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Relative change treated as noise.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.audio_seconds, args.latency, args.recognizer_latency, args.parallel, args.workers,
+                            args.chunking, repeat=args.repeat, trace_memory=not args.no_memory, seed=args.seed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("parameters") != results["parameters"]:
+            print("⚠️ The baseline was run with different parameters.")
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {args.save}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"❌ {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against the baseline.")
@@ -0,0 +1,104 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import tiktoken
+
+from format_text import split_text_by_tokens
+from token_counter import get_token_counter
+
+WORDS = (
+    "heute sprechen wir über die grundlagen der thermodynamik und warum energie "
+    "nicht verloren geht sondern nur ihre form ändert das ist ein wichtiger punkt "
+    "für das verständnis aller folgenden kapitel also schauen wir uns ein beispiel an"
+).split()
+
+
+def make_transcript(hours=3.0, words_per_minute=150, seed=0):
+    """
+    Build a synthetic German transcript with occasional sentence punctuation.
+
+    Args:
+        hours (float): Spoken length the transcript should represent.
+        words_per_minute (int): Speaking rate.
+        seed (int): Random seed, for reproducible runs.
+
+    Returns:
+        str: The transcript text.
+    """
+    rng = random.Random(seed)
+    words = []
+    for _ in range(int(hours * 60 * words_per_minute)):
+        word = rng.choice(WORDS)
+        if rng.random() < 0.06:
+            word += rng.choice(".!")
+        words.append(word)
+    return " ".join(words)
+
+
+def legacy_split_text_by_tokens(text, max_tokens=300):
+    """The original implementation: a fresh encoder, per-sentence encoding and string concatenation."""
+    enc = tiktoken.get_encoding("cl100k_base")
+    sentences = re.split(r'(?<=[.؟!])\s+', text.strip())
+    chunks = []
+    current_chunk = ""
+    current_tokens = 0
+
+    for sentence in sentences:
+        sentence_tokens = enc.encode(sentence)
+        token_count = len(sentence_tokens)
+
+        if token_count > max_tokens:
+            for i in range(0, token_count, max_tokens):
+                sub_text = enc.decode(sentence_tokens[i:i + max_tokens])
+                if current_chunk:
+                    chunks.append(current_chunk.strip())
+                    current_chunk = ""
+                    current_tokens = 0
+                chunks.append(sub_text.strip())
+        elif current_tokens + token_count <= max_tokens:
+            current_chunk += sentence + " "
+            current_tokens += token_count
+        else:
+            chunks.append(current_chunk.strip())
+            current_chunk = sentence + " "
+            current_tokens = token_count
+
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+
+    return chunks
+
+
+def best_of(func, text, repeat):
+    """Return the fastest of ``repeat`` runs in seconds, together with the last result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark split_text_by_tokens on a long transcript.")
+    parser.add_argument("--hours", type=float, default=3.0, help="Length of the synthetic transcript.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    transcript = make_transcript(args.hours)
+    print(f"Transcript: {len(transcript):,} characters ({args.hours} h of speech)")
+
+    legacy_time, legacy_chunks = best_of(legacy_split_text_by_tokens, transcript, args.repeat)
+    counter = get_token_counter("tiktoken")
+    current_time, current_chunks = best_of(lambda text: split_text_by_tokens(text, 300, counter), transcript,
+                                           args.repeat)
+
+    print(f"legacy:  {legacy_time:.3f}s  ({len(legacy_chunks)} chunks)")
+    print(f"current: {current_time:.3f}s  ({len(current_chunks)} chunks)")
+    print(f"speedup: {legacy_time / current_time:.1f}x, identical output: {legacy_chunks == current_chunks}")
@@ -1,11 +1,32 @@
+import argparse
+import hashlib
+import json
+import mmap
 import os
-from pathlib import Path
-from huggingface_hub import hf_hub_download
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # Define the base and model directories
 BASE_DIR = os.path.dirname(__file__)
 MODEL_DIR = os.path.join(BASE_DIR, "..", "models")
-os.makedirs(MODEL_DIR, exist_ok=True)
+
+# Hub to download from; point HF_ENDPOINT at a mirror or at tools/fake_hub_server.py
+HF_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co").rstrip("/")
+HF_TOKEN = os.getenv("HF_TOKEN")
+
+# Size of the ranged requests a file is fetched in, and connections shared by all files
+PART_SIZE = int(os.getenv("DOWNLOAD_PART_MB", "64")) * 1024 * 1024
+CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", "8"))
+PART_RETRIES = 3
+READ_BLOCK = 1024 * 1024
+PROGRESS_SECONDS = 2.0
 
 # List of models to download
 MODELS = [
@@ -21,40 +42,580 @@ MODELS = [
     }
 ]
 
-def download_model(model):
+# Elements per block and bytes per block of the GGML tensor types
+GGML_TYPE_SIZES = {
+    0: (1, 4), 1: (1, 2), 2: (32, 18), 3: (32, 20), 6: (32, 22), 7: (32, 24), 8: (32, 34), 9: (32, 36),
+    10: (256, 84), 11: (256, 110), 12: (256, 144), 13: (256, 176), 14: (256, 210), 15: (256, 292),
+    16: (256, 66), 17: (256, 74), 18: (256, 98), 19: (256, 50), 20: (32, 18), 21: (256, 110), 22: (256, 82),
+    23: (256, 136), 24: (1, 1), 25: (1, 2), 26: (1, 4), 27: (1, 8), 28: (1, 8), 29: (256, 56), 30: (1, 2),
+}
+
+# struct formats of the fixed-size GGUF metadata value types; 8 is a string, 9 an array
+GGUF_VALUE_FORMATS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?", 10: "<Q", 11: "<q",
+                      12: "<d"}
+GGUF_DEFAULT_ALIGNMENT = 32
+
+
+class GGUFError(ValueError):
+    """Raised when a file is not a complete, well-formed GGUF model."""
+
+
+class _GGUFReader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        size = struct.calcsize(fmt)
+        if self.offset + size > len(self.data):
+            raise GGUFError(f"header ends unexpectedly at byte {self.offset}")
+        value = struct.unpack_from(fmt, self.data, self.offset)[0]
+        self.offset += size
+        return value
+
+    def string(self):
+        length = self.unpack("<Q")
+        if self.offset + length > len(self.data):
+            raise GGUFError(f"string of {length} bytes runs past the end of the file")
+        value = bytes(self.data[self.offset:self.offset + length])
+        self.offset += length
+        return value.decode("utf-8", errors="replace")
+
+    def value(self, value_type):
+        if value_type in GGUF_VALUE_FORMATS:
+            return self.unpack(GGUF_VALUE_FORMATS[value_type])
+        if value_type == 8:
+            return self.string()
+        if value_type == 9:
+            item_type = self.unpack("<I")
+            count = self.unpack("<Q")
+            if item_type in GGUF_VALUE_FORMATS:
+                # Arrays such as the vocabulary scores are skipped, not decoded
+                self.offset += count * struct.calcsize(GGUF_VALUE_FORMATS[item_type])
+                return None
+            for _ in range(count):
+                self.value(item_type)
+            return None
+        raise GGUFError(f"unknown metadata value type {value_type} at byte {self.offset}")
+
+
+def validate_gguf(path):
+    """
+    Check that a file is a complete GGUF model without loading it.
+
+    The file is memory-mapped, and the header, all metadata entries and the tensor
+    table are parsed. Every tensor must be aligned, lie inside the file and not
+    overlap the next one, so a truncated or garbled download is caught here instead
+    of when the server loads the model.
+
+    Args:
+        path (str): The model file.
+
+    Returns:
+        dict: GGUF version and number of metadata entries and tensors.
+
+    Raises:
+        GGUFError: If the file is not a valid GGUF model.
+    """
+    size = os.path.getsize(path)
+    if size < 24:
+        raise GGUFError(f"file has only {size} bytes")
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        reader = _GGUFReader(data)
+        if bytes(data[:4]) != b"GGUF":
+            raise GGUFError("invalid format: not a GGUF model")
+        reader.offset = 4
+        version = reader.unpack("<I")
+        if version not in (2, 3):
+            raise GGUFError(f"unsupported GGUF version {version}")
+        tensor_count = reader.unpack("<Q")
+        kv_count = reader.unpack("<Q")
+
+        alignment = GGUF_DEFAULT_ALIGNMENT
+        for _ in range(kv_count):
+            key = reader.string()
+            value = reader.value(reader.unpack("<I"))
+            if key == "general.alignment":
+                alignment = value
+        if not alignment or alignment & (alignment - 1):
+            raise GGUFError(f"invalid alignment {alignment}")
+
+        tensors = []
+        for _ in range(tensor_count):
+            name = reader.string()
+            n_dims = reader.unpack("<I")
+            elements = 1
+            for _ in range(n_dims):
+                elements *= reader.unpack("<Q")
+            tensor_type = reader.unpack("<I")
+            offset = reader.unpack("<Q")
+            block, block_bytes = GGML_TYPE_SIZES.get(tensor_type, (None, None))
+            nbytes = elements // block * block_bytes if block else 0
+            tensors.append((offset, nbytes, name))
+
+        data_start = -(-reader.offset // alignment) * alignment
+
+    previous_end, previous_name = 0, None
+    for offset, nbytes, name in sorted(tensors):
+        if offset % alignment:
+            raise GGUFError(f"tensor '{name}' is not aligned to {alignment} bytes")
+        if offset < previous_end:
+            raise GGUFError(f"tensor '{name}' overlaps tensor '{previous_name}'")
+        if data_start + offset + nbytes > size:
+            raise GGUFError(f"tensor '{name}' ends at byte {data_start + offset + nbytes}, "
+                            f"past the end of the file ({size} bytes); the file is truncated")
+        previous_end, previous_name = offset + nbytes, name
+    return {"version": version, "metadata": kv_count, "tensors": tensor_count}
+
+
+def sha256_file(path):
+    """Return the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def create_session(connections=CONNECTIONS):
+    """Return an HTTP session whose connection pool fits ``connections`` parallel requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def auth_headers(url, endpoint=HF_ENDPOINT):
+    """
+    Return the Authorization header for a request to ``url``.
+
+    HF_TOKEN is only sent to the hub itself, e.g. a mirror that serves gated files
+    without redirecting, never to the CDN a download is redirected to.
+
+    Args:
+        url (str): URL of the request.
+        endpoint (str): Hub base URL.
+
+    Returns:
+        dict: The header, or no headers if there is no token or ``url`` is on another host.
+    """
+    if not HF_TOKEN or urlsplit(url).netloc != urlsplit(endpoint).netloc:
+        return {}
+    return {"Authorization": f"Bearer {HF_TOKEN}"}
+
+
+def get_file_metadata(model, session, endpoint=HF_ENDPOINT):
+    """
+    Ask the hub for the size, SHA-256 and download location of a model file.
+
+    Args:
+        model (dict): Entry of MODELS.
+        session (requests.Session): Session to use.
+        endpoint (str): Hub base URL.
+
+    Returns:
+        dict: ``url`` to fetch from, ``size`` in bytes (None if unknown), ``sha256`` (None
+        if the hub publishes none, e.g. for files outside Git LFS) and ``ranges``, whether
+        the file can be fetched in parts.
+    """
+    url = f"{endpoint}/{model['repo']}/resolve/main/{model['filename']}"
+    response = session.head(url, headers=auth_headers(url, endpoint), allow_redirects=False, timeout=30)
+    if response.status_code >= 400:
+        response.raise_for_status()
+    etag = (response.headers.get("X-Linked-Etag") or response.headers.get("ETag") or "").strip('"').lower()
+    if etag.startswith("w/"):
+        etag = etag[2:].strip('"')
+    size = response.headers.get("X-Linked-Size") or response.headers.get("Content-Length")
+
+    location = url
+    if response.is_redirect:
+        location = requests.compat.urljoin(url, response.headers["Location"])
+        response = session.head(location, allow_redirects=True, timeout=30)
+        response.raise_for_status()
+        location = response.url
+        size = size or response.headers.get("Content-Length")
+    ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    sha256 = etag if len(etag) == 64 and all(c in "0123456789abcdef" for c in etag) else None
+    return {"url": location, "size": int(size) if size else None, "sha256": sha256, "ranges": ranges}
+
+
+class Progress:
+    """
+    Byte counts of running downloads, printed with their throughput every few seconds.
+    """
+
+    def __init__(self, interval=PROGRESS_SECONDS):
+        self.interval = interval
+        self.totals = {}
+        self.done = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, name, total, done=0):
+        with self._lock:
+            self.totals[name] = total
+            self.done[name] = done
+
+    def advance(self, name, count):
+        with self._lock:
+            self.done[name] += count
+
+    def line(self):
+        with self._lock:
+            items = [(name, self.done[name], self.totals[name]) for name in self.totals]
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        parts = []
+        for name, done, total in items:
+            share = f"{done / total:.0%}" if total else f"{done / 2 ** 20:.0f} MiB"
+            parts.append(f"{name} {share}")
+        received = sum(done for _, done, _ in items)
+        return f"  {' | '.join(parts)} | {received / 2 ** 20 / elapsed:.1f} MiB/s"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            print(self.line(), flush=True)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class ModelDownload:
     """
-    Download a model from Hugging Face if it doesn't exist locally.
+    Download of one model file in ranged parts, resumable and verified.
+
+    Parts are written into ``<file>.part`` at their offsets, and the finished ones are
+    recorded in ``<file>.part.json``, so an interrupted download only fetches the parts
+    that are missing. The SHA-256 is computed while the download runs, over the
+    contiguous run of finished parts from the start of the file. The file gets its
+    final name only after its digest and its GGUF structure have been checked.
 
     Args:
-        model (dict): A dictionary with model details ('name', 'repo', 'filename').
+        model (dict): Entry of MODELS.
+        directory (str): Directory of the model files.
+        session (requests.Session): Session shared by all downloads.
+        progress (Progress): Receives the downloaded byte counts.
+        part_size (int): Bytes per ranged request.
+        endpoint (str): Hub base URL.
     """
-    print(f"\nChecking: {model['name']}")
-    local_path = os.path.join(MODEL_DIR, model["filename"])
 
-    if Path(local_path).exists():
-        print(f"Already exists: {local_path}")
+    def __init__(self, model, directory, session, progress, part_size=PART_SIZE, endpoint=HF_ENDPOINT):
+        self.model = model
+        self.name = model["name"]
+        self.path = os.path.join(directory, model["filename"])
+        self.part_path = self.path + ".part"
+        self.state_path = self.path + ".part.json"
+        self.stamp_path = self.path + ".sha256"
+        self.session = session
+        self.progress = progress
+        self.part_size = part_size
+        self.endpoint = endpoint
+        self.meta = None
+        self.parts = []
+        self.finished_parts = set()
+        self.started = None
+        self.received = 0
+        self._digest = hashlib.sha256()
+        self._hashed = 0
+        self._lock = threading.Lock()
+        self._hash_lock = threading.Lock()
+
+    def prepare(self):
+        """
+        Fetch the metadata and decide what is left to download.
+
+        A file verified by an earlier run is kept without asking the hub if the hub
+        cannot be reached, so reruns work offline.
+
+        Returns:
+            list[int]: Indices of the parts to fetch. Empty if the file is already complete,
+            or if an earlier run fetched every part but stopped before finish(); ``parts``
+            is only filled in the latter case, and the file still has to be finished.
+
+        Raises:
+            requests.RequestException: If the hub cannot be reached and there is no verified file.
+        """
+        try:
+            self.meta = get_file_metadata(self.model, self.session, self.endpoint)
+        except requests.RequestException as error:
+            if not self._verified_earlier():
+                raise
+            print(f"✅ {self.name}: hub not reachable ({error}); keeping the file verified earlier: {self.path}")
+            return []
+        size = self.meta["size"]
+        if os.path.exists(self.path) and self._existing_is_valid():
+            return []
+
+        if size and self.meta["ranges"]:
+            self.parts = [(start, min(start + self.part_size, size)) for start in range(0, size, self.part_size)]
+        else:
+            self.parts = [(0, size)]
+        state = self._read_state() or {}
+        fingerprint = {"size": size, "sha256": self.meta["sha256"], "part_size": self.part_size}
+        if len(self.parts) > 1 and os.path.exists(self.part_path) \
+                and {key: state.get(key) for key in fingerprint} == fingerprint:
+            self.finished_parts = set(state.get("done_parts", []))
+        else:
+            with open(self.part_path, "wb") as file:
+                if size:
+                    file.truncate(size)
+            self._write_state()
+
+        done = sum(end - start for index, (start, end) in enumerate(self.parts) if index in self.finished_parts)
+        if done:
+            print(f"↩️ {self.name}: resuming, {done / 2 ** 20:.0f} of {size / 2 ** 20:.0f} MiB already downloaded")
+        self.progress.add(self.name, size, done)
+        self.started = time.perf_counter()
+        return [index for index in range(len(self.parts)) if index not in self.finished_parts]
+
+    def _existing_is_valid(self):
+        expected = self.meta["sha256"]
+        if self.meta["size"] is not None and os.path.getsize(self.path) != self.meta["size"]:
+            print(f"⚠️ {self.name}: existing file has the wrong size; downloading it again")
+            return False
+        if expected:
+            stamp = None
+            if os.path.exists(self.stamp_path):
+                with open(self.stamp_path, "r", encoding="utf-8") as file:
+                    stamp = file.read().strip()
+            if stamp != expected:
+                print(f"🔎 {self.name}: checking the SHA-256 of the existing file")
+                if sha256_file(self.path) != expected:
+                    print(f"⚠️ {self.name}: existing file does not match the hub's SHA-256; downloading it again")
+                    return False
+                self._write_stamp(expected)
+        print(f"✅ {self.name}: already downloaded and verified: {self.path}")
+        return True
+
+    def _verified_earlier(self):
+        # The stamp is written once the file is verified; a file changed after that is not trusted
+        return os.path.exists(self.path) and os.path.exists(self.stamp_path) \
+            and os.path.getmtime(self.stamp_path) >= os.path.getmtime(self.path)
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_state(self):
+        state = {"size": self.meta["size"], "sha256": self.meta["sha256"], "part_size": self.part_size,
+                 "done_parts": sorted(self.finished_parts)}
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temp_path, self.state_path)
+
+    def _write_stamp(self, sha256):
+        with open(self.stamp_path, "w", encoding="utf-8") as file:
+            file.write(sha256 + "\n")
+
+    def fetch_part(self, index):
+        """
+        Download one part into its place in the part file, retrying failed requests.
+
+        Args:
+            index (int): Index of the part.
+        """
+        start, end = self.parts[index]
+        for attempt in range(PART_RETRIES + 1):
+            written = 0
+            try:
+                ranged = len(self.parts) > 1
+                headers = auth_headers(self.meta["url"], self.endpoint)
+                if ranged:
+                    headers["Range"] = f"bytes={start}-{end - 1}"
+                with self.session.get(self.meta["url"], headers=headers, stream=True, timeout=60) as response:
+                    response.raise_for_status()
+                    if ranged and response.status_code != 206:
+                        raise requests.HTTPError(f"server ignored the range request ({response.status_code})")
+                    with open(self.part_path, "r+b") as file:
+                        file.seek(start)
+                        for block in response.iter_content(READ_BLOCK):
+                            file.write(block)
+                            written += len(block)
+                            self.progress.advance(self.name, len(block))
+                if end is not None and written != end - start:
+                    raise requests.HTTPError(f"part {index} has {written} bytes instead of {end - start}")
+                break
+            except requests.RequestException as error:
+                self.progress.advance(self.name, -written)
+                if attempt == PART_RETRIES:
+                    raise
+                print(f"⚠️ {self.name}: part {index} failed ({error}); retrying")
+                time.sleep(2 ** attempt)
+
+        with self._lock:
+            self.received += written
+            self.finished_parts.add(index)
+            self._write_state()
+        self._hash_ready(blocking=False)
+
+    def _hash_ready(self, blocking):
+        # Only one thread hashes at a time; the others go back to downloading, and finish()
+        # hashes whatever is left
+        if not self._hash_lock.acquire(blocking=blocking):
+            return
+        try:
+            with open(self.part_path, "rb") as file:
+                while self._hashed < len(self.parts) and self._hashed in self.finished_parts:
+                    start, end = self.parts[self._hashed]
+                    file.seek(start)
+                    remaining = None if end is None else end - start
+                    while remaining is None or remaining > 0:
+                        block = file.read(READ_BLOCK if remaining is None else min(READ_BLOCK, remaining))
+                        if not block:
+                            break
+                        self._digest.update(block)
+                        if remaining is not None:
+                            remaining -= len(block)
+                    self._hashed += 1
+        finally:
+            self._hash_lock.release()
+
+    def finish(self):
+        """
+        Verify the downloaded file and give it its final name.
+
+        Raises:
+            ValueError: If the SHA-256 or the GGUF structure is wrong; the part file is
+                removed, so the next run downloads the model again.
+        """
+        self._hash_ready(blocking=True)
+        digest = self._digest.hexdigest()
+        expected = self.meta["sha256"]
+        try:
+            if expected and digest != expected:
+                raise ValueError(f"SHA-256 mismatch: expected {expected}, got {digest}")
+            info = validate_gguf(self.part_path)
+        except ValueError:
+            for path in (self.part_path, self.state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        os.replace(self.part_path, self.path)
+        os.remove(self.state_path)
+        self._write_stamp(digest)
+
+        seconds = time.perf_counter() - self.started
+        checked = "SHA-256 verified" if expected else "no SHA-256 published, size checked"
+        print(f"✅ {self.name}: {self.received / 2 ** 20:.0f} MiB in {seconds:.1f}s "
+              f"({self.received / 2 ** 20 / max(seconds, 1e-9):.1f} MiB/s), {checked}, "
+              f"GGUF v{info['version']} with {info['tensors']} tensors: {self.path}")
+
+
+def download_models(models=MODELS, directory=MODEL_DIR, connections=CONNECTIONS, part_size=PART_SIZE,
+                    endpoint=HF_ENDPOINT):
+    """
+    Download several models at the same time.
+
+    The parts of all files share one pool of ``connections`` requests, so small and
+    large models finish as early as the link allows.
+
+    Args:
+        models (list[dict]): Entries like those of MODELS.
+        directory (str): Directory of the model files.
+        connections (int): Parallel HTTP requests.
+        part_size (int): Bytes per ranged request.
+        endpoint (str): Hub base URL.
+
+    Returns:
+        dict: Model name to the path of the verified file, or to the exception that stopped it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    session = create_session(connections)
+    progress = Progress()
+    downloads = [ModelDownload(model, directory, session, progress, part_size, endpoint) for model in models]
+    results = {}
+    remaining = {}
+
+    def finish(download):
+        try:
+            download.finish()
+            results[download.name] = download.path
+        except Exception as error:
+            print(f"❌ {download.name}: {error}")
+            results[download.name] = error
+
+    with ThreadPoolExecutor(max_workers=connections) as executor, progress:
+        prepared = {executor.submit(download.prepare): download for download in downloads}
+        futures = {}
+        for future in as_completed(prepared):
+            download = prepared[future]
+            try:
+                parts = future.result()
+            except Exception as error:
+                print(f"❌ {download.name}: {error}")
+                results[download.name] = error
+                continue
+            if not parts:
+                if download.parts:
+                    # Every part was fetched by an earlier run that stopped before verifying the file
+                    finish(download)
+                else:
+                    results[download.name] = download.path
+                continue
+            size = download.meta["size"]
+            print(f"⬇️ {download.name}: {len(parts)} part(s) left of "
+                  f"{f'{size / 2 ** 20:.0f} MiB' if size else 'a file of unknown size'}")
+            remaining[download.name] = len(parts)
+            for index in parts:
+                futures[executor.submit(download.fetch_part, index)] = download
+
+        for future in as_completed(futures):
+            download = futures[future]
+            if download.name in results:
+                continue
+            try:
+                future.result()
+                remaining[download.name] -= 1
+            except Exception as error:
+                print(f"❌ {download.name}: {error}")
+                results[download.name] = error
+                continue
+            if not remaining[download.name]:
+                finish(download)
+
+    session.close()
+    return results
+
+
+def main():
+    """
+    Command-line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Download and verify the GGUF models.")
+    parser.add_argument("names", nargs="*", help="Models to download (default: all of MODELS).")
+    parser.add_argument("--dir", default=MODEL_DIR, help="Directory of the model files.")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS, help="Parallel HTTP requests.")
+    parser.add_argument("--part-mb", type=int, default=PART_SIZE // 2 ** 20, help="MiB per ranged request.")
+    parser.add_argument("--check", metavar="FILE", help="Only validate the GGUF structure of a file.")
+    args = parser.parse_args()
+
+    if args.check:
+        try:
+            print(validate_gguf(args.check))
+        except GGUFError as error:
+            sys.exit(f"❌ {error}")
         return
 
-    try:
-        model_path = hf_hub_download(
-            repo_id=model["repo"],
-            filename=model["filename"],
-            local_dir=MODEL_DIR,
-            cache_dir=MODEL_DIR,
-            force_download=False,
-            resume_download=True,
-        )
-        print(f"Downloaded: {model_path}")
-
-        # Verify GGUF header
-        with open(model_path, "rb") as file:
-            if file.read(4) != b"GGUF":
-                raise ValueError("Invalid format: not a GGUF model.")
-        print("GGUF header is valid.")
-
-    except Exception as error:
-        print(f"Failed to download {model['name']}: {error}")
+    unknown = set(args.names) - {model["name"] for model in MODELS}
+    if unknown:
+        parser.error(f"unknown models: {', '.join(sorted(unknown))}")
+    models = [model for model in MODELS if not args.names or model["name"] in args.names]
+    results = download_models(models, args.dir, args.connections, args.part_mb * 2 ** 20)
+    if any(isinstance(result, Exception) for result in results.values()):
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    for model in MODELS:
-        download_model(model)
+    main()
@@ -0,0 +1,178 @@
+import argparse
+import hashlib
+import os
+import re
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeHubHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Hugging Face file routes used by tools/download_model.py.
+
+    ``/<repo>/resolve/main/<filename>`` answers HEAD with the file's size and SHA-256
+    in ``X-Linked-Size`` and ``X-Linked-Etag`` and redirects to ``/files/<filename>``,
+    like the hub redirects to its CDN. The file route serves byte ranges. The server
+    can be told to break off a share of the responses halfway, to exercise retries
+    and resuming.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _file(self, name):
+        path = os.path.join(self.server.directory, os.path.basename(name))
+        return path if os.path.isfile(path) else None
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def handle_request(self, send_body):
+        resolve = re.fullmatch(r"/[^/]+/[^/]+/resolve/[^/]+/(.+)", self.path)
+        if resolve:
+            path = self._file(resolve.group(1))
+            if path is None:
+                self.send_error(404)
+                return
+            size, sha256 = self.server.describe(path)
+            self.send_response(302)
+            self.send_header("Location", f"/files/{os.path.basename(path)}")
+            self.send_header("X-Linked-Size", str(size))
+            self.send_header("X-Linked-Etag", f'"{sha256}"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        path = self._file(self.path[len("/files/"):]) if self.path.startswith("/files/") else None
+        if path is None:
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and self.server.ranges:
+            start = int(match.group(1))
+            end = min(size, int(match.group(2)) + 1) if match.group(2) else size
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        else:
+            self.send_response(200)
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        if not send_body:
+            return
+
+        if self.server.should_fail():
+            # Send half of the body, then drop the connection
+            end = start + (end - start) // 2
+            self.close_connection = True
+        try:
+            with open(path, "rb") as file:
+                file.seek(start)
+                remaining = end - start
+                while remaining:
+                    block = file.read(min(65536, remaining))
+                    self.wfile.write(block)
+                    remaining -= len(block)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory, fail_every=0, ranges=True):
+        super().__init__(address, FakeHubHandler)
+        self.directory = directory
+        self.fail_every = fail_every
+        self.ranges = ranges
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._digests = {}
+
+    def describe(self, path):
+        """Return the size and SHA-256 of a served file."""
+        with self._lock:
+            key = (path, os.path.getmtime(path))
+            if key not in self._digests:
+                with open(path, "rb") as file:
+                    self._digests[key] = (os.path.getsize(path), hashlib.sha256(file.read()).hexdigest())
+            return self._digests[key]
+
+    def should_fail(self):
+        with self._lock:
+            self.requests += 1
+            return bool(self.fail_every) and self.requests % self.fail_every == 0
+
+
+def start_fake_hub(directory, fail_every=0, ranges=True, host="127.0.0.1", port=0):
+    """
+    Start the fake hub in a background thread.
+
+    Args:
+        directory (str): Directory whose files are served for every repository.
+        fail_every (int): Break off every n-th file response halfway; 0 never does.
+        ranges (bool): Serve byte ranges; without them every file comes in one response.
+        host (str): Interface to bind.
+        port (int): Port to bind; 0 picks a free port.
+
+    Returns:
+        tuple: The running server and its base URL, to be used as HF_ENDPOINT.
+    """
+    server = FakeHubServer((host, port), directory, fail_every, ranges)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def write_test_gguf(path, tensors=4, tensor_bytes=1024 * 1024, alignment=32):
+    """
+    Write a small GGUF v3 file with F32 tensors of random data for download tests.
+
+    Args:
+        path (str): Output file.
+        tensors (int): Number of tensors.
+        tensor_bytes (int): Bytes per tensor; a multiple of 4.
+        alignment (int): Data alignment, written as ``general.alignment``.
+    """
+
+    def string(value):
+        data = value.encode("utf-8")
+        return struct.pack("<Q", len(data)) + data
+
+    header = b"GGUF" + struct.pack("<IQQ", 3, tensors, 2)
+    header += string("general.architecture") + struct.pack("<I", 8) + string("test")
+    header += string("general.alignment") + struct.pack("<II", 4, alignment)
+    padded = -(-tensor_bytes // alignment) * alignment
+    for index in range(tensors):
+        header += string(f"blk.{index}.weight") + struct.pack("<IQIQ", 1, tensor_bytes // 4, 0, index * padded)
+    header += b"\0" * (-len(header) % alignment)
+
+    with open(path, "wb") as file:
+        file.write(header)
+        for _ in range(tensors):
+            file.write(os.urandom(tensor_bytes) + b"\0" * (padded - tensor_bytes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a directory like the Hugging Face hub's file routes.")
+    parser.add_argument("directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-every", type=int, default=0, help="Break off every n-th file response halfway.")
+    parser.add_argument("--no-ranges", action="store_true", help="Ignore Range headers.")
+    args = parser.parse_args()
+
+    server = FakeHubServer((args.host, args.port), args.directory, args.fail_every, not args.no_ranges)
+    print(f"Fake hub on http://{args.host}:{args.port} serving {args.directory}; set HF_ENDPOINT to use it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,177 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI-compatible /v1/chat/completions endpoint.
+
+    It echoes the last user message back after the configured latency, which is
+    enough to benchmark the formatting client without a real model. Requests with
+    ``stream: true`` get the echo word by word as server-sent events, with the
+    latency spread over the words. llama.cpp's /tokenize and /detokenize routes
+    are served with a word-level vocabulary, so the server token counter works offline.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            body = {"status": "ok"}
+        elif self.path.rstrip("/") == "/v1/models":
+            body = {"object": "list", "data": [{"id": self.server.model_name, "object": "model"}]}
+        else:
+            self.send_error(404)
+            return
+
+        self.send_json(body)
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path not in ("/v1/chat/completions", "/tokenize", "/detokenize"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if path == "/tokenize":
+            self.send_json({"tokens": self.server.tokenize(payload.get("content", ""))})
+            return
+        if path == "/detokenize":
+            self.send_json({"content": self.server.detokenize(payload.get("tokens", []))})
+            return
+
+        user_messages = [m["content"] for m in payload.get("messages", []) if m.get("role") == "user"]
+        content = user_messages[-1] if user_messages else ""
+
+        if payload.get("stream"):
+            try:
+                self.stream_words(content)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading, e.g. after a cancellation
+                self.close_connection = True
+            return
+
+        time.sleep(self.server.latency)
+        words = len(content.split())
+
+        self.send_json({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "model": payload.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": words, "total_tokens": words}
+        })
+
+    def send_json(self, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream_words(self, content):
+        words = content.split(" ")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(data):
+            event = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            time.sleep(self.server.latency / max(1, len(words)))
+            send(json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]
+            }))
+        send(json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)}
+        }))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server for FakeChatHandler, holding the latency, model id and token vocabulary.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, model_name="fake"):
+        super().__init__(address, FakeChatHandler)
+        self.latency = latency
+        self.model_name = model_name
+        self.vocabulary = {}
+        self.pieces = []
+        self._lock = threading.Lock()
+
+    def tokenize(self, text):
+        """Map every word, with its leading whitespace, to a token id."""
+        with self._lock:
+            tokens = []
+            for piece in re.findall(r"\s*\S+|\s+", text):
+                if piece not in self.vocabulary:
+                    self.vocabulary[piece] = len(self.pieces)
+                    self.pieces.append(piece)
+                tokens.append(self.vocabulary[piece])
+            return tokens
+
+    def detokenize(self, tokens):
+        with self._lock:
+            return "".join(self.pieces[token] for token in tokens)
+
+
+def start_fake_server(latency=0.0, host="127.0.0.1", port=0):
+    """
+    Start the fake server in a background thread.
+
+    Args:
+        latency (float): Seconds to wait before answering each request.
+        host (str): Interface to bind.
+        port (int): Port to bind; 0 picks a free port.
+
+    Returns:
+        tuple: The running server and its chat completions URL. Call ``server.shutdown()`` to stop it.
+    """
+    server = FakeLLMServer((host, port), latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+    return server, url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible chat server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per request.")
+    parser.add_argument("--alias", default="fake", help="Model id reported by /v1/models.")
+    args, _ = parser.parse_known_args()
+
+    server = FakeLLMServer((args.host, args.port), args.latency, args.alias)
+    print(f"Fake LLM server on http://{args.host}:{args.port}/v1/chat/completions (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,125 @@
+import numpy as np
+
+# Defaults for silence-aware chunking of 16-bit mono PCM
+FRAME_MS = 30
+MIN_CHUNK_MS = 15000
+MAX_CHUNK_MS = 60000
+MIN_SILENCE_MS = 500
+SILENCE_THRESH_DB = -40.0
+PADDING_MS = 200
+
+
+def frame_energies_db(pcm, frame_length):
+    """
+    Compute the RMS energy of consecutive frames of 16-bit PCM in dBFS.
+
+    Args:
+        pcm (bytes): Little-endian signed 16-bit mono samples.
+        frame_length (int): Number of samples per frame.
+
+    Returns:
+        numpy.ndarray: One energy value per frame; a trailing partial frame gets its own value.
+    """
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    if samples.size == 0:
+        return np.empty(0, dtype=np.float32)
+
+    padding = (-samples.size) % frame_length
+    counts = np.full(-(-samples.size // frame_length), frame_length, dtype=np.float32)
+    if padding:
+        samples = np.concatenate([samples, np.zeros(padding, dtype=np.float32)])
+        counts[-1] = frame_length - padding
+
+    power = np.square(samples).reshape(-1, frame_length).sum(axis=1) / counts
+    return 10.0 * np.log10(power + 1e-10)
+
+
+def iter_voiced_segments(read_frames, sample_rate=16000, min_chunk_ms=MIN_CHUNK_MS, max_chunk_ms=MAX_CHUNK_MS,
+                         min_silence_ms=MIN_SILENCE_MS, silence_thresh_db=SILENCE_THRESH_DB,
+                         padding_ms=PADDING_MS, frame_ms=FRAME_MS):
+    """
+    Split a stream of 16-bit mono PCM into voiced segments, cutting at pauses.
+
+    A segment is closed at the first pause of at least ``min_silence_ms`` once it is
+    longer than ``min_chunk_ms``, or at its quietest frame when it reaches
+    ``max_chunk_ms``. Silence outside segments is dropped except for ``padding_ms``
+    kept on either side of speech.
+
+    Args:
+        read_frames (callable): Returns up to the requested number of samples as bytes,
+            and empty bytes at the end of the stream.
+        sample_rate (int): Sample rate of the PCM stream.
+        min_chunk_ms (int): Shortest segment that may be closed at a pause.
+        max_chunk_ms (int): Longest segment; longer speech is cut at the quietest frame.
+        min_silence_ms (int): Pause length that closes a segment.
+        silence_thresh_db (float): Frames below this energy in dBFS count as silence.
+        padding_ms (int): Silence kept before and after speech.
+        frame_ms (int): Analysis frame length.
+
+    Yields:
+        tuple: ``(start_sample, pcm_bytes)`` of each voiced segment, in order.
+    """
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    min_frames = max(1, min_chunk_ms // frame_ms)
+    max_frames = max(min_frames + 1, max_chunk_ms // frame_ms)
+    silence_frames = max(1, -(-min_silence_ms // frame_ms))
+    padding_frames = max(0, padding_ms // frame_ms)
+    block_samples = frame_length * 256
+
+    frames = []
+    energies = []
+    voiced = []
+    start_sample = 0
+    voiced_count = 0
+
+    def advance(count):
+        nonlocal frames, energies, voiced, start_sample, voiced_count
+        pcm = b"".join(frames[:count])
+        start_sample += len(pcm) // 2
+        frames, energies, voiced = frames[count:], energies[count:], voiced[count:]
+        voiced_count = sum(voiced)
+        return pcm
+
+    def trailing_silence():
+        count = 0
+        for is_voiced in reversed(voiced):
+            if is_voiced:
+                break
+            count += 1
+        return count
+
+    def emit(count):
+        segment_start = start_sample
+        return segment_start, advance(count)
+
+    leftover = b""
+    while True:
+        block = read_frames(block_samples)
+        data = leftover + block
+        step = frame_length * 2 if block else 2
+        usable = len(data) - len(data) % step
+        data, leftover = data[:usable], data[usable:]
+
+        for offset, energy in zip(range(0, len(data), frame_length * 2), frame_energies_db(data, frame_length)):
+            frames.append(data[offset:offset + frame_length * 2])
+            energies.append(float(energy))
+            voiced.append(bool(energy >= silence_thresh_db))
+            voiced_count += voiced[-1]
+
+            if voiced_count:
+                silence = trailing_silence()
+                if len(frames) - silence >= min_frames and silence >= silence_frames:
+                    yield emit(len(frames) - silence + min(padding_frames, silence))
+                elif len(frames) >= max_frames:
+                    cut = min_frames + int(np.argmin(energies[min_frames:]))
+                    yield emit(max(1, cut))
+
+            if not voiced_count and len(frames) > padding_frames:
+                advance(len(frames) - padding_frames)
+
+        if not block:
+            break
+
+    if voiced_count:
+        silence = trailing_silence()
+        yield emit(len(frames) - silence + min(padding_frames, silence))